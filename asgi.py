@@ -0,0 +1,272 @@
+"""
+ASGI entry point - serves /chat and /chat/stream natively async, so one
+worker can hold hundreds of in-flight conversations while they wait on
+DeepSeek and Ragie. Everything else (index page, /health, static files)
+is passed through to the Flask app in main.py.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:app
+
+The sync Flask app (gunicorn main:app) keeps working unchanged.
+
+If the client disconnects mid-request, the generation task is cancelled,
+which closes the DeepSeek connection instead of finishing the answer.
+"""
+
+import json
+import time
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+
+import metrics
+import sessions
+import summarizer
+from main import app as flask_app, format_sse, critic_replacement, MAX_REQUEST_BYTES
+from intent import RELIGIOUS
+from critic import should_critique, submit_critique
+from generator import generate_response_async, generate_response_stream_async, is_redirect, REQUEST_DEADLINE
+from resilience import Deadline
+
+_flask = WsgiToAsgi(flask_app)
+
+EMPTY_QUESTION = "Pertanyaan kosong / Empty question"
+TECHNICAL_ERROR = "Maaf, ada gangguan teknis. Coba lagi ya."
+TOO_LARGE = "Pesan terlalu panjang / Message too long"
+
+
+async def _read_json(receive) -> dict | None:
+    """Read and parse the request body (empty dict if invalid, None if over MAX_REQUEST_BYTES)."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_REQUEST_BYTES:
+            return None
+        more_body = message.get("more_body", False)
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready."""
+
+
+async def _wait_disconnect(receive):
+    # After the body has been read, the next message is the disconnect
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _unless_disconnected(receive, coro):
+    """
+    Run `coro`, cancelling it if the client disconnects first.
+    
+    Returns:
+        The coroutine's result; raises ClientDisconnected if it was cancelled
+    """
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            # Let the task clean up (close the DeepSeek stream) before returning
+            await asyncio.gather(task, return_exceptions=True)
+    if task.cancelled():
+        raise ClientDisconnected()
+    return task.result()
+
+
+async def _send_json(send, status: int, payload: dict, headers: list = None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *(headers or []),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_chat_json(send, status: int, payload: dict, start: float):
+    """Send a /chat response with request metrics and a Server-Timing header."""
+    metrics.inc("gus_requests_total", endpoint="/chat", status=str(status))
+    metrics.record_stage("total", time.perf_counter() - start)
+    timing = metrics.server_timing_header().encode()
+    await _send_json(send, status, payload, [(b"server-timing", timing)] if timing else None)
+
+
+async def chat(scope, receive, send):
+    """Async /chat - same request/response contract as main.chat."""
+    start = time.perf_counter()
+    metrics.start_request()
+    try:
+        data = await _read_json(receive)
+        if data is None:
+            return await _send_chat_json(send, 413, {"success": False, "error": TOO_LARGE}, start)
+        query = (data.get("message") or "").strip()
+
+        if not query:
+            return await _send_chat_json(send, 400, {"success": False, "error": EMPTY_QUESTION}, start)
+
+        session_id, session = await asyncio.to_thread(sessions.start_turn, data)
+        result = await _unless_disconnected(
+            receive, generate_response_async(
+                query, history=session["messages"], use_rag=True, summary=session.get("summary", "")
+            )
+        )
+
+        if result.get("timeout"):
+            metrics.inc("gus_aborted_requests_total", endpoint="/chat", reason="timeout")
+            return await _send_chat_json(
+                send, 504, {"success": False, "error": result["error"], "timeout": True}, start
+            )
+
+        if result.get("error"):
+            return await _send_chat_json(send, 500, {"success": False, "error": result["error"]}, start)
+
+        session = await asyncio.to_thread(sessions.append_turn, session_id, session, query, result["response"])
+        summarizer.maybe_summarize(session_id, session)
+        payload = {
+            "success": True,
+            "response": result["response"],
+            "language": result.get("language", "id"),
+            "context_used": result.get("context_used", False),
+            "sources": result.get("sources", []),
+            "session_id": session_id,
+            "turn": session["turns"]
+        }
+        if result.get("intent") == RELIGIOUS and not is_redirect(result["response"]) and should_critique():
+            payload["response_id"] = await asyncio.to_thread(
+                submit_critique, result["response"], query, payload["language"], session_id, session["turns"]
+            )
+            payload["critic"] = "pending"
+
+        await _send_chat_json(send, 200, payload, start)
+
+    except ClientDisconnected:
+        metrics.inc("gus_aborted_requests_total", endpoint="/chat", reason="disconnect")
+    except Exception as e:
+        print(f"Chat error: {e}")
+        await _send_chat_json(send, 500, {"success": False, "error": TECHNICAL_ERROR}, start)
+
+
+async def chat_stream(scope, receive, send):
+    """Async /chat/stream - same Server-Sent Events as main.chat_stream."""
+    start = time.perf_counter()
+    deadline = Deadline(REQUEST_DEADLINE)
+    metrics.start_request()
+    data = await _read_json(receive)
+    if data is None:
+        metrics.inc("gus_requests_total", endpoint="/chat/stream", status="413")
+        return await _send_json(send, 413, {"success": False, "error": TOO_LARGE})
+    query = (data.get("message") or "").strip()
+
+    if not query:
+        metrics.inc("gus_requests_total", endpoint="/chat/stream", status="400")
+        return await _send_json(send, 400, {"success": False, "error": EMPTY_QUESTION})
+
+    session_id, session = await asyncio.to_thread(sessions.start_turn, data)
+    metrics.inc("gus_requests_total", endpoint="/chat/stream", status="200")
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+
+    async def emit(event: str, payload: dict):
+        await send({
+            "type": "http.response.body",
+            "body": format_sse(event, payload).encode("utf-8"),
+            "more_body": True,
+        })
+
+    async def respond():
+        parts = []
+        done = None
+        async for event, payload in generate_response_stream_async(
+            query, history=session["messages"], use_rag=True, summary=session.get("summary", "")
+        ):
+            if event == "token":
+                parts.append(payload["text"])
+            elif event == "done":
+                saved = await asyncio.to_thread(
+                    sessions.append_turn, session_id, session, query, "".join(parts).strip()
+                )
+                summarizer.maybe_summarize(session_id, saved)
+                metrics.record_stage("total", time.perf_counter() - start)
+                payload = done = {
+                    **payload,
+                    "session_id": session_id,
+                    "turn": saved["turns"],
+                    "server_timing": metrics.request_timings()
+                }
+            elif event == "error" and payload.get("timeout"):
+                metrics.inc("gus_aborted_requests_total", endpoint="/chat/stream", reason="timeout")
+            await emit(event, payload)
+
+        # Speculative critic: the answer is already on screen; push a rewrite if needed
+        # (religious answers only; greetings and off-topic redirects are short by design)
+        answer = "".join(parts).strip()
+        if done and answer and done.get("intent") == RELIGIOUS and not done["is_redirect"] and should_critique():
+            rewrite = await asyncio.to_thread(critic_replacement, answer, query, done["language"], deadline)
+            if rewrite:
+                await asyncio.to_thread(sessions.replace_last_answer, session_id, rewrite)
+                await emit("replace", {"text": rewrite})
+
+    try:
+        await _unless_disconnected(receive, respond())
+    except ClientDisconnected:
+        metrics.inc("gus_aborted_requests_total", endpoint="/chat/stream", reason="disconnect")
+        return
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        await send({
+            "type": "http.response.body",
+            "body": format_sse("error", {"error": TECHNICAL_ERROR}).encode("utf-8"),
+            "more_body": True,
+        })
+
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+ROUTES = {
+    "/chat": chat,
+    "/chat/stream": chat_stream,
+}
+
+
+async def app(scope, receive, send):
+    """Route async chat endpoints; delegate the rest to Flask."""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    handler = ROUTES.get(scope.get("path"))
+    if scope["type"] == "http" and handler and scope["method"] == "POST":
+        return await handler(scope, receive, send)
+
+    await _flask(scope, receive, send)
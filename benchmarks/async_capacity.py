@@ -0,0 +1,72 @@
+"""
+Concurrent-request capacity per worker: sync vs async generation.
+
+Starts a local stand-in for DeepSeek (/chat/completions) and Ragie
+(/retrievals) with a fixed latency, then measures how many requests one
+worker completes per second:
+  - sync: generate_response, one request at a time (a default gunicorn sync worker)
+  - async: generate_response_async, N requests in flight on one event loop
+
+Usage:
+    python benchmarks/async_capacity.py --requests 100 --concurrency 100 --llm-latency 1.0
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_server import start_stub_server, stub_environment  # noqa: E402
+
+
+def run_sync(generate_response, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        result = generate_response(f"kenapa saya takut mati {i}")
+        assert not result["error"], result["error"]
+    return time.perf_counter() - start
+
+
+async def run_async(generate_response_async, n: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            result = await generate_response_async(f"kenapa saya takut mati {i}")
+            assert not result["error"], result["error"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sync-requests", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--ragie-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    base_url = start_stub_server(args.llm_latency, args.ragie_latency)
+    os.environ.update(stub_environment(base_url))
+    from generator import generate_response, generate_response_async
+
+    sync_elapsed = run_sync(generate_response, args.sync_requests)
+    async_elapsed = asyncio.run(run_async(generate_response_async, args.requests, args.concurrency))
+
+    sync_rps = args.sync_requests / sync_elapsed
+    async_rps = args.requests / async_elapsed
+    print(f"Stub latency: LLM {args.llm_latency:.2f}s, Ragie {args.ragie_latency:.2f}s")
+    print(f"sync  (1 in flight):   {args.sync_requests:4d} req in {sync_elapsed:6.2f}s -> {sync_rps:7.2f} req/s per worker")
+    print(f"async ({args.concurrency} in flight): {args.requests:4d} req in {async_elapsed:6.2f}s -> {async_rps:7.2f} req/s per worker")
+    print(f"Capacity gain: {async_rps / sync_rps:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
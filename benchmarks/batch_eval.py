@@ -0,0 +1,257 @@
+"""
+Offline batch evaluation: replay a question set through generate_response
+and validate_response, then report answer quality, latency and tokens.
+
+Questions are JSONL, one per line ("id" defaults to the line number,
+"history" is optional):
+    {"id": "q001", "question": "Gus, saya takut mati...", "history": [...]}
+
+Each finished question is appended to the results JSONL right away, so an
+interrupted run picks up where it stopped (questions that errored are
+retried). The report is written next to the results as *.report.json.
+
+Usage:
+    python benchmarks/batch_eval.py data/eval_questions.jsonl --out eval_results.jsonl
+    python benchmarks/batch_eval.py data/eval_questions.jsonl --stub        # offline, for CI
+    python benchmarks/batch_eval.py --report eval_results.jsonl             # re-summarize only
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_server import start_stub_server, stub_environment  # noqa: E402
+from resilience import RateLimiter  # noqa: E402
+
+
+def is_rate_limited(error: str) -> bool:
+    error = error.lower()
+    return "429" in error or "rate limit" in error or "too many requests" in error
+
+
+def load_questions(path: str) -> list[dict]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            questions.append({
+                "id": str(item.get("id", line_no)),
+                "question": item.get("question") or item.get("message") or "",
+                "history": item.get("history") or []
+            })
+    return questions
+
+
+def load_results(path: str) -> dict:
+    """Latest record per question id from a results file."""
+    results = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    results[record["id"]] = record
+    return results
+
+
+def evaluate_one(item: dict, limiter: RateLimiter, max_retries: int) -> dict:
+    """Generate and critique one question, retrying failed generations."""
+    from generator import generate_response, is_redirect
+    from critic import validate_response, score_answer
+
+    for attempt in range(max_retries + 1):
+        limiter.wait()
+        start = time.perf_counter()
+        result = generate_response(item["question"], history=item["history"], use_rag=True)
+        generate_s = time.perf_counter() - start
+        if not result["error"]:
+            break
+        if attempt < max_retries:
+            backoff = min(30.0, 2 ** attempt) * (1 + random.random())
+            if is_rate_limited(result["error"]):
+                limiter.pause(backoff)
+            time.sleep(backoff)
+
+    record = {
+        "id": item["id"],
+        "question": item["question"],
+        "language": result.get("language"),
+        "attempts": attempt + 1,
+        "error": result["error"]
+    }
+    if result["error"]:
+        return record
+
+    answer = result["response"]
+    redirect = is_redirect(answer)
+    critic_s = 0.0
+    critic = None
+    if not redirect:
+        start = time.perf_counter()
+        checked = validate_response(answer, item["question"], result["language"])
+        critic_s = time.perf_counter() - start
+        critic = {
+            "decision": checked["local_score"]["decision"],
+            "escalated": checked["local_score"]["decision"] != "pass",
+            "rewritten": checked["was_rewritten"],
+            "scores": checked["local_score"]["scores"]
+        }
+
+    record.update({
+        "response": answer,
+        "redirect": redirect,
+        "sentences": score_answer(answer, result["language"])["sentences"],
+        "chunks_retrieved": result.get("chunks_retrieved", 0),
+        "critic": critic,
+        "latency": {
+            "generate": round(generate_s, 3),
+            "critic": round(critic_s, 3),
+            "total": round(generate_s + critic_s, 3)
+        },
+        "prompt_tokens": (result.get("prompt_tokens") or {}).get("total"),
+        "usage": result.get("usage")
+    })
+    return record
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_report(results: dict) -> dict:
+    records = list(results.values())
+    done = [r for r in records if not r.get("error")]
+    errors = [r for r in records if r.get("error")]
+    critiqued = [r for r in done if r.get("critic")]
+    sentences = [r["sentences"] for r in critiqued]
+
+    latency = {}
+    for stage in ("generate", "critic", "total"):
+        values = [r["latency"][stage] for r in done if stage != "critic" or r.get("critic")]
+        latency[stage] = {
+            "mean": round(sum(values) / len(values), 3) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values, default=0.0)
+        }
+
+    tokens = {"prompt_tokens": 0, "prompt_cache_hit_tokens": 0, "completion_tokens": 0}
+    for r in done:
+        for key in tokens:
+            tokens[key] += (r.get("usage") or {}).get(key, 0)
+
+    def rate(part: int, whole: int) -> float:
+        return round(part / whole, 3) if whole else 0.0
+
+    return {
+        "questions": len(records),
+        "completed": len(done),
+        "errors": len(errors),
+        "redirect_rate": rate(sum(1 for r in done if r["redirect"]), len(done)),
+        "rewrite_rate": rate(sum(1 for r in critiqued if r["critic"]["rewritten"]), len(critiqued)),
+        "critic_skip_rate": rate(sum(1 for r in critiqued if not r["critic"]["escalated"]), len(critiqued)),
+        "sentences": {
+            "mean": round(sum(sentences) / len(sentences), 2) if sentences else 0.0,
+            "min": min(sentences, default=0),
+            "max": max(sentences, default=0),
+            "within_5_8": rate(sum(1 for n in sentences if 5 <= n <= 8), len(sentences))
+        },
+        "latency_s": latency,
+        "tokens": {
+            **tokens,
+            "per_question": round((tokens["prompt_tokens"] + tokens["completion_tokens"]) / len(done), 1) if done else 0.0
+        },
+        "failed_ids": sorted(r["id"] for r in errors)
+    }
+
+
+def print_report(report: dict):
+    print(f"\nQuestions: {report['completed']}/{report['questions']} completed, {report['errors']} errors")
+    print(f"Redirect rate:   {report['redirect_rate']:.1%}")
+    print(f"Rewrite rate:    {report['rewrite_rate']:.1%} (critic skipped locally for {report['critic_skip_rate']:.1%})")
+    s = report["sentences"]
+    print(f"Sentences:       mean {s['mean']}, range {s['min']}-{s['max']}, {s['within_5_8']:.1%} within 5-8")
+    for stage, stats in report["latency_s"].items():
+        print(f"Latency {stage:<9} mean {stats['mean']:.2f}s  p50 {stats['p50']:.2f}s  "
+              f"p95 {stats['p95']:.2f}s  max {stats['max']:.2f}s")
+    t = report["tokens"]
+    print(f"Tokens:          {t['prompt_tokens']} prompt ({t['prompt_cache_hit_tokens']} cached), "
+          f"{t['completion_tokens']} completion, {t['per_question']} per question")
+
+
+def report_path(results_path: str) -> str:
+    return os.path.splitext(results_path)[0] + ".report.json"
+
+
+def write_report(results_path: str) -> dict:
+    report = build_report(load_results(results_path))
+    with open(report_path(results_path), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", nargs="?", help="JSONL question set")
+    parser.add_argument("--out", default="eval_results.jsonl", help="results JSONL (also the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rps", type=float, default=0.0, help="max new requests per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=0, help="only the first N questions")
+    parser.add_argument("--stub", action="store_true", help="run against the local DeepSeek/Ragie stub")
+    parser.add_argument("--stub-latency", type=float, default=0.2)
+    parser.add_argument("--report", metavar="RESULTS", help="only rebuild the report for a results file")
+    args = parser.parse_args()
+
+    if args.report:
+        write_report(args.report)
+        return
+    if not args.questions:
+        parser.error("questions file is required")
+
+    # Fresh answers: never serve from the answer cache during an evaluation
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+    if args.stub:
+        os.environ.update(stub_environment(start_stub_server(args.stub_latency, args.stub_latency / 4)))
+
+    questions = load_questions(args.questions)
+    if args.limit:
+        questions = questions[:args.limit]
+    finished = {rid for rid, r in load_results(args.out).items() if not r.get("error")}
+    pending = [q for q in questions if q["id"] not in finished]
+    print(f"{len(questions)} questions, {len(questions) - len(pending)} already done, {len(pending)} to run")
+
+    limiter = RateLimiter(args.rps)
+    start = time.perf_counter()
+    completed = 0
+    with open(args.out, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(evaluate_one, q, limiter, args.retries) for q in pending]
+        for future in as_completed(futures):
+            out.write(json.dumps(future.result(), ensure_ascii=False) + "\n")
+            out.flush()
+            completed += 1
+            if completed % 50 == 0 or completed == len(pending):
+                elapsed = time.perf_counter() - start
+                print(f"  {completed}/{len(pending)} in {elapsed:.1f}s ({completed / elapsed:.1f} q/s)")
+
+    report = write_report(args.out)
+    print(f"Report: {report_path(args.out)}")
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
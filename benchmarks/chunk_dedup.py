@@ -0,0 +1,124 @@
+"""
+Near-duplicate chunk elimination benchmark on retrieval dumps.
+
+Capture the raw per-leg results of real retrievals once (live Ragie, or
+the local BM25 index when RETRIEVAL_BACKEND=local / no Ragie key), then
+replay them offline through rank fusion with dedup.py off and at several
+thresholds. For each setting it reports chunks dropped and windows merged,
+what fit_context packs into the CONTEXT_TOKEN_BUDGET (chunks, tokens), how
+much of the packed context repeats earlier text (word 8-grams seen before)
+and the dedup time per retrieval.
+
+Usage:
+    python benchmarks/chunk_dedup.py --capture data/eval_questions.jsonl --dumps retrieval_dumps.jsonl
+    python benchmarks/chunk_dedup.py --dumps retrieval_dumps.jsonl [--thresholds 0.3,0.4,0.5,0.6,0.7] [--verbose]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DEEPSEEK_API_KEY", "unused")
+
+import dedup  # noqa: E402
+import local_index  # noqa: E402
+import ragie_client  # noqa: E402
+from prompt_budget import CONTEXT_TOKEN_BUDGET, fit_context  # noqa: E402
+from query_variants import build_variants  # noqa: E402
+
+NGRAM = 8
+
+
+def capture(questions_path: str, dumps_path: str, top_k: int):
+    """Run every question's retrieval legs and save the raw results."""
+    local = ragie_client._use_local_only()
+    with open(questions_path, encoding="utf-8") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    with open(dumps_path, "w", encoding="utf-8") as out:
+        for item in questions:
+            query = item.get("question") or item.get("query") or ""
+            if local:
+                legs = [["local", local_index.search(query, top_k)]]
+            else:
+                legs = [[leg, ragie_client.search_ragie(search_query, top_k, leg=leg)]
+                        for leg, search_query in build_variants(query, item.get("history") or [])]
+            out.write(json.dumps({"query": query, "legs": legs}, ensure_ascii=False) + "\n")
+    print(f"Captured {len(questions)} retrievals ({'local index' if local else 'Ragie'}) to {dumps_path}")
+
+
+def repeated_share(context: str) -> float:
+    """Share of the context's word 8-grams that already appeared earlier in it."""
+    words = context.lower().split()
+    grams = [tuple(words[i:i + NGRAM]) for i in range(len(words) - NGRAM + 1)]
+    seen = set()
+    repeated = 0
+    for gram in grams:
+        repeated += gram in seen
+        seen.add(gram)
+    return repeated / len(grams) if grams else 0.0
+
+
+def evaluate(dumps: list, threshold: float | None, top_k: int, verbose: bool) -> dict:
+    totals = {"dropped": 0, "merged": 0, "packed": 0, "tokens": 0, "repeated": 0.0, "seconds": 0.0}
+    for dump in dumps:
+        candidates = ragie_client.fuse_chunks([tuple(leg) for leg in dump["legs"]], top_k=10 ** 6)
+        if threshold is not None:
+            start = time.perf_counter()
+            kept, counts = dedup.dedup_chunks(candidates, threshold)
+            totals["seconds"] += time.perf_counter() - start
+            totals["dropped"] += counts["duplicates"]
+            totals["merged"] += counts["merged"]
+            if verbose and (counts["duplicates"] or counts["merged"]):
+                print(f"  [{threshold}] {dump['query'][:50]!r}: {counts}")
+            candidates = kept
+        context, tokens, packed = fit_context(candidates[:top_k], CONTEXT_TOKEN_BUDGET)
+        totals["packed"] += packed
+        totals["tokens"] += tokens
+        totals["repeated"] += repeated_share(context)
+    n = len(dumps)
+    return {
+        "dropped": totals["dropped"] / n,
+        "merged": totals["merged"] / n,
+        "packed": totals["packed"] / n,
+        "tokens": totals["tokens"] / n,
+        "repeated": totals["repeated"] / n,
+        "ms": totals["seconds"] / n * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capture", metavar="QUESTIONS", help="JSONL question set to capture retrievals for")
+    parser.add_argument("--dumps", default="retrieval_dumps.jsonl", help="retrieval dumps JSONL")
+    parser.add_argument("--thresholds", default="0.3,0.4,0.5,0.6,0.7")
+    parser.add_argument("--top-k", type=int, default=6, help="chunks handed to prompt packing")
+    parser.add_argument("--verbose", action="store_true", help="print every retrieval that changed")
+    args = parser.parse_args()
+
+    if args.capture:
+        capture(args.capture, args.dumps, args.top_k)
+        return
+
+    with open(args.dumps, encoding="utf-8") as f:
+        dumps = [json.loads(line) for line in f if line.strip()]
+    if not dumps:
+        sys.exit(f"No retrievals in {args.dumps}")
+    dedup.DEDUP_ENABLED = False  # fuse_chunks returns the raw fused ranking; dedup is applied below
+
+    print(f"{len(dumps)} retrievals, top_k={args.top_k}, context budget {CONTEXT_TOKEN_BUDGET} tokens\n")
+    print(f"{'threshold':>9} {'dropped':>8} {'merged':>7} {'packed':>7} {'tokens':>7} {'repeated':>9} {'ms':>6}")
+    settings = [None] + [float(t) for t in args.thresholds.split(",")]
+    for threshold in settings:
+        row = evaluate(dumps, threshold, args.top_k, args.verbose)
+        label = "off" if threshold is None else f"{threshold:.2f}"
+        print(f"{label:>9} {row['dropped']:>8.2f} {row['merged']:>7.2f} {row['packed']:>7.2f} "
+              f"{row['tokens']:>7.0f} {row['repeated']:>9.1%} {row['ms']:>6.2f}")
+    print("\nPer retrieval: chunks dropped/merged, chunks and tokens packed, share of packed text repeated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Critic fast-path regression check and micro-benchmark.
+
+Scores every answer in data/critic_cases.jsonl with the local rule-based
+scorer and checks it against the expected outcome ("pass" skips the LLM
+critic, "escalate" sends it on; exit code 1 on any mismatch), prints the
+per-criterion scores for tuning CRITIC_PASS_SCORE, then times the scorer.
+
+Usage:
+    python benchmarks/critic_fast_path.py [--iterations 5000] [--verbose]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DEEPSEEK_API_KEY", "unused")
+
+from critic import score_answer  # noqa: E402
+
+CASES_PATH = os.path.join(ROOT, "data", "critic_cases.jsonl")
+
+
+def check_cases(cases: list, verbose: bool) -> int:
+    failures = 0
+    totals = {}
+    skipped = 0
+    for case in cases:
+        result = score_answer(case["answer"], case["language"])
+        got = "pass" if result["decision"] == "pass" else "escalate"
+        skipped += got == "pass"
+        for name, value in result["scores"].items():
+            totals[name] = totals.get(name, 0.0) + value
+        if got != case["expected"]:
+            failures += 1
+            print(f"FAIL expected {case['expected']}, got {result['decision']}: {case['answer'][:60]!r}")
+        if verbose or got != case["expected"]:
+            criteria = " ".join(f"{name}={value:.2f}" for name, value in result["scores"].items())
+            print(f"  score={result['score']} sentences={result['sentences']} {criteria}")
+    print(f"Regression cases: {len(cases) - failures}/{len(cases)} passed")
+    print(f"Would skip the LLM critic for {skipped}/{len(cases)} answers")
+    print("Mean per-criterion: " + " ".join(f"{name}={value / len(cases):.2f}" for name, value in totals.items()))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--verbose", action="store_true", help="print scores for every case")
+    args = parser.parse_args()
+
+    with open(CASES_PATH, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = check_cases(cases, args.verbose)
+
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        case = cases[i % len(cases)]
+        score_answer(case["answer"], case["language"])
+    elapsed = time.perf_counter() - start
+    print(f"\nLocal scorer: {elapsed / args.iterations * 1e6:.1f} us/answer")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
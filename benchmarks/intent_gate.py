@@ -0,0 +1,88 @@
+"""
+Intent gate accuracy check and micro-benchmark.
+
+Classifies every query in data/intent_cases.jsonl (with its optional
+"history") with the local intent gate (intent.py) and prints the accuracy, per-class precision/recall, the
+confusion matrix and the share of Ragie retrievals the gate saves. Exit
+code 1 if a religious question would skip retrieval (an ungrounded answer)
+or accuracy falls below --min-accuracy. Then times the classifier.
+
+Usage:
+    python benchmarks/intent_gate.py [--iterations 20000] [--min-accuracy 0.9] [--verbose]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent import INTENTS, RELIGIOUS, classify  # noqa: E402
+
+CASES_PATH = os.path.join(ROOT, "data", "intent_cases.jsonl")
+
+
+def check_cases(cases: list, verbose: bool) -> tuple[float, int]:
+    confusion = {expected: {got: 0 for got in INTENTS} for expected in INTENTS}
+    correct = 0
+    ungrounded = 0
+    for case in cases:
+        got = classify(case["query"], case.get("history"))
+        confusion[case["expected"]][got] += 1
+        correct += got == case["expected"]
+        if case["expected"] == RELIGIOUS and got != RELIGIOUS:
+            ungrounded += 1
+        if verbose or got != case["expected"]:
+            status = "ok  " if got == case["expected"] else "MISS"
+            print(f"{status} expected {case['expected']:<9} got {got:<9} {case['query'][:60]!r}")
+
+    accuracy = correct / len(cases)
+    print(f"\nAccuracy: {correct}/{len(cases)} = {accuracy:.1%}")
+    print(f"{'':<10} {'precision':>9} {'recall':>7} {'cases':>6}")
+    for label in INTENTS:
+        predicted = sum(confusion[expected][label] for expected in INTENTS)
+        actual = sum(confusion[label].values())
+        precision = confusion[label][label] / predicted if predicted else 0.0
+        recall = confusion[label][label] / actual if actual else 0.0
+        print(f"{label:<10} {precision:>9.2f} {recall:>7.2f} {actual:>6}")
+
+    print("\nConfusion (rows = expected, columns = predicted):")
+    print(f"{'':<10} " + " ".join(f"{label:>9}" for label in INTENTS))
+    for expected in INTENTS:
+        print(f"{expected:<10} " + " ".join(f"{confusion[expected][got]:>9}" for got in INTENTS))
+
+    skipped = sum(confusion[expected][got] for expected in INTENTS for got in INTENTS if got != RELIGIOUS)
+    needless = sum(confusion[expected][RELIGIOUS] for expected in INTENTS if expected != RELIGIOUS)
+    print(f"\nRetrieval calls saved: {skipped}/{len(cases)} ({skipped / len(cases):.0%})")
+    print(f"Non-grounded queries still retrieved for: {needless}")
+    print(f"Religious queries answered without retrieval: {ungrounded}")
+    return accuracy, ungrounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--min-accuracy", type=float, default=0.9)
+    parser.add_argument("--verbose", action="store_true", help="print every case")
+    args = parser.parse_args()
+
+    with open(CASES_PATH, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    accuracy, ungrounded = check_cases(cases, args.verbose)
+
+    classify(cases[0]["query"])  # build the trie outside the timing
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        classify(cases[i % len(cases)]["query"])
+    elapsed = time.perf_counter() - start
+    print(f"\nClassifier: {elapsed / args.iterations * 1e6:.1f} us/query")
+
+    sys.exit(1 if ungrounded or accuracy < args.min_accuracy else 0)
+
+
+if __name__ == "__main__":
+    main()
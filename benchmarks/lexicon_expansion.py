@@ -0,0 +1,90 @@
+"""
+Query-expansion regression check and micro-benchmark.
+
+Checks every case in data/lexicon_cases.jsonl against the compiled
+lexicon (exit code 1 on any mismatch), then times the compiled trie
+against the old per-request substring scan.
+
+Usage:
+    python benchmarks/lexicon_expansion.py [--iterations 20000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexicon import Lexicon, LEXICON_PATH  # noqa: E402
+
+CASES_PATH = os.path.join(ROOT, "data", "lexicon_cases.jsonl")
+
+
+def substring_expand(entries: dict, query: str) -> str | None:
+    """The previous approach: scan every term with `term in query_lower`."""
+    query_lower = query.lower()
+    terms = [eng for indo, eng in entries.items() if indo in query_lower]
+    return " ".join(terms) if terms else None
+
+
+def check_cases(lexicon: Lexicon) -> int:
+    failures = 0
+    with open(CASES_PATH, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    for case in cases:
+        got = lexicon.expand(case["query"])
+        if got != case["expected"]:
+            failures += 1
+            print(f"FAIL {case['query']!r}: expected {case['expected']!r}, got {got!r}")
+    print(f"Regression cases: {len(cases) - failures}/{len(cases)} passed")
+    return failures
+
+
+def bench(name: str, fn, queries: list, iterations: int):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(queries[i % len(queries)])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {elapsed / iterations * 1e6:8.2f} us/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(LEXICON_PATH, encoding="utf-8") as f:
+        entries = json.load(f)
+
+    start = time.perf_counter()
+    lexicon = Lexicon(entries)
+    print(f"Compiled {lexicon.size} terms in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    failures = check_cases(lexicon)
+
+    queries = [
+        "Saya takut mati karena dosa saya banyak, apakah Allah masih mau mengampuni?",
+        "males sholat subuh gimana ya",
+        "What if I keep sinning even though I try to repent?",
+        "ojo wedi karo dosa, Gusti Allah iku welas asih",
+    ]
+    # Grow the lexicon to thousands of terms to show how each approach scales
+    large = dict(entries)
+    large.update({f"istilah{i}": f"term{i}" for i in range(5000)})
+    large_lexicon = Lexicon(large)
+
+    print(f"\n{len(entries)} terms:")
+    bench("substring scan", lambda q: substring_expand(entries, q), queries, args.iterations)
+    bench("compiled trie", lexicon.expand, queries, args.iterations)
+    print(f"\n{len(large)} terms:")
+    bench("substring scan", lambda q: substring_expand(large, q), queries, args.iterations // 10)
+    bench("compiled trie", large_lexicon.expand, queries, args.iterations)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
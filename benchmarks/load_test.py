@@ -0,0 +1,252 @@
+"""
+End-to-end load benchmark: drives /chat (or /chat/stream) at a target
+request rate against gunicorn, with DeepSeek and Ragie replaced by the
+local stub (benchmarks/stub_server.py), and reports latency percentiles,
+throughput and error rates per server configuration.
+
+Configurations are worker_class:workers:threads, where worker_class is
+sync, gthread (main:app) or uvicorn (asgi:app):
+    python benchmarks/load_test.py --configs sync:2:1,gthread:2:8,uvicorn:2:1 --rps 20 --duration 30
+
+Use it as a regression gate: save a baseline, then compare later runs
+(exit code 1 if p95, throughput or error rate regress beyond the margin):
+    python benchmarks/load_test.py --save baseline.json
+    python benchmarks/load_test.py --baseline baseline.json --max-regression 0.15
+
+Open-loop: requests start on schedule whether or not earlier ones have
+finished, so queueing in the server shows up in the latencies.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_server import (  # noqa: E402
+    start_stub_server, stub_environment, add_stub_arguments, stub_config
+)
+from benchmarks.batch_eval import percentile  # noqa: E402
+
+WORKER_CLASSES = {
+    "sync": ("sync", "main:app"),
+    "gthread": ("gthread", "main:app"),
+    "uvicorn": ("uvicorn.workers.UvicornWorker", "asgi:app"),
+}
+
+QUESTIONS = [
+    "Gus, saya takut mati karena dosa saya banyak",
+    "Kenapa doa saya gak dikabulkan terus?",
+    "Saya males ibadah, munafik gak?",
+    "I keep repeating the same sin. Will God still forgive me?",
+    "Gimana caranya ikhlas kalau rezeki seret?",
+]
+
+
+def parse_config(text: str) -> dict:
+    worker_class, workers, threads = (text.split(":") + ["1", "1"])[:3]
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"Unknown worker class {worker_class!r} (choose from {', '.join(WORKER_CLASSES)})")
+    return {"name": text, "worker_class": worker_class, "workers": int(workers), "threads": int(threads)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(config: dict, env: dict) -> tuple[subprocess.Popen, str]:
+    """Start gunicorn with one configuration; returns (process, base URL) once it answers."""
+    worker_class, app = WORKER_CLASSES[config["worker_class"]]
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "gunicorn", app,
+        "--bind", f"127.0.0.1:{port}",
+        "--worker-class", worker_class,
+        "--workers", str(config["workers"]),
+        "--threads", str(config["threads"]),
+        "--timeout", "120",
+        "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode} ({config['name']})")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not start ({config['name']})")
+
+
+def _sse_event_names(buffer: bytes) -> tuple[list[str], bytes]:
+    """Names of the complete events in an SSE buffer, plus the unfinished rest."""
+    names = []
+    *events, rest = buffer.replace(b"\r\n", b"\n").split(b"\n\n")
+    for event in events:
+        for line in event.split(b"\n"):
+            if line.startswith(b"event:"):
+                names.append(line[len(b"event:"):].strip().decode("utf-8", "replace"))
+    return names, rest
+
+
+async def _one_request(client: httpx.AsyncClient, endpoint: str, question: str) -> dict:
+    start = time.perf_counter()
+    first_byte = None
+    streaming = endpoint.endswith("/stream")
+    try:
+        async with client.stream("POST", endpoint, json={"message": question}) as response:
+            buffer = b""
+            async for chunk in response.aiter_bytes():
+                if first_byte is None and chunk:
+                    first_byte = time.perf_counter() - start
+                buffer += chunk
+                if streaming:
+                    names, buffer = _sse_event_names(buffer)
+                    if "error" in names:
+                        return {"status": "stream_error", "latency": time.perf_counter() - start}
+            status = str(response.status_code)
+            if not streaming and status == "200":
+                try:
+                    if json.loads(buffer).get("error"):
+                        status = "app_error"
+                except ValueError:
+                    status = "bad_json"
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {"status": status, "latency": time.perf_counter() - start, "ttfb": first_byte}
+
+
+async def drive(base_url: str, endpoint: str, rps: float, duration: float, timeout: float) -> dict:
+    """Open-loop load at `rps` for `duration` seconds; returns the summary."""
+    total = max(1, int(rps * duration))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+
+        async def scheduled(i: int):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return await _one_request(client, endpoint, f"{QUESTIONS[i % len(QUESTIONS)]} ({i})")
+
+        results = await asyncio.gather(*(scheduled(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == "200"]
+    latencies = [r["latency"] for r in ok]
+    ttfbs = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    errors = {}
+    for r in results:
+        if r["status"] != "200":
+            errors[r["status"]] = errors.get(r["status"], 0) + 1
+    return {
+        "requests": total,
+        "ok": len(ok),
+        "error_rate": round((total - len(ok)) / total, 4),
+        "errors": errors,
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies, default=0.0), 3)
+        },
+        "ttfb_p50_s": round(percentile(ttfbs, 50), 3)
+    }
+
+
+def compare(results: dict, baseline: dict, margin: float) -> list[str]:
+    """Regressions against a saved baseline (same configuration names)."""
+    problems = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if current["latency_s"]["p95"] > before["latency_s"]["p95"] * (1 + margin):
+            problems.append(f"{name}: p95 {before['latency_s']['p95']}s -> {current['latency_s']['p95']}s")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - margin):
+            problems.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current["error_rate"] > before["error_rate"] + 0.01:
+            problems.append(f"{name}: error rate {before['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default="sync:2:1,gthread:2:8,uvicorn:2:1")
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/chat/stream"])
+    parser.add_argument("--rps", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--stub-url", help="use an already running stub instead of starting one")
+    parser.add_argument("--save", metavar="PATH", help="write results as a baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="fail if results regress against this baseline")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    add_stub_arguments(parser, llm_latency="lognormal:0.8:0.3", ragie_latency="lognormal:0.15:0.3")
+    args = parser.parse_args()
+
+    configs = [parse_config(c) for c in args.configs.split(",")]
+    stub_url = args.stub_url or start_stub_server(**stub_config(args))
+    env = {
+        **os.environ,
+        **stub_environment(stub_url),
+        "METRICS_DIR": tempfile.mkdtemp(prefix="gus-bench-metrics-"),
+    }
+
+    print(f"Stub {stub_url}: LLM {args.llm_latency} (errors {args.llm_error_rate:.0%}), "
+          f"Ragie {args.ragie_latency} (errors {args.ragie_error_rate:.0%})")
+    print(f"Load: {args.rps} req/s for {args.duration}s on {args.endpoint}\n")
+    print(f"{'config':<18} {'ok':>6} {'err%':>6} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'ttfb50':>7}")
+
+    results = {}
+    for config in configs:
+        process, base_url = start_app(config, env)
+        try:
+            asyncio.run(drive(base_url, args.endpoint, min(args.rps, 5), 1, args.timeout))  # warm-up
+            summary = asyncio.run(drive(base_url, args.endpoint, args.rps, args.duration, args.timeout))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        results[config["name"]] = summary
+        lat = summary["latency_s"]
+        print(f"{config['name']:<18} {summary['ok']:>6} {summary['error_rate']:>6.1%} "
+              f"{summary['throughput_rps']:>7.2f} {lat['p50']:>6.2f}s {lat['p95']:>6.2f}s "
+              f"{lat['p99']:>6.2f}s {summary['ttfb_p50_s']:>6.2f}s")
+        if summary["errors"]:
+            print(f"{'':<18} errors: {summary['errors']}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.max_regression)
+        if problems:
+            print("\nRegressions:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
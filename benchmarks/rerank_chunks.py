@@ -0,0 +1,105 @@
+"""
+MMR re-ranker benchmark on retrieval dumps.
+
+Replays retrievals captured with benchmarks/chunk_dedup.py --capture:
+fuses each one's legs into RERANK_CANDIDATES candidates, then compares
+the top RAG_TOP_K by retrieval rank with the re-ranked selection (and the
+previous top 8) on packed context tokens, lexical relevance to the
+question and redundancy (mean pairwise similarity of the picked chunks).
+Times rerank() with a cold and a warm chunk-vector cache; exit code 1 if
+the warm p95 exceeds --max-ms.
+
+Usage:
+    python benchmarks/rerank_chunks.py --dumps retrieval_dumps.jsonl [--top-k 5] [--max-ms 5]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DEEPSEEK_API_KEY", "unused")
+
+import rerank  # noqa: E402
+import ragie_client  # noqa: E402
+from prompt_budget import CONTEXT_TOKEN_BUDGET, fit_context  # noqa: E402
+
+
+def _tfidf(texts: list[str]) -> np.ndarray:
+    """Normalized hashed TF-IDF rows (same features as rerank.py), for scoring selections."""
+    matrix = np.zeros((len(texts), rerank.RERANK_HASH_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        indices, weights = rerank._sparse_tf(text)
+        matrix[row, indices] = weights
+    df = np.count_nonzero(matrix[1:], axis=0)
+    matrix *= np.log((1.0 + len(texts) - 1) / (1.0 + df)) + 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def score_selection(query: str, candidates: list[dict], picked: list[dict]) -> dict:
+    vectors = _tfidf([query] + [chunk["text"] for chunk in candidates])
+    index = {id(chunk): i + 1 for i, chunk in enumerate(candidates)}
+    rows = vectors[[index[id(chunk)] for chunk in picked]]
+    similarity = rows @ rows.T
+    pairs = len(picked) * (len(picked) - 1)
+    _, tokens, _ = fit_context(picked, CONTEXT_TOKEN_BUDGET)
+    return {
+        "tokens": tokens,
+        "relevance": float((rows @ vectors[0]).mean()) if len(picked) else 0.0,
+        "redundancy": float((similarity.sum() - np.trace(similarity)) / pairs) if pairs else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dumps", default="retrieval_dumps.jsonl", help="retrieval dumps JSONL")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=5.0, help="fail if the warm p95 is slower")
+    args = parser.parse_args()
+
+    with open(args.dumps, encoding="utf-8") as f:
+        dumps = [json.loads(line) for line in f if line.strip()]
+    cases = []
+    for dump in dumps:
+        candidates = ragie_client.fuse_chunks([tuple(leg) for leg in dump["legs"]], rerank.RERANK_CANDIDATES)
+        if len(candidates) > 1:
+            cases.append((dump["query"], candidates))
+    if not cases:
+        sys.exit(f"No retrievals with 2+ chunks in {args.dumps}")
+
+    totals = {name: {"tokens": 0.0, "relevance": 0.0, "redundancy": 0.0} for name in ("rank top-8", "rank top-k", "mmr top-k")}
+    cold, warm = [], []
+    for query, candidates in cases:
+        start = time.perf_counter()
+        picked = rerank.rerank(query, candidates, args.top_k)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        rerank.rerank(query, candidates, args.top_k)
+        warm.append(time.perf_counter() - start)
+        for name, selection in (("rank top-8", candidates[:8]), ("rank top-k", candidates[:args.top_k]),
+                                ("mmr top-k", picked)):
+            for key, value in score_selection(query, candidates, selection).items():
+                totals[name][key] += value
+
+    n = len(cases)
+    print(f"{n} retrievals, {rerank.RERANK_CANDIDATES} candidates -> top {args.top_k} "
+          f"(alpha={rerank.RERANK_ALPHA}, lambda={rerank.RERANK_LAMBDA})\n")
+    print(f"{'selection':<11} {'tokens':>7} {'relevance':>10} {'redundancy':>11}")
+    for name, row in totals.items():
+        print(f"{name:<11} {row['tokens'] / n:>7.0f} {row['relevance'] / n:>10.3f} {row['redundancy'] / n:>11.3f}")
+
+    warm_p95 = sorted(warm)[min(n - 1, int(0.95 * n))] * 1000
+    print(f"\nrerank(): cold {np.mean(cold) * 1000:.2f} ms mean, warm {np.mean(warm) * 1000:.2f} ms mean, "
+          f"{warm_p95:.2f} ms p95")
+    print(f"Chunk vector cache: {rerank.stats()}")
+    sys.exit(1 if warm_p95 > args.max_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Local stand-ins for the DeepSeek (OpenAI-compatible /chat/completions,
+including "stream": true) and Ragie (/retrievals and the /documents API
+used by ingest.py) APIs, so benchmarks, evaluations and ingestion run
+without network access or API keys.
+
+Retrievals return `scored_chunks` whose document_names come from
+data/sources.json. Critic prompts (they ask for "STATUS: VALID") are
+answered with VALID; every other completion returns a short Gus Baha-style
+answer, streamed word by word when asked.
+
+Documents are kept in memory: POST /documents/raw, PUT
+/documents/{id}/raw, PATCH /documents/{id}/metadata and GET /documents
+(cursor pagination). --ragie-doc-rps answers requests over that rate with
+429 and Retry-After, like Ragie's rate limit.
+
+Latencies are specs: "0.5" (fixed seconds), "uniform:0.2:1.0" or
+"lognormal:0.8:0.5" (median, sigma). Error rates inject HTTP errors.
+
+Run standalone and point the app at it:
+    python benchmarks/stub_server.py --port 8100 --llm-latency lognormal:0.8:0.4 --ragie-error-rate 0.05
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8100 RAGIE_BASE_URL=http://127.0.0.1:8100 ...
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES_PATH = os.path.join(ROOT, "data", "sources.json")
+
+STUB_TEXTS = [
+    "Wong Allah itu pemalu, malu kalau ada yang angkat tangan gak dikasih.",
+    "Orang Badui ditanya siapa yang menghisab, jawabnya Allah sendiri, terus ketawa.",
+    "Rahmat Allah itu lebih luas dari murka-Nya, makanya jangan putus asa.",
+    "Ibadah itu jangan dibikin berat, Nabi sendiri memilih yang paling mudah.",
+    "Manusia tempat salah dan lupa, Allah sudah tahu itu sejak awal.",
+    "God's mercy outruns His anger; despair is the real mistake.",
+]
+
+STUB_ANSWER = (
+    "Wah, itu wajar banget! Wong semua orang juga pernah ngerasain. "
+    "Dulu ada orang Badui yang yakin banget Allah bakal baik sama dia. "
+    "Nabi malah senang dengar itu, katanya orang ini paham. "
+    "Allah itu Maha Pengampun, jauh lebih luas dari dosa kita. "
+    "Jadi tenang aja, pelan-pelan. Gitu aja kok repot."
+)
+
+
+def parse_latency(spec) -> callable:
+    """Latency spec -> function returning one sample in seconds."""
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        value = float(kind)
+        return lambda: value
+    args = [float(p) for p in params.split(":")]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "lognormal":
+        median, sigma = args
+        return lambda: median * random.lognormvariate(0, sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def _document_names() -> list[str]:
+    try:
+        with open(SOURCES_PATH, encoding="utf-8") as f:
+            names = list(json.load(f).get("sources", {}))
+    except (OSError, ValueError):
+        names = []
+    return names or ["gusbaha_10_refined.md"]
+
+
+def _completion(content: str, prompt_tokens: int = 1000, completion_tokens: int = 50) -> dict:
+    return {
+        "id": "stub", "object": "chat.completion", "created": 0, "model": "deepseek-chat",
+        "choices": [{
+            "index": 0, "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def _stream_chunk(delta: dict, finish_reason: str = None) -> dict:
+    return {
+        "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "deepseek-chat",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+
+def _serve_stub(config: dict, port: int, port_queue=None):
+    """Threaded stub for both APIs."""
+    llm_latency = parse_latency(config.get("llm_latency", 0.0))
+    ragie_latency = parse_latency(config.get("ragie_latency", 0.0))
+    llm_error_rate = config.get("llm_error_rate", 0.0)
+    ragie_error_rate = config.get("ragie_error_rate", 0.0)
+    error_status = config.get("error_status", 500)
+    token_interval = config.get("token_interval", 0.0)
+    doc_rps = config.get("ragie_doc_rps", 0.0)
+    document_names = _document_names()
+    documents = {}  # id -> {"id", "name", "metadata", "partition", "text", "status"}
+    doc_window = {"second": 0, "count": 0}
+    doc_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the app hung up mid-stream (client disconnect or deadline)
+
+        def _send_json(self, status: int, body: dict):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_event(self, data: str):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        def _stream(self, content: str, include_usage: bool):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self._send_event(json.dumps(_stream_chunk({"role": "assistant", "content": ""})))
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                if i and token_interval:
+                    time.sleep(token_interval)
+                text = word if i == len(words) - 1 else word + " "
+                self._send_event(json.dumps(_stream_chunk({"content": text})))
+            self._send_event(json.dumps(_stream_chunk({}, "stop")))
+            if include_usage:
+                usage = {"prompt_tokens": 1000, "completion_tokens": len(words),
+                         "total_tokens": 1000 + len(words)}
+                self._send_event(json.dumps({**_stream_chunk({}), "choices": [], "usage": usage}))
+            self._send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _documents(self, method: str, request: dict):
+            """Stand-in for Ragie's documents API; True if the path was one of its routes."""
+            path, _, query = self.path.partition("?")
+            parts = path.strip("/").split("/")
+            if parts[0] != "documents":
+                return False
+            time.sleep(ragie_latency())
+            with doc_lock:
+                second = int(time.time())
+                if doc_window["second"] != second:
+                    doc_window.update(second=second, count=0)
+                doc_window["count"] += 1
+                limited = doc_rps and doc_window["count"] > doc_rps
+            if limited:
+                payload = b'{"detail": "rate limited"}'
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return True
+            if random.random() < ragie_error_rate:
+                self._send_json(error_status, {"detail": "stub error"})
+                return True
+
+            if method == "GET" and len(parts) == 1:
+                params = dict(p.partition("=")[::2] for p in query.split("&") if p)
+                start = int(params.get("cursor") or 0)
+                size = int(params.get("page_size") or 10)
+                partition = self.headers.get("partition")
+                with doc_lock:
+                    listed = [{k: v for k, v in doc.items() if k != "text"} for doc in documents.values()
+                              if not partition or doc["partition"] == partition]
+                page = listed[start:start + size]
+                cursor = str(start + size) if start + size < len(listed) else None
+                self._send_json(200, {"documents": page, "pagination": {"next_cursor": cursor}})
+            elif method == "POST" and parts[1:] == ["raw"]:
+                doc = {
+                    "id": str(uuid.uuid4()), "name": request.get("name", ""),
+                    "metadata": request.get("metadata") or {}, "partition": request.get("partition"),
+                    "text": request.get("data", ""), "status": "ready"
+                }
+                with doc_lock:
+                    documents[doc["id"]] = doc
+                self._send_json(201, {k: v for k, v in doc.items() if k != "text"})
+            elif len(parts) == 3 and method in ("PUT", "PATCH") and parts[2] in ("raw", "metadata"):
+                with doc_lock:
+                    doc = documents.get(parts[1])
+                    if doc is not None:
+                        if parts[2] == "raw":
+                            doc["text"] = request.get("data", "")
+                        else:
+                            doc["metadata"].update(request.get("metadata") or {})
+                if doc is None:
+                    self._send_json(404, {"detail": "Document not found"})
+                else:
+                    self._send_json(200, {"id": doc["id"], "status": doc["status"]})
+            else:
+                self._send_json(404, {"detail": "Not found"})
+            return True
+
+        def do_GET(self):
+            if not self._documents("GET", {}):
+                self._send_json(404, {"detail": "Not found"})
+
+        def do_PUT(self):
+            if not self._documents("PUT", self._read_json()):
+                self._send_json(404, {"detail": "Not found"})
+
+        def do_PATCH(self):
+            if not self._documents("PATCH", self._read_json()):
+                self._send_json(404, {"detail": "Not found"})
+
+        def do_POST(self):
+            request = self._read_json()
+            if self._documents("POST", request):
+                return
+            if self.path.endswith("/retrievals"):
+                time.sleep(ragie_latency())
+                if random.random() < ragie_error_rate:
+                    return self._send_json(error_status, {"detail": "stub error"})
+                top_k = int(request.get("top_k", 6))
+                chunks = [{
+                    "text": f"{random.choice(STUB_TEXTS)} ({request.get('query', '')[:40]} #{i})",
+                    "score": round(0.9 - i * 0.05, 3),
+                    "document_name": random.choice(document_names)
+                } for i in range(top_k)]
+                return self._send_json(200, {"scored_chunks": chunks})
+
+            time.sleep(llm_latency())
+            if random.random() < llm_error_rate:
+                return self._send_json(error_status, {"error": {"message": "stub error", "type": "server_error"}})
+            prompt = json.dumps(request.get("messages", []))
+            content = "STATUS: VALID" if "STATUS: VALID" in prompt else STUB_ANSWER
+            if request.get("stream"):
+                include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                return self._stream(content, include_usage)
+            self._send_json(200, _completion(content))
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    if port_queue is not None:
+        port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_stub_server(llm_latency=0.0, ragie_latency=0.0, **config) -> str:
+    """
+    Start the stub in a separate process (no GIL sharing); returns its base URL.
+
+    Args:
+        llm_latency / ragie_latency: seconds or latency spec (see module docstring)
+        config: llm_error_rate, ragie_error_rate, error_status, token_interval, ragie_doc_rps
+    """
+    config = {"llm_latency": llm_latency, "ragie_latency": ragie_latency, **config}
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_stub, args=(config, 0, port_queue), daemon=True)
+    process.start()
+    return f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+
+def stub_environment(base_url: str) -> dict:
+    """Environment that points the app at the stub, with caches off."""
+    return {
+        "DEEPSEEK_BASE_URL": base_url,
+        "DEEPSEEK_API_KEY": "stub",
+        "RAGIE_BASE_URL": base_url,
+        "RAGIE_API_KEY": "stub",
+        "RETRIEVAL_CACHE_ENABLED": "0",
+        "RESPONSE_CACHE_ENABLED": "0",
+        "DATABASE_URL": "",
+    }
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser, llm_latency: str = "0.5", ragie_latency: str = "0.1"):
+    """Stub options shared by the benchmark scripts."""
+    parser.add_argument("--llm-latency", default=llm_latency, help="latency spec for DeepSeek (time to first token)")
+    parser.add_argument("--ragie-latency", default=ragie_latency, help="latency spec for Ragie")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--ragie-error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--token-interval", type=float, default=0.0, help="seconds between streamed words")
+    parser.add_argument("--ragie-doc-rps", type=float, default=0.0,
+                        help="documents API requests per second before 429s (0 = no limit)")
+
+
+def stub_config(args) -> dict:
+    return {
+        "llm_latency": args.llm_latency,
+        "ragie_latency": args.ragie_latency,
+        "llm_error_rate": args.llm_error_rate,
+        "ragie_error_rate": args.ragie_error_rate,
+        "error_status": args.error_status,
+        "token_interval": args.token_interval,
+        "ragie_doc_rps": args.ragie_doc_rps,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    print(f"Stub DeepSeek/Ragie on http://127.0.0.1:{args.port}", file=sys.stderr)
+    _serve_stub(stub_config(args), args.port)
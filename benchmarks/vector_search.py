@@ -0,0 +1,157 @@
+"""
+Dense vector store benchmark: int8 recall, search latency and per-worker memory.
+
+Writes a synthetic store (clustered random embeddings, like real chunk
+embeddings of a few topics) with vector_store.VectorStore.write, then:
+
+    recall   - top-k overlap of the int8 memory-mapped search with exact
+               float32 search on the original embeddings
+    latency  - p50/p95 of VectorStore.top_k per query, per block size
+    memory   - starts --workers processes that each map the store and run
+               searches; reports each worker's resident and proportional
+               share (PSS) of the store files and its private memory - the
+               PSS sum stays at one copy as workers are added (Linux only)
+
+Exit code 1 if recall is below --min-recall or the p95 at the default
+block size exceeds --max-ms.
+
+Usage:
+    python benchmarks/vector_search.py [--rows 200000] [--dim 384] [--workers 4] [--min-recall 0.95] [--max-ms 80]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DEEPSEEK_API_KEY", "unused")
+
+import vector_store  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+def synthetic_embeddings(rows: int, dim: int, topics: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, topics, rows)] + 0.8 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def memory_kb(store_path: str) -> dict:
+    """This process's private memory and its RSS/PSS of the store files (kB), from /proc/self/smaps."""
+    totals = {"private": 0, "store_rss": 0, "store_pss": 0}
+    in_store = False
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and not fields[0].endswith(":"):
+                in_store = len(fields) >= 6 and fields[5].startswith(store_path)
+            elif fields[0] in ("Private_Clean:", "Private_Dirty:") and not in_store:
+                totals["private"] += int(fields[1])
+            elif fields[0] == "Rss:" and in_store:
+                totals["store_rss"] += int(fields[1])
+            elif fields[0] == "Pss:" and in_store:
+                totals["store_pss"] += int(fields[1])
+    return totals
+
+
+def _worker(path: str, queries: np.ndarray, top_k: int, barrier, results):
+    before = memory_kb(path)
+    store = VectorStore(path)
+    for query in queries:
+        store.top_k(query, top_k)
+    barrier.wait()  # every worker has the store mapped while PSS is read
+    after = memory_kb(path)
+    results.put({**after, "private_delta": after["private"] - before["private"]})
+    barrier.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes for the memory check (0 = skip)")
+    parser.add_argument("--blocks", default="256,1024,4096", help="VECTOR_BLOCK_ROWS values to time")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--max-ms", type=float, default=80.0, help="fail if the p95 at the default block size is slower")
+    args = parser.parse_args()
+
+    embeddings = synthetic_embeddings(args.rows, args.dim, args.topics)
+    rng = np.random.default_rng(11)
+    queries = embeddings[rng.integers(0, args.rows, args.queries)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    chunks = [{"text": f"chunk {i}", "document_name": f"doc_{i % 100}.txt"} for i in range(args.rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store")
+        start = time.perf_counter()
+        VectorStore.write(path, chunks, embeddings)
+        print(f"{args.rows} x {args.dim} store written in {time.perf_counter() - start:.1f}s: "
+              f"vectors {os.path.getsize(os.path.join(path, 'vectors.npy')) / 2 ** 20:.1f} MB int8 "
+              f"(float32 would be {embeddings.nbytes / 2 ** 20:.1f} MB)\n")
+        store = VectorStore(path)
+
+        hits = 0
+        for query in queries:
+            exact = np.argpartition(embeddings @ query, -args.top_k)[-args.top_k:]
+            found, _ = store.top_k(query, args.top_k)
+            hits += len(set(exact.tolist()) & set(found.tolist()))
+        recall = hits / (args.queries * args.top_k)
+        print(f"recall@{args.top_k} int8 vs float32: {recall:.3f}\n")
+
+        print(f"{'block rows':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        default_block = vector_store.VECTOR_BLOCK_ROWS
+        default_p95 = None
+        for block in [int(b) for b in args.blocks.split(",")]:
+            vector_store.VECTOR_BLOCK_ROWS = block
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                store.top_k(query, args.top_k)
+                timings.append((time.perf_counter() - start) * 1000)
+            p50, p95 = np.percentile(timings, [50, 95])
+            if block == default_block:
+                default_p95 = p95
+            print(f"{block:>10} {p50:>8.2f} {p95:>8.2f}")
+        vector_store.VECTOR_BLOCK_ROWS = default_block
+        if default_p95 is None:
+            default_p95 = p95
+        del store  # unmap, so the workers' PSS adds up to the whole store
+
+        if args.workers and os.path.exists("/proc/self/smaps"):
+            # Fresh interpreters, so the benchmark's float32 copy isn't inherited
+            context = multiprocessing.get_context("spawn")
+            barrier = context.Barrier(args.workers)
+            results = context.Queue()
+            workers = [context.Process(target=_worker, args=(path, queries[:50], args.top_k, barrier, results))
+                       for _ in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            reports = [results.get(timeout=300) for _ in workers]
+            for worker in workers:
+                worker.join()
+            mapped_mb = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+            print(f"\n{args.workers} workers mapping {mapped_mb:.1f} MB of store files:")
+            for i, report in enumerate(reports):
+                print(f"  worker {i}: store resident {report['store_rss'] / 1024:.1f} MB, "
+                      f"proportional share {report['store_pss'] / 1024:.1f} MB, "
+                      f"private +{report['private_delta'] / 1024:.1f} MB")
+            total_pss = sum(report["store_pss"] for report in reports) / 1024
+            print(f"  total store PSS across workers: {total_pss:.1f} MB (one shared copy)")
+
+    failed = recall < args.min_recall or default_p95 > args.max_ms
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
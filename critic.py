@@ -4,12 +4,191 @@ Makes sure answers are warm, hopeful, and not judgmental.
 """
 
 import os
-from openai import OpenAI
+import re
+import json
+import uuid
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
-client = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com"
-)
+import metrics
+import sessions
+from generator import client, clean_markdown
+from pg_pool import PgPool
+from retrieval_cache import LRUCache
+
+# Speculative critic: the answer is delivered immediately and the critic runs
+# alongside; a rewrite is pushed afterwards (stream event or poll endpoint).
+# Results are kept in the worker that ran the critic and, with DATABASE_URL,
+# in a shared table so a poll served by any worker finds them.
+CRITIC_MODE = os.environ.get("CRITIC_MODE", "off")  # off | speculative
+CRITIC_SAMPLE_RATE = float(os.environ.get("CRITIC_SAMPLE_RATE", "1.0"))
+CRITIC_MAX_WORKERS = int(os.environ.get("CRITIC_MAX_WORKERS", "4"))
+CRITIC_RESULT_TTL = int(os.environ.get("CRITIC_RESULT_TTL", "600"))  # seconds
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+TABLE_NAME = "critic_results"
+
+_results = LRUCache(4096, CRITIC_RESULT_TTL)
+_shared = PgPool(DATABASE_URL, f"""
+    CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+        response_id TEXT PRIMARY KEY,
+        payload JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+""")
+_executor = None
+_executor_lock = threading.Lock()
+
+# Local fast path: answers the rule-based scorer clearly passes skip the LLM critic
+CRITIC_FAST_PATH = os.environ.get("CRITIC_FAST_PATH", "1") == "1"
+CRITIC_PASS_SCORE = float(os.environ.get("CRITIC_PASS_SCORE", "0.8"))
+
+
+# ==================
+# LOCAL SCORER
+# ==================
+
+MIN_SENTENCES = 5
+MAX_SENTENCES = 8
+HARD_MAX_SENTENCES = 10
+MIN_SENTENCE_WORDS = 3  # interjections ("Ha!", "Segampang itu.") don't count toward length
+
+MARKERS = {
+    'id': ["wong", "kok", "loh", "lho", "gak", "nggak", "gini", "segampang itu",
+           "gitu aja kok repot", "santai", "aja"],
+    'en': ["look", "here's the thing", "don't overcomplicate it", "relax", "ha",
+           "you know", "honestly", "see"]
+}
+
+# Fear/judgment language the persona must never use
+HARSH = {
+    'id': ["neraka", "jahanam", "azab", "siksa", "laknat", "terlaknat", "murka",
+           "celaka", "binasa", "kafir", "pasti masuk neraka", "tidak akan diampuni"],
+    'en': ["hell", "hellfire", "damned", "damnation", "wrath", "cursed", "torment",
+           "doomed", "punish", "punishment", "will never be forgiven"]
+}
+
+VALIDATION = {
+    'id': ["wajar", "manusiawi", "wah", "loh", "lho", "tenang", "gak apa", "nggak apa",
+           "paham", "normal", "biasa"],
+    'en': ["normal", "natural", "human", "understandable", "it's okay", "ha", "of course",
+           "i get it", "relax"]
+}
+
+STORY = {
+    'id': ["ada orang", "pernah", "cerita", "misalnya", "kayak", "seperti", "ibarat",
+           "nabi", "rasul", "sahabat", "dulu"],
+    'en': ["there was", "once", "story", "like a", "imagine", "for example", "the prophet",
+           "companion"]
+}
+
+CALMING = {
+    'id': ["tenang", "pelan-pelan", "segampang itu", "gitu aja kok repot", "santai",
+           "rahmat", "maha pengampun", "maha pengasih", "baik-baik", "gak apa", "insya allah"],
+    'en': ["relax", "don't overcomplicate it", "it's okay", "take it easy", "mercy",
+           "merciful", "forgiving", "fine", "god willing", "don't worry"]
+}
+
+FORMAL = {
+    'id': ["oleh karena itu", "dengan demikian", "adapun", "sebagaimana", "hendaknya",
+           "kesimpulannya", "pertama,", "kedua,"],
+    'en': ["therefore", "furthermore", "moreover", "in conclusion", "firstly", "secondly",
+           "it is important to note"]
+}
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+_QUOTE_RE = re.compile(r"[\"“][^\"“”]*[\"”]")
+
+
+def _phrase_re(phrases: list) -> re.Pattern:
+    """Whole-word, case-insensitive matcher for a phrase list."""
+    alternation = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"(?<![\w'])(?:{alternation})(?![\w'])", re.IGNORECASE)
+
+
+_LEXICONS = {
+    name: {lang: _phrase_re(phrases) for lang, phrases in table.items()}
+    for name, table in {
+        "markers": MARKERS, "harsh": HARSH, "validation": VALIDATION,
+        "story": STORY, "calming": CALMING, "formal": FORMAL
+    }.items()
+}
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Split an Indonesian/English answer into sentences.
+    Paragraph breaks end a sentence; quoted dialogue ("Kenapa?") stays
+    inside the sentence that carries it.
+    """
+    sentences = []
+    for paragraph in re.split(r"\n+", text.replace("’", "'")):
+        masked = _QUOTE_RE.sub(lambda m: "Q" * len(m.group()), paragraph)
+        start = 0
+        for match in _SENTENCE_END_RE.finditer(masked):
+            sentences.append(paragraph[start:match.start()])
+            start = match.end()
+        sentences.append(paragraph[start:])
+    return [s.strip() for s in sentences if re.search(r"\w", s)]
+
+
+def score_answer(answer: str, language: str = 'id') -> dict:
+    """
+    Score an answer against the critic's criteria without calling the LLM.
+
+    Returns:
+        dict with per-criterion 'scores' (0-1), overall 'score', 'sentences'
+        and 'decision': 'pass' (skip the LLM critic), 'borderline' or 'fail'
+    """
+    lang = language if language in MARKERS else 'id'
+    sentences = split_sentences(answer)
+    n = sum(1 for sentence in sentences if len(sentence.split()) >= MIN_SENTENCE_WORDS)
+
+    def found(name: str, text: str) -> int:
+        return len(_LEXICONS[name][lang].findall(text))
+
+    opening = " ".join(sentences[:2])
+    closing = " ".join(sentences[-2:])
+    harsh = found("harsh", answer)
+
+    scores = {
+        "length": 1.0 if MIN_SENTENCES <= n <= MAX_SENTENCES
+                  else 0.5 if MIN_SENTENCES - 1 <= n <= HARD_MAX_SENTENCES else 0.0,
+        "markers": min(1.0, found("markers", answer) / 2),
+        "gentle": 0.0 if harsh else 1.0,
+        "validation": 1.0 if found("validation", opening) else 0.0,
+        "story": 1.0 if found("story", answer) or _QUOTE_RE.search(answer) else 0.0,
+        "calming_close": 1.0 if found("calming", closing) else 0.0,
+        "casual": max(0.0, 1.0 - found("formal", answer) / 2)
+    }
+    score = sum(scores.values()) / len(scores)
+
+    if harsh or n > HARD_MAX_SENTENCES:
+        decision = "fail"
+    elif score >= CRITIC_PASS_SCORE and scores["length"] > 0 and scores["markers"] > 0:
+        decision = "pass"
+    else:
+        decision = "borderline"
+
+    return {
+        "decision": decision,
+        "score": round(score, 3),
+        "sentences": n,
+        "scores": scores
+    }
+
+
+_fast_path = {"checked": 0, "skipped": 0, "escalated": 0}
+_fast_path_lock = threading.Lock()
+
+
+def stats() -> dict:
+    """How often the local scorer skipped the LLM critic in this worker."""
+    with _fast_path_lock:
+        result = dict(_fast_path)
+    result["skip_rate"] = round(result["skipped"] / result["checked"], 3) if result["checked"] else 0.0
+    return result
 
 
 def critic_check(original_answer: str, query: str, language: str = 'id') -> tuple[bool, str]:
@@ -162,19 +341,138 @@ def validate_response(answer: str, query: str, language: str = 'id') -> dict:
         language: 'id' or 'en'
     
     Returns:
-        dict with 'final_answer', 'was_rewritten', 'error'
+        dict with 'final_answer', 'was_rewritten', 'error', 'local_score'
     """
+    with metrics.timed("critic_score"):
+        local = score_answer(answer, language)
+    criteria = " ".join(f"{name}={value:.2f}" for name, value in local["scores"].items())
+    print(f"Critic score: {local['decision']} score={local['score']} sentences={local['sentences']} {criteria}")
+    
+    skip = CRITIC_FAST_PATH and local["decision"] == "pass"
+    with _fast_path_lock:
+        _fast_path["checked"] += 1
+        _fast_path["skipped" if skip else "escalated"] += 1
+    
+    if skip:
+        metrics.inc("gus_critic_total", outcome="skipped")
+        return {
+            "final_answer": answer,
+            "was_rewritten": False,
+            "error": None,
+            "local_score": local
+        }
+    
     try:
-        is_valid, final_answer = critic_check(answer, query, language)
+        with metrics.timed("critic"):
+            is_valid, final_answer = critic_check(answer, query, language)
+        metrics.inc("gus_critic_total", outcome="valid" if is_valid else "rewritten")
         
         return {
             "final_answer": final_answer,
             "was_rewritten": not is_valid,
-            "error": None
+            "error": None,
+            "local_score": local
         }
     except Exception as e:
         return {
             "final_answer": answer,
             "was_rewritten": False,
-            "error": str(e)
+            "error": str(e),
+            "local_score": local
         }
+
+
+def should_critique() -> bool:
+    """Whether this answer is sampled for the speculative critic."""
+    return CRITIC_MODE == "speculative" and random.random() < CRITIC_SAMPLE_RATE
+
+
+def _reset_executor():
+    """Forked workers need their own critic threads."""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CRITIC_MAX_WORKERS, thread_name_prefix="critic")
+    return _executor
+
+
+def _store_result(response_id: str, result: dict):
+    _results.set(response_id, result)
+    try:
+        _shared.execute(
+            f"INSERT INTO {TABLE_NAME} (response_id, payload, created_at) "
+            f"VALUES (%s, %s::jsonb, now()) "
+            f"ON CONFLICT (response_id) DO UPDATE SET payload = EXCLUDED.payload",
+            (response_id, json.dumps(result, ensure_ascii=False))
+        )
+        if random.random() < 0.01:
+            _shared.execute(
+                f"DELETE FROM {TABLE_NAME} WHERE created_at < now() - %s * interval '1 second'",
+                (CRITIC_RESULT_TTL,)
+            )
+    except Exception as e:
+        print(f"Critic result store (shared) error: {e}")
+
+
+def _run_critique(response_id: str, answer: str, query: str, language: str,
+                  session_id: str | None, turn: int | None):
+    result = validate_response(answer, query, language)
+    if result["was_rewritten"] and session_id:
+        # Later turns build on the rewrite, as on the stream path
+        sessions.replace_last_answer(session_id, clean_markdown(result["final_answer"]), turn)
+    _store_result(response_id, {
+        "status": "rewritten" if result["was_rewritten"] else "valid",
+        "final_answer": result["final_answer"],
+        "error": result["error"]
+    })
+
+
+def submit_critique(answer: str, query: str, language: str = 'id',
+                    session_id: str | None = None, turn: int | None = None) -> str:
+    """
+    Start validating an already-delivered answer in the background.
+    
+    Args:
+        session_id, turn: Conversation and turn the answer was saved as;
+            a rewrite replaces it there
+    
+    Returns:
+        response_id for get_critique()
+    """
+    response_id = uuid.uuid4().hex
+    _store_result(response_id, {"status": "pending", "final_answer": None, "error": None})
+    _get_executor().submit(_run_critique, response_id, answer, query, language, session_id, turn)
+    return response_id
+
+
+def submit_validation(answer: str, query: str, language: str = 'id') -> Future:
+    """validate_response on the critic threads; the caller decides how long to wait."""
+    return _get_executor().submit(validate_response, answer, query, language)
+
+
+def get_critique(response_id: str) -> dict | None:
+    """Critic result: status is pending, valid or rewritten (None if unknown/expired)."""
+    result = _results.get(response_id)
+    if result is not None and result["status"] != "pending":
+        return result
+    try:
+        row = _shared.execute(
+            f"SELECT payload FROM {TABLE_NAME} "
+            f"WHERE response_id = %s AND created_at > now() - %s * interval '1 second'",
+            (response_id, CRITIC_RESULT_TTL), fetch=True
+        )
+    except Exception as e:
+        print(f"Critic result store (shared) error: {e}")
+        row = None
+    return row[0] if row else result
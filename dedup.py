@@ -0,0 +1,152 @@
+"""
+Dedup - Near-duplicate chunk elimination before prompt packing.
+Retrieval legs and overlapping transcript windows return the same
+passage several times (exact-prefix dedup only catches identical
+chunks), which spends the context budget on repeated text.
+
+    1. Adjacent windows: two chunks of the same document where one ends
+       with the text the other starts with (at least DEDUP_MIN_OVERLAP
+       characters) are merged into one chunk, up to DEDUP_MERGE_MAX_CHARS.
+    2. Near-duplicates: character shingles -> MinHash signatures (NumPy,
+       all chunks at once); chunks whose estimated Jaccard similarity is at
+       least DEDUP_THRESHOLD are clustered and only the best-ranked one is
+       kept (its "legs" are the union of the cluster's).
+
+Chunks must come in best-first order. Tune the thresholds on captured
+retrievals with: python benchmarks/chunk_dedup.py
+"""
+
+import os
+import re
+
+import numpy as np
+
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "1") == "1"
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.5"))  # estimated Jaccard
+DEDUP_SHINGLE_CHARS = int(os.environ.get("DEDUP_SHINGLE_CHARS", "5"))
+DEDUP_NUM_PERM = int(os.environ.get("DEDUP_NUM_PERM", "64"))
+DEDUP_MIN_OVERLAP = int(os.environ.get("DEDUP_MIN_OVERLAP", "50"))  # characters
+DEDUP_MERGE_MAX_CHARS = int(os.environ.get("DEDUP_MERGE_MAX_CHARS", "1600"))
+
+_NORMALIZE_RE = re.compile(r"[\W_]+")
+
+# Multiply-shift hash family: h(x) = (a * x + b) >> 32 over uint64 (wrapping)
+_rng = np.random.default_rng(20240601)
+_HASH_A = _rng.integers(1, 2 ** 63, size=DEDUP_NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2 ** 63, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_SHINGLE_BASE = np.uint64(1099511628211)  # FNV prime, for the polynomial shingle hash
+
+
+def _normalize(text: str) -> str:
+    return _NORMALIZE_RE.sub(" ", text.lower()).strip()
+
+
+def shingle_hashes(text: str, k: int = None) -> np.ndarray:
+    """Distinct 64-bit hashes of the text's character k-shingles."""
+    k = k or DEDUP_SHINGLE_CHARS
+    data = np.frombuffer(_normalize(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < k:
+        data = np.pad(data, (0, k - len(data)))
+    windows = np.lib.stride_tricks.sliding_window_view(data, k)
+    powers = _SHINGLE_BASE ** np.arange(k - 1, -1, -1, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return np.unique((windows * powers).sum(axis=1))
+
+
+def minhash_signatures(texts: list[str]) -> np.ndarray:
+    """MinHash signature per text, shape (len(texts), DEDUP_NUM_PERM)."""
+    shingles = [shingle_hashes(text) for text in texts]
+    offsets = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+    values = np.concatenate(shingles)
+    with np.errstate(over="ignore"):
+        hashed = (_HASH_A[:, None] * values[None, :] + _HASH_B[:, None]) >> np.uint64(32)
+    # Minimum per (permutation, text) in one pass over the concatenated shingles
+    return np.minimum.reduceat(hashed, offsets, axis=1).T
+
+
+def similarity_matrix(texts: list[str]) -> np.ndarray:
+    """Estimated Jaccard similarity between every pair of texts."""
+    signatures = minhash_signatures(texts)
+    return (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+
+
+def _overlap_merge(first: str, second: str) -> str | None:
+    """first + second without the repeated part, if second continues first."""
+    probe = second[:DEDUP_MIN_OVERLAP]
+    if len(probe) < DEDUP_MIN_OVERLAP:
+        return None
+    start = first.find(probe)
+    while start >= 0:
+        tail = first[start:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        start = first.find(probe, start + 1)
+    return None
+
+
+def _merge_windows(chunks: list[dict]) -> tuple[list[dict], int]:
+    """Merge overlapping windows of the same document (chains too)."""
+    merged = 0
+    changed = True
+    while changed:
+        changed = False
+        for i, chunk in enumerate(chunks):
+            for j in range(i + 1, len(chunks)):
+                other = chunks[j]
+                if chunk.get("document_name") != other.get("document_name"):
+                    continue
+                a, b = chunk.get("text", "").strip(), other.get("text", "").strip()
+                text = _overlap_merge(a, b) or _overlap_merge(b, a)
+                if not text or len(text) > DEDUP_MERGE_MAX_CHARS:
+                    continue
+                # The merged window takes the better-ranked chunk's place
+                combined = {**chunk, "text": text, "windows": chunk.get("windows", 1) + other.get("windows", 1)}
+                if "legs" in chunk:
+                    combined["legs"] = _union(chunk["legs"], other.get("legs", []))
+                chunks[i] = combined
+                del chunks[j]
+                merged += 1
+                changed = True
+                break
+            if changed:
+                break
+    return chunks, merged
+
+
+def _union(first: list, second: list) -> list:
+    return first + [item for item in second if item not in first]
+
+
+def dedup_chunks(chunks: list[dict], threshold: float = None) -> tuple[list[dict], dict]:
+    """
+    Drop near-duplicates and merge adjacent windows.
+
+    Args:
+        chunks: Retrieved chunks, best first ("text", "document_name", optional "legs")
+        threshold: Estimated Jaccard at or above which chunks are duplicates
+                   (default DEDUP_THRESHOLD)
+
+    Returns:
+        Tuple of (kept chunks in rank order, {"duplicates", "merged"} counts)
+    """
+    if len(chunks) < 2:
+        return list(chunks), {"duplicates": 0, "merged": 0}
+    threshold = DEDUP_THRESHOLD if threshold is None else threshold
+
+    # Merge first: overlapping windows share text but each adds its own
+    chunks, merged = _merge_windows([dict(chunk) for chunk in chunks])
+    similar = similarity_matrix([chunk.get("text", "") for chunk in chunks]) >= threshold
+    kept = []
+    owner = {}  # chunk index -> index in kept of its cluster's representative
+    for i, chunk in enumerate(chunks):
+        # Best-ranked earlier chunk this one duplicates (clusters grow transitively)
+        match = next((owner[j] for j in range(i) if similar[i, j]), None)
+        if match is None:
+            owner[i] = len(kept)
+            kept.append(chunk)
+        else:
+            owner[i] = match
+            if "legs" in chunk and "legs" in kept[match]:
+                kept[match]["legs"] = _union(kept[match]["legs"], chunk["legs"])
+
+    return kept, {"duplicates": len(chunks) - len(kept), "merged": merged}
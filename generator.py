@@ -5,14 +5,61 @@ Returns source metadata for citations.
 """
 
 import os
-from openai import OpenAI
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import httpx
+from openai import OpenAI, AsyncOpenAI, APITimeoutError
 
+import metrics
+import response_cache
 from persona import SYSTEM_PROMPT, FEW_SHOTS
-from ragie_client import retrieve_context, format_context_for_prompt, get_unique_sources
+from prompt_budget import (
+    PromptBudget, CONTEXT_TOKEN_BUDGET, count_message_tokens, fit_context, fit_history, truncate_to_tokens
+)
+from ragie_client import retrieve_context, retrieve_context_async, get_unique_sources
+from intent import RELIGIOUS, INTENT_GATE_ENABLED, classify, needs_retrieval, max_tokens
+from query_variants import history_query
+from rerank import RERANK_ENABLED, RERANK_CANDIDATES, rerank
+from resilience import Deadline, DeadlineExceeded
+
+DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+# Total time budget per chat request; retrieval gets a slice of it (RETRIEVAL_BUDGET)
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", "30"))  # seconds
+
+# Per-attempt DeepSeek timeouts (the SDK defaults are 10 minutes and 2 retries)
+LLM_TIMEOUT = float(os.environ.get("DEEPSEEK_TIMEOUT", "20"))  # seconds, per read
+LLM_CONNECT_TIMEOUT = float(os.environ.get("DEEPSEEK_CONNECT_TIMEOUT", "5"))  # seconds
+LLM_MAX_RETRIES = int(os.environ.get("DEEPSEEK_MAX_RETRIES", "1"))
+LLM_MIN_TIME = 1.0  # seconds; with less left, don't start the call
+ANSWER_MAX_TOKENS = 400  # grounded answers; intent.MAX_TOKENS caps the others
+
+# Chunks per answer (fused from every retrieval leg, so fewer are needed);
+# with re-ranking on, RERANK_CANDIDATES are fetched and RAG_TOP_K picked locally
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", "5"))
+RETRIEVAL_TOP_K = RERANK_CANDIDATES if RERANK_ENABLED else RAG_TOP_K
+
+TIMEOUT_MESSAGES = {
+    "id": "Maaf, Gus lagi kelamaan mikirnya. Coba tanya lagi sebentar ya.",
+    "en": "Sorry, Gus took too long to answer. Please try asking again in a moment."
+}
 
 client = OpenAI(
     api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com"
+    base_url=DEEPSEEK_BASE_URL,
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    max_retries=LLM_MAX_RETRIES
+)
+
+# Used by the ASGI entry point (asgi.py)
+async_client = AsyncOpenAI(
+    api_key=os.environ.get("DEEPSEEK_API_KEY"),
+    base_url=DEEPSEEK_BASE_URL,
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    max_retries=LLM_MAX_RETRIES
 )
 
 
@@ -120,31 +167,11 @@ Anything on your mind?"""
 ]
 
 
-def generate_response(query: str, history: list = None, use_rag: bool = True) -> dict:
-    """
-    Generate Gus Baha response with conversation history support.
-    
-    Args:
-        query: Current user message
-        history: List of previous messages [{"role": "user/assistant", "content": "..."}]
-        use_rag: Whether to use RAG for context
-    
-    Returns:
-        dict with response, sources, language, etc.
-    """
-    if history is None:
-        history = []
-    
-    # Step 1: Detect language
-    lang = detect_language(query)
-    
-    # Step 2: Select prompts based on language
-    if lang == 'id':
-        system_prompt = SYSTEM_PROMPT + """
+CONVERSATION_NOTE_ID = """
 
 PENTING: Kamu bisa melihat riwayat percakapan. Gunakan untuk memahami konteks dan pertanyaan lanjutan. Jawab secara natural seperti melanjutkan percakapan."""
-        few_shots = FEW_SHOTS
-        instruction = """INSTRUKSI:
+
+INSTRUCTION_ID = """INSTRUKSI:
 - Jawab gaya Gus Baha: santai, hangat, ada cerita
 - Maksimal 5-8 kalimat
 - Buat penanya TENANG
@@ -153,10 +180,8 @@ PENTING: Kamu bisa melihat riwayat percakapan. Gunakan untuk memahami konteks da
 - Perhatikan konteks percakapan sebelumnya
 - GUNAKAN SEMUA KONTEKS yang diberikan (baik bahasa Indonesia maupun Inggris)
 - JAWAB DALAM BAHASA INDONESIA"""
-    else:
-        system_prompt = SYSTEM_PROMPT_EN
-        few_shots = FEW_SHOTS_EN
-        instruction = """INSTRUCTIONS:
+
+INSTRUCTION_EN = """INSTRUCTIONS:
 - Answer in Gus Baha's casual warm style
 - Maximum 5-8 sentences
 - Make questioner feel CALM
@@ -165,111 +190,614 @@ PENTING: Kamu bisa melihat riwayat percakapan. Gunakan untuk memahami konteks da
 - Pay attention to conversation history for context
 - USE ALL PROVIDED CONTEXT (both Indonesian and English sources)
 - ANSWER IN ENGLISH"""
+
+# Changes whenever any static prompt changes; invalidates cached answers
+PERSONA_VERSION = hashlib.sha256(json.dumps(
+    [SYSTEM_PROMPT, FEW_SHOTS, CONVERSATION_NOTE_ID, INSTRUCTION_ID,
+     SYSTEM_PROMPT_EN, FEW_SHOTS_EN, INSTRUCTION_EN],
+    ensure_ascii=False
+).encode("utf-8")).hexdigest()[:16]
+
+
+# Static leading messages per language, built once so every request shares
+# a byte-identical prefix that DeepSeek can serve from its prompt cache
+PROMPT_PREFIX = {
+    'id': (
+        {"role": "system", "content": SYSTEM_PROMPT + CONVERSATION_NOTE_ID},
+        *FEW_SHOTS,
+    ),
+    'en': (
+        {"role": "system", "content": SYSTEM_PROMPT_EN},
+        *FEW_SHOTS_EN,
+    ),
+}
+PROMPT_PREFIX_TOKENS = {
+    lang: {
+        "system": count_message_tokens(prefix[:1]),
+        "few_shots": count_message_tokens(prefix[1:])
+    }
+    for lang, prefix in PROMPT_PREFIX.items()
+}
+INSTRUCTIONS = {'id': INSTRUCTION_ID, 'en': INSTRUCTION_EN}
+
+# DeepSeek usage totals for this worker (prompt cache hit/miss tokens)
+_usage = {
+    "requests": 0,
+    "prompt_tokens": 0,
+    "prompt_cache_hit_tokens": 0,
+    "prompt_cache_miss_tokens": 0,
+    "completion_tokens": 0
+}
+_usage_lock = threading.Lock()
+
+
+def _record_usage(usage) -> dict | None:
+    """Add one response's usage to the worker totals; returns it as a dict."""
+    if usage is None:
+        return None
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    miss = getattr(usage, "prompt_cache_miss_tokens", None)
+    if hit is None:
+        # OpenAI-style field as a fallback
+        details = getattr(usage, "prompt_tokens_details", None)
+        hit = getattr(details, "cached_tokens", None) or 0
+        miss = (usage.prompt_tokens or 0) - hit
+    record = {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "prompt_cache_hit_tokens": hit or 0,
+        "prompt_cache_miss_tokens": miss or 0,
+        "completion_tokens": usage.completion_tokens or 0
+    }
+    with _usage_lock:
+        _usage["requests"] += 1
+        for key, value in record.items():
+            _usage[key] += value
+    metrics.inc("gus_tokens_total", record["prompt_tokens"], direction="in")
+    metrics.inc("gus_tokens_total", record["completion_tokens"], direction="out")
+    return record
+
+
+def usage_stats() -> dict:
+    """DeepSeek token usage and prompt-cache hit rate for this worker."""
+    with _usage_lock:
+        result = dict(_usage)
+    cached = result["prompt_cache_hit_tokens"] + result["prompt_cache_miss_tokens"]
+    result["prompt_cache_hit_rate"] = round(result["prompt_cache_hit_tokens"] / cached, 3) if cached else 0.0
+    return result
+
+
+# Phrases that mark an off-topic redirect answer (sources are hidden for these)
+REDIRECT_PHRASES_ID = [
+    "saya gak pinter", "saya gak ngerti", "saya gak jago",
+    "bisanya cuma ngaji", "kiai kampung", "bukan keahlian saya",
+    "di luar kemampuan"
+]
+REDIRECT_PHRASES_EN = [
+    "not my thing", "not my area", "just a village scholar",
+    "coffee and faith", "not really my expertise"
+]
+REDIRECT_PHRASES = REDIRECT_PHRASES_ID + REDIRECT_PHRASES_EN
+_REDIRECT_TAIL = max(len(phrase) for phrase in REDIRECT_PHRASES)
+
+
+def clean_markdown(text: str) -> str:
+    """Remove markdown symbols (asterisks and underscores)."""
+    return text.replace('*', '').replace('_', '')
+
+
+def is_redirect(answer: str) -> bool:
+    """Check whether an answer is an off-topic redirect."""
+    answer_lower = answer.lower()
+    return any(phrase in answer_lower for phrase in REDIRECT_PHRASES)
+
+
+class RedirectDetector:
+    """
+    Incremental redirect-phrase detection for streamed answers.
+    Only keeps a short tail of the text seen so far, so phrases split
+    across deltas are still found without rescanning the whole answer.
+    """
+
+    def __init__(self):
+        self.tail = ""
+        self.found = False
+
+    def feed(self, text: str) -> bool:
+        if self.found or not text:
+            return self.found
+        window = self.tail + text.lower()
+        if any(phrase in window for phrase in REDIRECT_PHRASES):
+            self.found = True
+        self.tail = window[-_REDIRECT_TAIL:]
+        return self.found
+
+
+def _user_message(query: str, context_str: str, instruction: str) -> str:
+    """Current user message with RAG context."""
+    if context_str:
+        return f"""KONTEKS dari pengajaran Gus Baha (gunakan semua, baik Indonesia maupun Inggris):
+{context_str}
+
+PERTANYAAN SEKARANG: "{query}"
+
+{instruction}"""
+    return f"""PERTANYAAN SEKARANG: "{query}"
+
+(Tidak ada konteks spesifik dari RAG)
+
+{instruction}"""
+
+
+SUMMARY_TOKEN_CAP = 300
+
+
+def _summary_message(summary: str) -> dict:
+    """Rolling summary of the turns no longer sent verbatim (summarizer.py)."""
+    return {
+        "role": "system",
+        "content": f"RINGKASAN PERCAKAPAN SEBELUMNYA (untuk konteks, jangan diulang):\n"
+                   f"{truncate_to_tokens(summary, SUMMARY_TOKEN_CAP)}"
+    }
+
+
+def _assemble_messages(lang: str, query: str, history: list, chunks: list,
+                       summary: str = "") -> tuple[list, dict]:
+    """
+    Build the conversation messages sent to DeepSeek within the token budget.
+    
+    Returns:
+        Tuple of (messages, token breakdown)
+    """
+    instruction = INSTRUCTIONS[lang]
+    budget = PromptBudget()
+    
+    # Fixed parts are always sent
+    for part, tokens in PROMPT_PREFIX_TOKENS[lang].items():
+        budget.add(part, tokens)
+    budget.add("question", count_message_tokens([{"content": _user_message(query, "", instruction)}]))
+    summary_messages = [_summary_message(summary)] if summary else []
+    if summary_messages:
+        budget.add("summary", count_message_tokens(summary_messages))
+    
+    # RAG context, best chunks first
+    context_str, context_tokens, budget.chunks_used = fit_context(
+        chunks, min(CONTEXT_TOKEN_BUDGET, budget.remaining)
+    )
+    budget.add("context", context_tokens)
+    
+    # Conversation history gets what is left, newest turns first
+    recent_history, history_tokens, budget.history_dropped = fit_history(history or [], budget.remaining)
+    budget.add("history", history_tokens)
+    
+    # Static prefix first and byte-identical across requests (prefix cache),
+    # everything request-specific after it
+    messages = [
+        *PROMPT_PREFIX[lang],
+        *summary_messages,
+        *recent_history,
+        {"role": "user", "content": _user_message(query, context_str, instruction)}
+    ]
+    return messages, budget.report()
+
+
+def _query_intent(query: str, history: list = None) -> str:
+    """Intent gate (intent.py); every query counts as religious when it is off."""
+    if not INTENT_GATE_ENABLED:
+        return RELIGIOUS
+    with metrics.timed("intent"):
+        intent = classify(query, history)
+    metrics.inc("gus_intent_total", intent=intent)
+    return intent
+
+
+def _rerank_chunks(query: str, history: list, chunks: list) -> list:
+    """Keep the RAG_TOP_K most relevant, diverse candidates (rerank.py)."""
+    with metrics.timed("rerank"):
+        return rerank(query, chunks, RAG_TOP_K, history_query(query, history))
+
+
+def _build_messages(query: str, history: list, use_rag: bool,
+                    deadline: Deadline = None, summary: str = "") -> tuple[str, list, list, list, dict, str]:
+    """
+    Build the chat messages for a query.
+    
+    Returns:
+        Tuple of (language, messages, chunks, sources, token breakdown, intent)
+    """
+    # Step 1: Detect language and intent
+    with metrics.timed("language"):
+        lang = detect_language(query)
+    intent = _query_intent(query, history)
     
-    # Step 3: Get RAG context (retrieve more to get both languages)
+    # Step 2: Get RAG context (retrieve more to get both languages);
+    # greetings, identity and off-topic questions are answered from the persona
     chunks = []
-    context_str = ""
     sources = []
     
-    if use_rag:
+    if use_rag and needs_retrieval(intent):
         try:
-            # Retrieve more chunks to capture both Indonesian and English content
-            chunks = retrieve_context(query, top_k=8)
-            if chunks:
-                context_str = format_context_for_prompt(chunks, max_chars=3500)
-                sources = get_unique_sources(chunks)
+            with metrics.timed("retrieval"):
+                chunks = retrieve_context(query, top_k=RETRIEVAL_TOP_K, deadline=deadline, history=history)
+            chunks = _rerank_chunks(query, history, chunks)
+            sources = get_unique_sources(chunks)
         except Exception as e:
             print(f"RAG error: {e}")
     
-    # Step 4: Build conversation messages
-    messages = [
-        {"role": "system", "content": system_prompt},
-        *few_shots,
-    ]
+    # Step 3: Build conversation messages
+    with metrics.timed("prompt_assembly"):
+        messages, tokens = _assemble_messages(lang, query, history, chunks, summary)
+    return lang, messages, chunks, sources, tokens, intent
+
+
+async def _build_messages_async(query: str, history: list, use_rag: bool,
+                                deadline: Deadline = None, summary: str = "") -> tuple[str, list, list, list, dict, str]:
+    """Async variant of _build_messages."""
+    with metrics.timed("language"):
+        lang = detect_language(query)
+    intent = _query_intent(query, history)
     
-    # Add conversation history (limit to last 6 exchanges = 12 messages)
-    if history:
-        recent_history = history[-12:]
-        for msg in recent_history:
-            messages.append({
-                "role": msg.get("role", "user"),
-                "content": msg.get("content", "")
-            })
+    chunks = []
+    sources = []
     
-    # Step 5: Build current user message with RAG context
-    if context_str:
-        user_message = f"""KONTEKS dari pengajaran Gus Baha (gunakan semua, baik Indonesia maupun Inggris):
-{context_str}
+    if use_rag and needs_retrieval(intent):
+        try:
+            with metrics.timed("retrieval"):
+                chunks = await retrieve_context_async(query, top_k=RETRIEVAL_TOP_K, deadline=deadline,
+                                                      history=history)
+            chunks = _rerank_chunks(query, history, chunks)
+            sources = get_unique_sources(chunks)
+        except Exception as e:
+            print(f"RAG error: {e}")
+    
+    with metrics.timed("prompt_assembly"):
+        messages, tokens = _assemble_messages(lang, query, history, chunks, summary)
+    return lang, messages, chunks, sources, tokens, intent
 
-PERTANYAAN SEKARANG: "{query}"
 
-{instruction}"""
-    else:
-        user_message = f"""PERTANYAAN SEKARANG: "{query}"
+def _completion_kwargs(messages: list, stream: bool = False, intent: str = RELIGIOUS) -> dict:
+    """Shared DeepSeek sampling parameters (shorter answers for non-grounded intents)."""
+    if stream:
+        return {
+            **_completion_kwargs(messages, intent=intent),
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+    return {
+        "model": "deepseek-chat",
+        "messages": messages,
+        "temperature": 0.85,
+        "max_tokens": max_tokens(intent, ANSWER_MAX_TOKENS),
+        "presence_penalty": 0.3,
+        "frequency_penalty": 0.3
+    }
 
-(Tidak ada konteks spesifik dari RAG)
 
-{instruction}"""
+def llm_options(deadline: Deadline) -> dict:
+    """
+    Client options (with_options) that keep a DeepSeek call inside the deadline.
     
-    messages.append({"role": "user", "content": user_message})
+    Each read waits at most the time left, and a retry is only allowed
+    when a full second attempt still fits.
+    """
+    remaining = deadline.remaining()
+    if remaining < LLM_MIN_TIME:
+        raise DeadlineExceeded(f"{remaining:.1f}s left for generation")
+    timeout = min(LLM_TIMEOUT, remaining)
+    return {
+        "timeout": httpx.Timeout(timeout, connect=min(LLM_CONNECT_TIMEOUT, timeout)),
+        "max_retries": LLM_MAX_RETRIES if remaining >= 2 * timeout else 0
+    }
+
+
+def is_timeout(error: Exception) -> bool:
+    return isinstance(error, (TimeoutError, APITimeoutError))
+
+
+def _record_answer(redirect: bool, chunks_used: int):
+    metrics.inc("gus_responses_total", redirect=str(redirect).lower())
+    metrics.observe("gus_chunks_retrieved", chunks_used)
+
+
+def _build_result(answer: str, lang: str, chunks: list, sources: list, tokens: dict, usage: dict = None,
+                  intent: str = RELIGIOUS) -> dict:
+    """Build the response dict; redirect answers don't return sources."""
+    redirect = is_redirect(answer)
+    _record_answer(redirect, 0 if redirect else len(chunks))
+    if redirect:
+        return {
+            "response": answer,
+            "context_used": False,
+            "chunks_retrieved": 0,
+            "sources": [],
+            "language": lang,
+            "intent": intent,
+            "prompt_tokens": tokens,
+            "usage": usage,
+            "error": None
+        }
     
-    # Step 6: Generate response
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            temperature=0.85,
-            max_tokens=400,
-            presence_penalty=0.3,
-            frequency_penalty=0.3
-        )
-        
-        answer = response.choices[0].message.content.strip()
+    return {
+        "response": answer,
+        "context_used": len(chunks) > 0,
+        "chunks_retrieved": len(chunks),
+        "sources": sources,
+        "language": lang,
+        "intent": intent,
+        "prompt_tokens": tokens,
+        "usage": usage,
+        "error": None
+    }
+
+
+def _error_result(lang: str, error: Exception) -> dict:
+    print(f"Generation error: {error!r}")
+    timeout = is_timeout(error)
+    return {
+        "response": None,
+        "context_used": False,
+        "chunks_retrieved": 0,
+        "sources": [],
+        "language": lang,
+        "error": TIMEOUT_MESSAGES.get(lang, TIMEOUT_MESSAGES["id"]) if timeout else str(error),
+        "timeout": timeout
+    }
+
+
+def _error_event(lang: str, error: Exception) -> tuple:
+    """Stream "error" event; timeouts get a friendly message."""
+    result = _error_result(lang, error)
+    return "error", {"error": result["error"], "timeout": result["timeout"]}
+
+
+def _cached_lookup(query: str, history: list, use_rag: bool) -> tuple[bool, dict | None]:
+    """Return (cacheable, cached_result) for the answer cache."""
+    cacheable = use_rag and response_cache.is_cacheable(history)
+    if not cacheable:
+        return False, None
+    return True, response_cache.get(query, detect_language(query), PERSONA_VERSION)
+
+
+def _cached_events(cached: dict) -> list:
+    """Stream events that replay a cached answer."""
+    return [
+        ("meta", {"language": cached["language"]}),
+        ("token", {"text": cached["response"]}),
+        ("sources", {"sources": cached["sources"], "context_used": cached["context_used"]}),
+        ("done", {
+            "language": cached["language"],
+            "is_redirect": is_redirect(cached["response"]),
+            "intent": cached.get("intent"),
+            "chunks_retrieved": cached["chunks_retrieved"],
+            "cached": True
+        })
+    ]
+
+
+class _AnswerStream:
+    """Per-request state for turning DeepSeek stream chunks into events."""
+
+    def __init__(self):
+        self.detector = RedirectDetector()
+        self.started = False
+        self.parts = []
+        self.usage = None
+        self.start = time.perf_counter()
+
+    def feed(self, event) -> str:
+        """Return the cleaned text of one stream chunk ('' if nothing to send)."""
+        if getattr(event, "usage", None) is not None:
+            # Sent on the last chunk (stream_options.include_usage)
+            self.usage = _record_usage(event.usage)
+        if not event.choices:
+            return ""
+        text = clean_markdown(event.choices[0].delta.content or "")
+        if not self.started:
+            # Mirror answer.strip() on the full response
+            text = text.lstrip()
+            self.started = bool(text)
+            if self.started:
+                metrics.record_stage("llm_first_token", time.perf_counter() - self.start)
+        if text:
+            self.detector.feed(text)
+            self.parts.append(text)
+        return text
+
+    def finish(self, query: str, lang: str, chunks: list, sources: list, tokens: dict, cacheable: bool,
+               intent: str = RELIGIOUS) -> list:
+        """Final sources/done events; stores the answer in the cache."""
+        metrics.record_stage("llm", time.perf_counter() - self.start)
+        # Redirect answers don't show sources
+        if self.detector.found:
+            chunks = []
+            sources = []
+        _record_answer(self.detector.found, len(chunks))
         
-        # Clean markdown symbols (asterisks and underscores)
-        answer = answer.replace('*', '').replace('_', '')
+        answer = "".join(self.parts).strip()
+        if cacheable and answer:
+            response_cache.put(query, lang, PERSONA_VERSION, {
+                "response": answer,
+                "context_used": len(chunks) > 0,
+                "chunks_retrieved": len(chunks),
+                "sources": sources,
+                "intent": intent
+            })
         
-        # Step 7: Detect if response is a redirect (off-topic)
-        redirect_phrases_id = [
-            "saya gak pinter", "saya gak ngerti", "saya gak jago",
-            "bisanya cuma ngaji", "kiai kampung", "bukan keahlian saya",
-            "di luar kemampuan"
-        ]
-        redirect_phrases_en = [
-            "not my thing", "not my area", "just a village scholar",
-            "coffee and faith", "not really my expertise"
+        return [
+            ("sources", {"sources": sources, "context_used": len(chunks) > 0}),
+            ("done", {
+                "language": lang,
+                "is_redirect": self.detector.found,
+                "intent": intent,
+                "chunks_retrieved": len(chunks),
+                "prompt_tokens": tokens,
+                "usage": self.usage
+            })
         ]
+
+
+def generate_response(query: str, history: list = None, use_rag: bool = True, summary: str = "") -> dict:
+    """
+    Generate Gus Baha response with conversation history support.
+    
+    Args:
+        query: Current user message
+        history: List of previous messages [{"role": "user/assistant", "content": "..."}]
+        use_rag: Whether to use RAG for context
+        summary: Rolling summary of older turns not in history (sessions.py)
+    
+    Returns:
+        dict with response, sources, language, etc.
+    """
+    if history is None:
+        history = []
+    
+    # First-turn questions may be served from the answer cache
+    cacheable, cached = _cached_lookup(query, history, use_rag)
+    if cached:
+        return cached
+    
+    deadline = Deadline(REQUEST_DEADLINE)
+    lang, messages, chunks, sources, tokens, intent = _build_messages(query, history, use_rag, deadline, summary)
+    
+    # Generate response
+    try:
+        with metrics.timed("llm"):
+            response = client.with_options(**llm_options(deadline)).chat.completions.create(
+                **_completion_kwargs(messages, intent=intent)
+            )
         
-        answer_lower = answer.lower()
-        is_redirect = any(phrase in answer_lower for phrase in redirect_phrases_id + redirect_phrases_en)
+        with metrics.timed("postprocess"):
+            answer = response.choices[0].message.content.strip()
+            
+            # Clean markdown symbols (asterisks and underscores)
+            answer = clean_markdown(answer)
+            
+            result = _build_result(answer, lang, chunks, sources, tokens, _record_usage(response.usage), intent)
+        if cacheable and answer:
+            response_cache.put(query, lang, PERSONA_VERSION, result)
+        return result
         
-        # If redirect, don't return sources
-        if is_redirect:
-            return {
-                "response": answer,
-                "context_used": False,
-                "chunks_retrieved": 0,
-                "sources": [],
-                "language": lang,
-                "error": None
-            }
+    except Exception as e:
+        return _error_result(lang, e)
+
+
+def generate_response_stream(query: str, history: list = None, use_rag: bool = True, summary: str = ""):
+    """
+    Streaming variant of generate_response.
+    
+    Yields (event, data) tuples:
+        ("meta", {"language"})                   - before the first token
+        ("token", {"text"})                      - cleaned answer deltas as they arrive
+        ("sources", {"sources", ...})            - citations, once the answer is complete
+        ("done", {"is_redirect", "intent", ...}) - final metadata
+        ("error", {"error"})                     - generation failed
+    """
+    if history is None:
+        history = []
+    
+    cacheable, cached = _cached_lookup(query, history, use_rag)
+    if cached:
+        yield from _cached_events(cached)
+        return
+    
+    deadline = Deadline(REQUEST_DEADLINE)
+    lang, messages, chunks, sources, tokens, intent = _build_messages(query, history, use_rag, deadline, summary)
+    yield "meta", {"language": lang}
+    
+    state = _AnswerStream()
+    stream = None
+    try:
+        stream = client.with_options(**llm_options(deadline)).chat.completions.create(
+            **_completion_kwargs(messages, stream=True, intent=intent)
+        )
+        for event in stream:
+            if deadline.expired:
+                raise DeadlineExceeded("generation passed the request deadline")
+            text = state.feed(event)
+            if text:
+                yield "token", {"text": text}
+    except Exception as e:
+        yield _error_event(lang, e)
+        return
+    finally:
+        # Also runs when the client disconnects (generator closed): stop DeepSeek
+        if stream is not None:
+            stream.close()
+    
+    yield from state.finish(query, lang, chunks, sources, tokens, cacheable, intent)
+
+
+async def generate_response_async(query: str, history: list = None, use_rag: bool = True,
+                                  summary: str = "") -> dict:
+    """
+    Async variant of generate_response (AsyncOpenAI + async Ragie).
+    Same arguments and return value.
+    """
+    if history is None:
+        history = []
+    
+    cacheable, cached = _cached_lookup(query, history, use_rag)
+    if cached:
+        return cached
+    
+    deadline = Deadline(REQUEST_DEADLINE)
+    lang, messages, chunks, sources, tokens, intent = await _build_messages_async(query, history, use_rag, deadline, summary)
+    
+    try:
+        with metrics.timed("llm"):
+            response = await asyncio.wait_for(
+                async_client.with_options(**llm_options(deadline)).chat.completions.create(
+                    **_completion_kwargs(messages, intent=intent)
+                ),
+                timeout=deadline.remaining()
+            )
         
-        return {
-            "response": answer,
-            "context_used": len(chunks) > 0,
-            "chunks_retrieved": len(chunks),
-            "sources": sources,
-            "language": lang,
-            "error": None
-        }
+        with metrics.timed("postprocess"):
+            answer = clean_markdown(response.choices[0].message.content.strip())
+            result = _build_result(answer, lang, chunks, sources, tokens, _record_usage(response.usage), intent)
+        if cacheable and answer:
+            response_cache.put(query, lang, PERSONA_VERSION, result)
+        return result
         
     except Exception as e:
-        print(f"Generation error: {e}")
-        return {
-            "response": None,
-            "context_used": False,
-            "chunks_retrieved": 0,
-            "sources": [],
-            "language": lang,
-            "error": str(e)
-        }
+        return _error_result(lang, e)
+
+
+async def generate_response_stream_async(query: str, history: list = None, use_rag: bool = True,
+                                         summary: str = ""):
+    """Async variant of generate_response_stream (same events)."""
+    if history is None:
+        history = []
+    
+    cacheable, cached = _cached_lookup(query, history, use_rag)
+    if cached:
+        for item in _cached_events(cached):
+            yield item
+        return
+    
+    deadline = Deadline(REQUEST_DEADLINE)
+    lang, messages, chunks, sources, tokens, intent = await _build_messages_async(query, history, use_rag, deadline, summary)
+    yield "meta", {"language": lang}
+    
+    state = _AnswerStream()
+    stream = None
+    try:
+        stream = await async_client.with_options(**llm_options(deadline)).chat.completions.create(
+            **_completion_kwargs(messages, stream=True, intent=intent)
+        )
+        async for event in stream:
+            if deadline.expired:
+                raise DeadlineExceeded("generation passed the request deadline")
+            text = state.feed(event)
+            if text:
+                yield "token", {"text": text}
+    except Exception as e:
+        yield _error_event(lang, e)
+        return
+    finally:
+        # Also runs when the task is cancelled (client disconnected): stop DeepSeek
+        if stream is not None:
+            await stream.close()
+    
+    for item in state.finish(query, lang, chunks, sources, tokens, cacheable, intent):
+        yield item
@@ -0,0 +1,427 @@
+"""
+Ingest - Upload a corpus directory to Ragie and write its citation metadata.
+
+Walks a directory for .txt/.md/.pdf files, extracts and normalizes the
+text, and uploads each document to the Ragie partition (new documents are
+created, changed ones updated in place) from a small worker pool that
+shares one rate limit. Rate-limited (429), 5xx and connection failures
+are retried with exponential backoff, honoring Retry-After.
+
+Every finished document is appended to a checkpoint file with a hash of
+its normalized text and metadata, so an interrupted run resumes where it
+stopped and unchanged documents are skipped on the next run.
+
+Citation metadata (title, url, author, pages, type) comes from, in order
+of precedence: a "<file>.meta.json" sidecar, "---" front matter at the
+top of .md/.txt files, the existing entry in data/sources.json, and the
+file name. The records are merged into the "sources" map of
+data/sources.json, which source_index.py reloads on its own. When
+anything was uploaded, the retrieval cache is invalidated; bump
+RAGIE_KB_VERSION on the next deploy to clear every worker's local tier.
+
+Usage:
+    python ingest.py corpus/ [--concurrency 4] [--rps 2] [--retries 4] [--dry-run]
+
+Try it offline against the stub documents API:
+    python benchmarks/stub_server.py --port 8100 --ragie-error-rate 0.1 --ragie-doc-rps 5
+    RAGIE_BASE_URL=http://127.0.0.1:8100 RAGIE_API_KEY=stub python ingest.py corpus/ --sources /tmp/sources.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import retrieval_cache
+from local_index import read_pdf_pages
+from ragie_client import RAGIE_API_KEY, RAGIE_BASE_URL, RAGIE_PARTITION
+from resilience import RateLimiter
+from source_index import SOURCES_PATH, SourceIndex
+
+DOCUMENT_EXTENSIONS = (".txt", ".md", ".pdf")
+CHECKPOINT_PATH = "ingest_checkpoint.jsonl"
+
+REQUEST_TIMEOUT = 60  # seconds per HTTP call (uploads can be large)
+BACKOFF_BASE = 1.0  # seconds; doubles per retry, with jitter
+BACKOFF_MAX = 30.0
+
+_FRONT_MATTER_RE = re.compile(r"\A---\n(.*?)\n---\n", re.DOTALL)
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+class RetryableError(Exception):
+    """HTTP failure worth retrying (429, 5xx, network)."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ==================
+# TEXT AND METADATA
+# ==================
+
+def normalize_text(text: str) -> str:
+    """NFC, unified line endings, no control characters, rejoined hyphenation, collapsed spacing."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_RE.sub("", text)
+    text = _HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def split_front_matter(text: str) -> tuple[dict, str]:
+    """Leading "---" block of "key: value" lines -> (metadata, remaining text)."""
+    match = _FRONT_MATTER_RE.match(text)
+    if not match:
+        return {}, text
+    meta = {}
+    for line in match.group(1).split("\n"):
+        key, sep, value = line.partition(":")
+        if sep and key.strip():
+            value = value.strip().strip("\"'")
+            meta[key.strip().lower()] = value or None
+    return meta, text[match.end():]
+
+
+def _title_from_name(name: str) -> str:
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return re.sub(r"[_\-\s]+", " ", stem).strip().title()
+
+
+def _type_from_name(name: str) -> str:
+    lower = name.lower()
+    if lower.endswith(".pdf"):
+        return "book"
+    if "transcript" in lower:
+        return "video"
+    if lower.endswith(".md"):
+        return "summary"
+    return "unknown"
+
+
+def citation_record(name: str, path: str, front_matter: dict, pages: int, sources: SourceIndex) -> dict:
+    """
+    Citation metadata for one document.
+
+    Args:
+        name: Document name in Ragie (path relative to the corpus directory)
+        path: File on disk (for the .meta.json sidecar)
+        front_matter: Metadata parsed from the document itself
+        pages: Page count for PDFs, else 0
+        sources: Current source index (existing entries are kept as the base)
+
+    Returns:
+        Dict with at least title, url, author, pages and type
+    """
+    record = {}
+    if not sources.is_default(name):
+        record.update(sources.lookup(name))
+    record.update(front_matter)
+    sidecar = os.path.splitext(path)[0] + ".meta.json"
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as f:
+            record.update(json.load(f))
+
+    record.setdefault("title", _title_from_name(name))
+    record.setdefault("url", None)
+    record.setdefault("author", None)
+    record.setdefault("pages", f"1-{pages}" if pages else None)
+    record.setdefault("type", _type_from_name(name))
+    return record
+
+
+def load_document(corpus_dir: str, path: str, sources: SourceIndex) -> dict:
+    """Read, normalize and describe one file: {"name", "text", "sha256", "metadata"}."""
+    name = os.path.relpath(path, corpus_dir).replace(os.sep, "/")
+    pages = 0
+    if path.lower().endswith(".pdf"):
+        page_texts = read_pdf_pages(path)
+        pages = len(page_texts)
+        front_matter, text = {}, "\n".join(page_texts)
+    else:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            front_matter, text = split_front_matter(f.read().replace("\r\n", "\n"))
+    text = normalize_text(text)
+    metadata = citation_record(name, path, front_matter, pages, sources)
+    # Hash text and metadata together so a corrected citation is re-sent too
+    content = text + json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return {
+        "name": name,
+        "text": text,
+        "sha256": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+        "metadata": metadata
+    }
+
+
+def find_documents(corpus_dir: str) -> list[str]:
+    """Every .txt/.md/.pdf under the directory, in a stable order."""
+    paths = []
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        paths += [os.path.join(root, name) for name in sorted(files)
+                  if name.lower().endswith(DOCUMENT_EXTENSIONS) and not name.startswith(".")]
+    return paths
+
+
+# ==================
+# CHECKPOINT
+# ==================
+
+def load_checkpoint(path: str) -> dict:
+    """Document name -> latest checkpoint record (later lines win)."""
+    records = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted run
+                records[record["name"]] = record
+    return records
+
+
+class Checkpoint:
+    """Append-only JSONL of finished documents, shared by the workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = load_checkpoint(path)
+        self.lock = threading.Lock()
+
+    def is_current(self, document: dict) -> bool:
+        record = self.records.get(document["name"])
+        return bool(record and record.get("sha256") == document["sha256"] and record.get("document_id"))
+
+    def document_id(self, name: str) -> str | None:
+        record = self.records.get(name)
+        return record.get("document_id") if record else None
+
+    def add(self, record: dict):
+        with self.lock:
+            self.records[record["name"]] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# ==================
+# RAGIE DOCUMENTS API
+# ==================
+
+class RagieUploader:
+    """Rate-limited, retrying client for the Ragie documents API."""
+
+    def __init__(self, limiter: RateLimiter, retries: int, partition: str = RAGIE_PARTITION):
+        self.limiter = limiter
+        self.retries = retries
+        self.partition = partition
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {RAGIE_API_KEY}"})
+        self.retried = 0
+        self.lock = threading.Lock()
+
+    def _attempt(self, method: str, path: str, **kwargs) -> requests.Response:
+        self.limiter.wait()
+        try:
+            response = self.session.request(method, f"{RAGIE_BASE_URL}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(f"{method} {path}: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            try:
+                retry_after = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                retry_after = None
+            if response.status_code == 429:
+                self.limiter.pause(retry_after or BACKOFF_BASE)
+            raise RetryableError(f"{method} {path}: HTTP {response.status_code}", retry_after)
+        return response
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send with retries; returns the final response (4xx other than 429 are not retried)."""
+        for attempt in range(self.retries + 1):
+            try:
+                return self._attempt(method, path, **kwargs)
+            except RetryableError as e:
+                if attempt == self.retries:
+                    raise
+                with self.lock:
+                    self.retried += 1
+                backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+                time.sleep(max(backoff, e.retry_after or 0.0))
+
+    def existing_documents(self) -> dict:
+        """Document name -> id for everything already in the partition."""
+        documents = {}
+        cursor = None
+        while True:
+            params = {"page_size": 100}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.request("GET", "/documents", params=params, headers={"partition": self.partition})
+            response.raise_for_status()
+            data = response.json()
+            documents.update({doc.get("name", ""): doc.get("id") for doc in data.get("documents", [])})
+            cursor = (data.get("pagination") or {}).get("next_cursor")
+            if not cursor:
+                return documents
+
+    def upload(self, document: dict, document_id: str = None) -> str:
+        """Create the document, or replace the text and metadata of an existing one; returns its id."""
+        metadata = {key: value for key, value in document["metadata"].items() if value is not None}
+        if document_id:
+            response = self.request("PUT", f"/documents/{document_id}/raw", json={"data": document["text"]})
+            if response.status_code != 404:
+                response.raise_for_status()
+                response = self.request("PATCH", f"/documents/{document_id}/metadata", json={"metadata": metadata})
+                response.raise_for_status()
+                return document_id
+            # Deleted from Ragie since the last run: create it again
+        response = self.request("POST", "/documents/raw", json={
+            "name": document["name"],
+            "data": document["text"],
+            "metadata": metadata,
+            "partition": self.partition
+        })
+        response.raise_for_status()
+        return response.json()["id"]
+
+
+# ==================
+# SOURCES FILE
+# ==================
+
+def write_sources(path: str, records: dict):
+    """Merge citation records into the "sources" map of the sources file (atomic replace)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    data.setdefault("sources", {}).update(records)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+# ==================
+# CLI
+# ==================
+
+def ingest(args) -> int:
+    sources_path = args.sources
+    try:
+        sources = SourceIndex.load(sources_path)
+    except FileNotFoundError:
+        sources = SourceIndex({})
+    checkpoint = Checkpoint(args.checkpoint)
+
+    documents = []
+    for path in find_documents(args.corpus_dir):
+        document = load_document(args.corpus_dir, path, sources)
+        if document["text"]:
+            documents.append(document)
+        else:
+            print(f"Skipping {document['name']}: no text extracted")
+    pending = [doc for doc in documents if not checkpoint.is_current(doc)]
+    print(f"{len(documents)} documents in {args.corpus_dir}, {len(documents) - len(pending)} unchanged, "
+          f"{len(pending)} to upload (partition {RAGIE_PARTITION})")
+
+    records = {doc["name"]: doc["metadata"] for doc in documents}
+    if args.dry_run:
+        for doc in pending:
+            print(f"  {doc['name']}: {len(doc['text'])} chars, {json.dumps(doc['metadata'], ensure_ascii=False)}")
+        return 0
+    if not RAGIE_API_KEY:
+        print("RAGIE_API_KEY is not set")
+        return 1
+
+    uploader = RagieUploader(RateLimiter(args.rps), args.retries)
+    try:
+        existing = uploader.existing_documents() if pending else {}
+    except (requests.RequestException, RetryableError, KeyError, ValueError) as e:
+        print(f"Could not list the documents already in partition {RAGIE_PARTITION}: {e}")
+        return 1
+    uploaded, failed = 0, []
+    start = time.perf_counter()
+
+    def upload(document: dict) -> str:
+        document_id = checkpoint.document_id(document["name"]) or existing.get(document["name"])
+        return uploader.upload(document, document_id)
+
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    futures = {pool.submit(upload, doc): doc for doc in pending}
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            document = futures[future]
+            try:
+                document_id = future.result()
+            except (requests.RequestException, RetryableError, KeyError, ValueError) as e:
+                failed.append(document["name"])
+                print(f"[{done}/{len(pending)}] FAILED {document['name']}: {e}")
+                continue
+            checkpoint.add({
+                "name": document["name"],
+                "sha256": document["sha256"],
+                "document_id": document_id,
+                "chars": len(document["text"]),
+                "uploaded_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            })
+            uploaded += 1
+            print(f"[{done}/{len(pending)}] {document['name']} -> {document_id}")
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("Interrupted; finished documents are checkpointed, rerun to resume")
+        failed.append(None)
+    else:
+        pool.shutdown()
+
+    # Only documents Ragie actually has go into the citation file
+    write_sources(sources_path, {name: meta for name, meta in records.items() if checkpoint.document_id(name)})
+    elapsed = time.perf_counter() - start
+    print(f"\nUploaded {uploaded}, failed {len(list(filter(None, failed)))}, skipped {len(documents) - len(pending)} unchanged, "
+          f"{uploader.retried} retries, {uploaded / elapsed if elapsed else 0.0:.2f} docs/s")
+    print(f"Citation metadata written to {sources_path}")
+    if uploaded:
+        # Cached searches still hold the old chunks
+        try:
+            retrieval_cache.invalidate()
+            print("Retrieval cache invalidated")
+        except Exception as e:
+            print(f"Retrieval cache not invalidated ({e}); run: python retrieval_cache.py invalidate")
+        print("Bump RAGIE_KB_VERSION on the next deploy so every worker's local cache is dropped too")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus_dir", help="directory of .txt/.md/.pdf documents")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel uploads")
+    parser.add_argument("--rps", type=float, default=2.0, help="max Ragie requests started per second (0 = no limit)")
+    parser.add_argument("--retries", type=int, default=4, help="retries per request on 429/5xx/network errors")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="resume file (JSONL)")
+    parser.add_argument("--sources", default=SOURCES_PATH, help="citation metadata file to update")
+    parser.add_argument("--dry-run", action="store_true", help="show what would be uploaded, change nothing")
+    args = parser.parse_args()
+    if not os.path.isdir(args.corpus_dir):
+        sys.exit(f"Not a directory: {args.corpus_dir}")
+    sys.exit(ingest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Intent - Fast local intent gate that runs before retrieval.
+Labels each query as one of:
+    religious  - faith or life question; grounded, so Ragie is searched
+    identity   - "siapa kamu", "are you a bot" (persona answers from the prompt)
+    greeting   - greetings, thanks and small talk
+    off_topic  - cooking, coding, sport, ... (persona redirects)
+
+Only religious queries are worth a retrieval; the others are answered from
+the system prompt, so the generator skips Ragie and uses a smaller
+max_tokens. Any religious or life term (including every term in the
+query-expansion lexicon) wins, so a mixed question is always grounded;
+when nothing matches, the query is treated as religious too.
+
+Off-topic needs two distinct off-topic signals, or one without moral
+framing ("boleh", "is it allowed", "gimana kalau ..."), so "Is listening
+to music allowed?" is still grounded. A follow-up in an ongoing religious
+conversation ("terus kalau main game gimana?") inherits its intent.
+
+Phrases are matched whole-word, longest first, with the lexicon trie.
+Check it with: python benchmarks/intent_gate.py
+"""
+
+import os
+import re
+
+from lexicon import Lexicon, tokenize, get_lexicon
+from query_variants import FOLLOWUP_MARKERS, FOLLOWUP_MAX_WORDS, HISTORY_TURNS
+
+INTENT_GATE_ENABLED = os.environ.get("INTENT_GATE_ENABLED", "1") == "1"
+
+RELIGIOUS = "religious"
+IDENTITY = "identity"
+GREETING = "greeting"
+OFF_TOPIC = "off_topic"
+INTENTS = (RELIGIOUS, IDENTITY, GREETING, OFF_TOPIC)
+
+# Completion cap per intent (the grounded answer keeps the generator default)
+MAX_TOKENS = {IDENTITY: 150, GREETING: 150, OFF_TOPIC: 200}
+
+# Longest greeting/small-talk message that is still treated as one
+GREETING_MAX_WORDS = 8
+
+# Faith and life vocabulary on top of the query-expansion lexicon
+RELIGIOUS_TERMS = [
+    # Indonesian
+    "agama", "islam", "quran", "alquran", "al quran", "ayat", "hadits", "hadis", "masjid", "mushola",
+    "wudhu", "wudu", "haji", "umrah", "zakat", "ramadan", "ramadhan", "lebaran", "pahala", "berdosa",
+    "setan", "iblis", "jin", "kiamat", "istighfar", "tahajud", "sholawat", "hijrah", "jilbab", "hijab",
+    "aurat", "riba", "halal", "haram", "makruh", "sunnah", "wajib", "fardhu", "syariat", "fiqih",
+    "akidah", "tasawuf", "ustadz", "ustad", "pesantren", "mondok", "muslim", "mukmin", "kubur",
+    "hidup", "keluarga", "istri", "suami", "anak", "nikah", "menikah", "cerai", "jodoh", "pacar",
+    "pacaran", "ayah", "ibu", "bapak", "ortu", "mertua", "kerja", "pekerjaan", "dipecat", "nganggur",
+    "cemas", "khawatir", "kecewa", "kesepian", "bingung", "capek", "lelah", "depresi", "bunuh diri",
+    "kecanduan", "harga diri", "minder", "iri", "dengki", "bersalah", "menyesal", "kangen", "rindu",
+    "pasrah", "nasib", "takdir", "cobaan hidup", "miskin", "bangkrut", "hukum", "hukumnya", "boleh gak",
+    "bolehkah",
+    # English
+    "god", "pray", "prayer", "prayers", "praying", "sin", "sins", "sinful", "forgive", "forgiven",
+    "forgiveness", "faith", "quran", "prophet", "islam", "muslim", "heaven", "hell", "afterlife",
+    "death", "die", "dying", "afraid", "scared", "fear", "sad", "depressed", "anxious", "anxiety",
+    "lonely", "worried", "guilty", "hopeless", "family", "parents", "mother", "father", "wife",
+    "husband", "marriage", "divorce", "children", "job", "life", "grateful", "patience", "patient",
+    "mercy", "repent", "fasting", "ramadan", "mosque", "worship", "soul", "heart", "religion",
+    "spiritual", "lazy", "hypocrite", "debt", "angry", "jealous", "broke", "poor",
+    # Javanese
+    "urip", "ngibadah", "bojo", "wong tuwo", "susah ati", "nelongso", "sambat", "pasrah",
+]
+
+IDENTITY_TERMS = [
+    "siapa kamu", "kamu siapa", "siapa anda", "anda siapa", "siapa namamu", "namamu", "nama kamu",
+    "kamu itu apa", "kamu bot", "kamu robot", "kamu ai", "kamu manusia", "kamu beneran",
+    "kamu gus baha", "kamu asli", "ini gus baha", "gus baha asli", "umur kamu", "umurmu", "berapa umur",
+    "tinggal dimana", "tinggal di mana", "rumahmu", "rumah kamu", "yang bikin kamu", "yang buat kamu",
+    "dibuat siapa", "bikinan siapa",
+    "who are you", "what are you", "your name", "are you a bot", "are you a robot", "are you ai",
+    "are you an ai", "are you human", "are you real", "are you the real", "are you gus baha", "how old are you",
+    "where do you live", "who made you", "who created you", "who built you",
+    "sopo kowe", "kowe sopo", "sampeyan sinten", "panjenengan sinten", "sampeyan sopo",
+]
+
+GREETING_TERMS = [
+    "halo", "hallo", "helo", "hai", "hi", "hello", "hey", "assalamualaikum", "assalamu'alaikum",
+    "assalamu alaikum", "assalamualaikum wr wb", "waalaikumsalam", "wa'alaikumsalam", "salam",
+    "selamat pagi", "selamat siang", "selamat sore", "selamat malam", "pagi", "siang", "sore", "malam",
+    "good morning", "good afternoon", "good evening", "good night",
+    "terima kasih", "terimakasih", "makasih", "makasi", "trims", "thanks", "thank you", "thx",
+    "matur nuwun", "maturnuwun", "suwun", "nuwun", "sugeng enjing", "sugeng siang", "sugeng sonten",
+    "apa kabar", "kabar", "how are you", "ok", "oke", "okay", "sip", "siap", "baik", "mantap",
+    "mantul", "keren", "nice", "cool", "great", "hehe", "haha", "wkwk", "wkwkwk", "bye", "dadah",
+    "sampai jumpa", "see you", "test", "tes",
+]
+
+# Words that may pad a greeting ("makasih banyak ya gus")
+FILLER_TERMS = [
+    "gus", "ya", "yah", "yaa", "kak", "min", "deh", "dong", "nih", "sih", "juga", "banyak", "banget",
+    "sekali", "semua", "lagi", "so", "much", "very", "you", "kamu", "sampeyan", "lur", "bro", "sis",
+    "and", "dan", "all", "guys", "there", "everyone",
+]
+
+OFF_TOPIC_TERMS = [
+    # Cooking
+    "resep", "masak", "memasak", "masakan", "rendang", "nasi goreng", "kue", "bikin kue", "bumbu",
+    "recipe", "cook", "cooking", "bake", "baking",
+    # Technology
+    "coding", "ngoding", "program", "pemrograman", "python", "javascript", "java", "html", "css",
+    "komputer", "laptop", "handphone", "aplikasi", "install", "wifi", "internet",
+    "code", "programming", "computer", "iphone", "android", "software", "debug",
+    # Sport
+    "sepakbola", "sepak bola", "piala dunia", "liga", "timnas", "messi", "ronaldo", "badminton",
+    "football", "soccer", "world cup", "nba", "basketball",
+    # Entertainment
+    "film", "movie", "netflix", "drakor", "lagu viral", "viral", "trending", "lyrics", "lirik",
+    "artis", "selebriti", "celebrity", "gosip", "gossip", "game", "anime",
+    # Shopping
+    "diskon", "belanja online", "promo", "discount", "shopping", "best phone",
+    # Politics
+    "politik", "pemilu", "capres", "cawapres", "partai", "pilkada", "election", "politics",
+    # Homework
+    "pr matematika", "matematika", "fisika", "kimia", "rumus", "integral", "persamaan", "homework", "math",
+    "physics", "chemistry", "equation",
+]
+
+
+# Moral or "what about my case" framing: an off-topic word inside such a
+# question is a fiqh/life question ("gimana kalau hp saya hasil curian?")
+FRAMING_TERMS = [
+    "boleh", "bolehkah", "dibolehkan", "diperbolehkan", "pantas", "pantaskah", "salah gak",
+    "salah nggak", "gimana kalau", "bagaimana kalau", "kalau saya", "apakah saya", "berkah",
+    "allowed", "permissible", "is it ok", "is it okay", "is it wrong", "should i", "can i", "may i",
+    "what if", "okay to",
+]
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def _build_trie() -> Lexicon:
+    """One trie over every phrase; religious terms win when phrases collide."""
+    entries = {}
+    for label, terms in ((OFF_TOPIC, OFF_TOPIC_TERMS), ("framing", FRAMING_TERMS), ("filler", FILLER_TERMS),
+                         (GREETING, GREETING_TERMS), (IDENTITY, IDENTITY_TERMS)):
+        for term in terms:
+            entries[term] = label
+    for term in [*get_lexicon().phrases, *RELIGIOUS_TERMS]:
+        entries[term] = RELIGIOUS
+    return Lexicon(entries)
+
+
+_trie = None
+
+
+def _get_trie() -> Lexicon:
+    global _trie
+    if _trie is None:
+        _trie = _build_trie()
+    return _trie
+
+
+def _classify_message(query: str) -> tuple[str, int]:
+    """(intent of the message on its own, distinct off-topic signals)."""
+    words = tokenize(query)
+    if not words:
+        return GREETING, 0
+    matches = _get_trie().match(query)
+    labels = {label for _, label in matches}
+    off_topic = {phrase for phrase, label in matches if label == OFF_TOPIC}
+    if RELIGIOUS in labels:
+        return RELIGIOUS, len(off_topic)
+    if IDENTITY in labels:
+        return IDENTITY, len(off_topic)
+    if len(off_topic) >= 2 or (off_topic and "framing" not in labels):
+        return OFF_TOPIC, len(off_topic)
+    covered = sum(len(phrase.split()) for phrase, label in matches if label in (GREETING, "filler"))
+    if GREETING in labels and covered == len(words) and len(words) <= GREETING_MAX_WORDS:
+        return GREETING, 0
+    return RELIGIOUS, len(off_topic)
+
+
+def _continues(query: str) -> bool:
+    """Short, or points back at the conversation ("terus", "itu", a question)."""
+    words = _WORD_RE.findall(query.lower())
+    return len(words) <= FOLLOWUP_MAX_WORDS or any(word in FOLLOWUP_MARKERS for word in words)
+
+
+def classify(query: str, history: list = None) -> str:
+    """
+    Intent label for a user message (see module docstring).
+
+    Args:
+        query: Current user message
+        history: Previous messages [{"role", "content"}]; a follow-up to a
+                 recent religious question is religious too
+
+    Returns:
+        One of INTENTS
+    """
+    intent, off_topic_signals = _classify_message(query)
+    # Several off-topic signals ("laptop buat coding python") stand on their own
+    if intent not in (OFF_TOPIC, GREETING) or off_topic_signals >= 2 or not history:
+        return intent
+    # A closing "makasih gus" stays a greeting; "oke, terus gimana?" does not
+    if intent == GREETING and "?" not in query and \
+            not any(word in FOLLOWUP_MARKERS for word in _WORD_RE.findall(query.lower())):
+        return intent
+    previous = [m["content"] for m in history if m.get("role") == "user" and m.get("content")]
+    if _continues(query) and any(_classify_message(text)[0] == RELIGIOUS for text in previous[-HISTORY_TURNS:]):
+        return RELIGIOUS
+    return intent
+
+
+def needs_retrieval(intent: str) -> bool:
+    return intent == RELIGIOUS or not INTENT_GATE_ENABLED
+
+
+def max_tokens(intent: str, default: int) -> int:
+    """Completion cap for the intent (only lowered when the gate is on)."""
+    if not INTENT_GATE_ENABLED:
+        return default
+    return MAX_TOKENS.get(intent, default)
@@ -0,0 +1,114 @@
+"""
+Lexicon - Compiled Indonesian/Javanese -> English term lexicon for query expansion.
+Loaded once from data/lexicon_id_en.json into a word-level trie, so
+expansion is a single pass over the query, matches whole words only
+("mati" does not match "matikan") and prefers the longest phrase
+("takut mati" over "takut" + "mati").
+"""
+
+import os
+import re
+import json
+
+LEXICON_PATH = os.environ.get(
+    "LEXICON_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lexicon_id_en.json")
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+_END = ""  # trie key marking the end of a phrase
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase whole-word tokens (apostrophes kept inside words)."""
+    return _WORD_RE.findall(text.lower().replace("’", "'"))
+
+
+class Lexicon:
+    """Word-level trie over lexicon phrases with longest-match expansion."""
+
+    def __init__(self, entries: dict):
+        self.size = len(entries)
+        self.phrases = list(entries)
+        self.trie = {}
+        self.max_words = 0
+        for phrase, expansion in entries.items():
+            words = tokenize(phrase)
+            if not words:
+                continue
+            node = self.trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[_END] = expansion
+            self.max_words = max(self.max_words, len(words))
+
+    @classmethod
+    def load(cls, path: str = LEXICON_PATH) -> "Lexicon":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _spans(self, words: list[str]) -> list[tuple[int, int, str]]:
+        """(start, end, expansion) of each longest match, in order."""
+        spans = []
+        i = 0
+        while i < len(words):
+            node = self.trie
+            best = None
+            j = i
+            while j < len(words) and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if _END in node:
+                    best = (j, node[_END])
+            if best:
+                end, expansion = best
+                spans.append((i, end, expansion))
+                i = end
+            else:
+                i += 1
+        return spans
+
+    def match(self, text: str) -> list[tuple[str, str]]:
+        """Return (phrase, expansion) pairs in query order, longest match first."""
+        words = tokenize(text)
+        return [(" ".join(words[start:end]), expansion) for start, end, expansion in self._spans(words)]
+
+    def substitute(self, text: str) -> str | None:
+        """The text with every matched phrase replaced in place, or None if nothing matched."""
+        words = tokenize(text)
+        spans = self._spans(words)
+        if not spans:
+            return None
+        out = []
+        i = 0
+        for start, end, expansion in spans:
+            out.extend(words[i:start])
+            out.append(expansion)
+            i = end
+        out.extend(words[i:])
+        return " ".join(out)
+
+    def expand(self, text: str) -> str | None:
+        """English expansion for the query, or None if no term matched."""
+        expansions = []
+        for _, expansion in self.match(text):
+            if expansion not in expansions:
+                expansions.append(expansion)
+        return " ".join(expansions) if expansions else None
+
+
+_lexicon = None
+
+
+def get_lexicon() -> Lexicon:
+    """Process-wide compiled lexicon (loaded on first use)."""
+    global _lexicon
+    if _lexicon is None:
+        _lexicon = Lexicon.load()
+    return _lexicon
+
+
+def reload():
+    """Re-read the lexicon file (after editing it)."""
+    global _lexicon
+    _lexicon = Lexicon.load()
@@ -0,0 +1,248 @@
+"""
+Local Index - In-process BM25 keyword retrieval over the Gus Baha corpus.
+Used as a fallback or stand-in for Ragie (see RETRIEVAL_BACKEND in
+ragie_client.py) so answers keep their grounding when Ragie is slow,
+and staging can run fully offline.
+
+Build the on-disk index from the same documents ingested into Ragie:
+    python local_index.py build corpus/ data/bm25_index.json
+Query it:
+    python local_index.py search "takut mati karena dosa"
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import heapq
+import threading
+from collections import Counter
+
+LOCAL_INDEX_PATH = os.environ.get(
+    "LOCAL_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bm25_index.json")
+)
+
+CHUNK_CHARS = 800
+CHUNK_OVERLAP = 200
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Common Indonesian/English function words (and chat fillers) that carry no topic
+STOPWORDS = {
+    # Indonesian
+    "yang", "dan", "di", "ke", "dari", "ini", "itu", "dengan", "untuk", "pada", "adalah",
+    "dalam", "tidak", "akan", "juga", "atau", "ada", "karena", "oleh", "saya", "aku",
+    "kamu", "kita", "kami", "dia", "mereka", "apa", "bagaimana", "gimana", "kenapa",
+    "mengapa", "kalau", "jika", "tapi", "tetapi", "sudah", "udah", "belum", "bisa",
+    "lebih", "sangat", "banget", "saja", "aja", "lagi", "jadi", "seperti", "kok", "sih",
+    "dong", "deh", "nih", "loh", "kan", "ya", "gak", "nggak", "ga", "tak", "pun", "lah",
+    "nya", "se", "para", "sama", "gitu", "gini", "terus", "mau", "harus",
+    # English
+    "the", "a", "an", "and", "or", "but", "is", "are", "was", "were", "be", "been", "to",
+    "of", "in", "on", "at", "for", "with", "by", "from", "as", "it", "this", "that",
+    "i", "you", "he", "she", "we", "they", "my", "your", "me", "do", "does", "did",
+    "what", "how", "why", "if", "so", "not", "can", "have", "has", "am",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens for Indonesian/English, without stopwords."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        # Strip the Indonesian possessive suffix: "hatinya" -> "hati"
+        if token.endswith("nya") and len(token) > 5:
+            token = token[:-3]
+        if token not in STOPWORDS and len(token) > 1:
+            tokens.append(token)
+    return tokens
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Split text into overlapping windows, preferring paragraph/sentence breaks."""
+    text = re.sub(r"[ \t]+", " ", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Back up to the last break inside the window
+            cut = max(text.rfind("\n", start, end), text.rfind(". ", start, end))
+            if cut > start + size // 2:
+                end = cut + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Don't start a window mid-word
+        space = text.find(" ", start, end)
+        if space != -1:
+            start = space + 1
+    return chunks
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring."""
+
+    def __init__(self, chunks: list[dict], postings: dict, doc_lengths: list[int]):
+        self.chunks = chunks              # [{"text", "document_name"}]
+        self.postings = postings          # term -> [[chunk_id, tf], ...]
+        self.doc_lengths = doc_lengths
+        n = len(doc_lengths)
+        self.avgdl = (sum(doc_lengths) / n) if n else 1.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def build(cls, chunks: list[dict]) -> "BM25Index":
+        postings = {}
+        doc_lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk["text"])
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([chunk_id, tf])
+        return cls(chunks, postings, doc_lengths)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "chunks": self.chunks,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["chunks"], data["postings"], data["doc_lengths"])
+
+    def search(self, query: str, top_k: int = 6) -> list[dict]:
+        """Return scored chunks shaped like Ragie's scored_chunks."""
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for chunk_id, tf in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[chunk_id] / self.avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        if not best:
+            return []
+
+        # Scale into 0-1 so results can be merged with Ragie scores
+        top_score = best[0][1]
+        return [{
+            "id": f"local:{chunk_id}",
+            "text": self.chunks[chunk_id]["text"],
+            "score": round(score / top_score, 4),
+            "bm25": round(score, 4),
+            "document_name": self.chunks[chunk_id]["document_name"]
+        } for chunk_id, score in best]
+
+
+# ==================
+# CORPUS LOADING
+# ==================
+
+def read_pdf_pages(path: str) -> list[str]:
+    """Text of each page of a PDF (empty without pypdf)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print(f"Skipping {path}: install pypdf to index PDFs")
+        return []
+    reader = PdfReader(path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def read_document(path: str) -> str:
+    """Extract text from a .txt/.md/.pdf file."""
+    if path.lower().endswith(".pdf"):
+        return "\n".join(read_pdf_pages(path))
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def chunk_directory(corpus_dir: str) -> list[dict]:
+    """Chunk every document in a directory: [{"text", "document_name"}]."""
+    chunks = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith((".txt", ".md", ".pdf")):
+            continue
+        text = read_document(os.path.join(corpus_dir, name))
+        for chunk in chunk_text(text):
+            chunks.append({"text": chunk, "document_name": name})
+    return chunks
+
+
+def build_from_directory(corpus_dir: str) -> BM25Index:
+    """Chunk every document in a directory and index it."""
+    return BM25Index.build(chunk_directory(corpus_dir))
+
+
+# ==================
+# PROCESS-WIDE INDEX
+# ==================
+
+_index = None
+_index_lock = threading.Lock()
+_index_missing = False
+
+
+def get_index() -> BM25Index | None:
+    """Load the on-disk index once per process (None if not built)."""
+    global _index, _index_missing
+    if _index is None and not _index_missing:
+        with _index_lock:
+            if _index is None and not _index_missing:
+                if os.path.exists(LOCAL_INDEX_PATH):
+                    _index = BM25Index.load(LOCAL_INDEX_PATH)
+                else:
+                    print(f"Warning: local index not found at {LOCAL_INDEX_PATH}")
+                    _index_missing = True
+    return _index
+
+
+def is_available() -> bool:
+    return get_index() is not None
+
+
+def search(query: str, top_k: int = 6) -> list[dict]:
+    """Search the local index (empty list if not built)."""
+    index = get_index()
+    if index is None:
+        return []
+    return index.search(query, top_k)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "build":
+        output = sys.argv[3] if len(sys.argv) > 3 else LOCAL_INDEX_PATH
+        index = build_from_directory(sys.argv[2])
+        index.save(output)
+        print(f"Indexed {len(index.chunks)} chunks, {len(index.postings)} terms -> {output}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "search":
+        get_index()
+        start = time.perf_counter()
+        results = search(sys.argv[2])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for r in results:
+            print(f"{r['score']:.3f}  {r['document_name']}  {r['text'][:100]!r}")
+        print(f"({elapsed_ms:.2f} ms)")
+    else:
+        print(__doc__)
@@ -6,12 +6,62 @@ DISCLAIMER: Ini adalah chatbot edukasi, bukan fatwa resmi.
 """
 
 import os
-from flask import Flask, render_template, request, jsonify
+import json
+import time
+from contextlib import closing
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context, g
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from generator import generate_response
+import metrics
+import sessions
+import rerank
+import summarizer
+import retrieval_cache
+import response_cache
+import vector_store
+from ragie_client import resilience_stats, fanout_stats
+from intent import RELIGIOUS
+from critic import should_critique, submit_critique, submit_validation, get_critique, stats as critic_stats
+from generator import (
+    generate_response, generate_response_stream, usage_stats, clean_markdown, is_redirect, REQUEST_DEADLINE
+)
+from resilience import Deadline
 
 app = Flask(__name__)
 
+# History lives server-side (sessions.py), so chat bodies are just the new message
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", "32768"))
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+
+
+CHAT_ENDPOINTS = ("/chat", "/chat/stream")
+
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+
+
+@app.after_request
+def add_request_metrics(response):
+    """Count chat requests; non-streamed responses get a Server-Timing header."""
+    if request.path in CHAT_ENDPOINTS:
+        metrics.inc("gus_requests_total", endpoint=request.path, status=str(response.status_code))
+        if not response.is_streamed:
+            metrics.record_stage("total", time.perf_counter() - g.request_start)
+            response.headers["Server-Timing"] = metrics.server_timing_header()
+    return response
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({
+        "success": False,
+        "error": "Pesan terlalu panjang / Message too long"
+    }), 413
+
 
 @app.route("/")
 def index():
@@ -23,13 +73,12 @@ def index():
 def chat():
     """
     Main chat endpoint.
-    Accepts conversation history for multi-turn conversations.
-    Returns response with source citations.
+    Continues the conversation named by session_id (history is kept
+    server-side). Returns response with source citations.
     """
     try:
         data = request.get_json() or {}
         query = (data.get("message") or "").strip()
-        history = data.get("history") or []  # Conversation history from frontend
         
         if not query:
             return jsonify({
@@ -37,8 +86,21 @@ def chat():
                 "error": "Pertanyaan kosong / Empty question"
             }), 400
         
+        session_id, session = sessions.start_turn(data)
+        
         # Generate response with RAG and conversation history
-        result = generate_response(query, history=history, use_rag=True)
+        result = generate_response(
+            query, history=session["messages"], use_rag=True, summary=session.get("summary", "")
+        )
+        
+        if result.get("timeout"):
+            # Ran out of the request deadline: a friendly message the UI shows as-is
+            metrics.inc("gus_aborted_requests_total", endpoint="/chat", reason="timeout")
+            return jsonify({
+                "success": False,
+                "error": result["error"],
+                "timeout": True
+            }), 504
         
         if result.get("error"):
             return jsonify({
@@ -46,14 +108,30 @@ def chat():
                 "error": result["error"]
             }), 500
         
-        return jsonify({
+        session = sessions.append_turn(session_id, session, query, result["response"])
+        summarizer.maybe_summarize(session_id, session)
+        payload = {
             "success": True,
             "response": result["response"],
             "language": result.get("language", "id"),
             "context_used": result.get("context_used", False),
-            "sources": result.get("sources", [])
-        })
+            "sources": result.get("sources", []),
+            "session_id": session_id,
+            "turn": session["turns"]
+        }
         
+        # Speculative critic: answer now, poll /chat/critic/<response_id> for a rewrite
+        # (religious answers only; greetings and off-topic redirects are short by design)
+        if result.get("intent") == RELIGIOUS and not is_redirect(result["response"]) and should_critique():
+            payload["response_id"] = submit_critique(
+                result["response"], query, payload["language"], session_id, session["turns"]
+            )
+            payload["critic"] = "pending"
+        
+        return jsonify(payload)
+        
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         print(f"Chat error: {e}")
         return jsonify({
@@ -62,12 +140,147 @@ def chat():
         }), 500
 
 
+def format_sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def critic_replacement(answer: str, query: str, language: str, deadline: Deadline) -> str | None:
+    """
+    Run the critic on a delivered answer; returns the rewrite, if any.
+    Waits at most until the request deadline (None on timeout; the critic
+    finishes on its own thread and the answer stands).
+    """
+    if deadline.expired:
+        return None
+    future = submit_validation(answer, query, language)
+    try:
+        result = future.result(timeout=deadline.remaining())
+    except FutureTimeout:
+        metrics.inc("gus_critic_total", outcome="timeout")
+        return None
+    if result["was_rewritten"] and result["final_answer"]:
+        return clean_markdown(result["final_answer"])
+    return None
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events).
+    Sends answer tokens as they arrive, then sources and final metadata
+    (the done event carries the session_id and turn for the next request).
+    """
+    data = request.get_json() or {}
+    query = (data.get("message") or "").strip()
+    
+    if not query:
+        return jsonify({
+            "success": False,
+            "error": "Pertanyaan kosong / Empty question"
+        }), 400
+    
+    session_id, session = sessions.start_turn(data)
+    
+    def events():
+        start = time.perf_counter()
+        deadline = Deadline(REQUEST_DEADLINE)
+        metrics.start_request()
+        try:
+            parts = []
+            done = None
+            with closing(generate_response_stream(
+                query, history=session["messages"], use_rag=True, summary=session.get("summary", "")
+            )) as stream:
+                for event, payload in stream:
+                    if event == "token":
+                        parts.append(payload["text"])
+                    elif event == "done":
+                        saved = sessions.append_turn(session_id, session, query, "".join(parts).strip())
+                        summarizer.maybe_summarize(session_id, saved)
+                        # Headers are long gone; the stage breakdown rides on the done event
+                        metrics.record_stage("total", time.perf_counter() - start)
+                        payload = done = {
+                            **payload,
+                            "session_id": session_id,
+                            "turn": saved["turns"],
+                            "server_timing": metrics.request_timings()
+                        }
+                    elif event == "error" and payload.get("timeout"):
+                        metrics.inc("gus_aborted_requests_total", endpoint="/chat/stream", reason="timeout")
+                    yield format_sse(event, payload)
+            
+            # Speculative critic: the answer is already on screen; push a rewrite if needed
+            # (religious answers only; greetings and off-topic redirects are short by design)
+            answer = "".join(parts).strip()
+            if done and answer and done.get("intent") == RELIGIOUS and not done["is_redirect"] and should_critique():
+                rewrite = critic_replacement(answer, query, done["language"], deadline)
+                if rewrite:
+                    sessions.replace_last_answer(session_id, rewrite)
+                    yield format_sse("replace", {"text": rewrite})
+        except GeneratorExit:
+            # Client went away: closing the stream above aborts the DeepSeek call
+            metrics.inc("gus_aborted_requests_total", endpoint="/chat/stream", reason="disconnect")
+            raise
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield format_sse("error", {"error": "Maaf, ada gangguan teknis. Coba lagi ya."})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@app.route("/chat/session/<session_id>", methods=["DELETE"])
+def chat_session_delete(session_id):
+    """Forget a conversation ("new chat")."""
+    sessions.delete(session_id)
+    return jsonify({"success": True})
+
+
+@app.route("/chat/critic/<response_id>", methods=["GET"])
+def chat_critic(response_id):
+    """
+    Speculative critic result for a /chat response.
+    Any worker can answer when DATABASE_URL is set (results are shared in
+    Postgres); without it only the worker that served the answer knows it.
+    """
+    result = get_critique(response_id)
+    if result is None:
+        return jsonify({"success": False, "error": "Unknown response id"}), 404
+    
+    payload = {"success": True, "status": result["status"]}
+    if result["status"] == "rewritten":
+        payload["response"] = clean_markdown(result["final_answer"])
+    return jsonify(payload)
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (merged across workers)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint."""
     return jsonify({
         "status": "ok",
-        "service": "gus-app"
+        "service": "gus-app",
+        "retrieval_cache": retrieval_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "sessions": sessions.stats(),
+        "ragie": resilience_stats(),
+        "fanout": fanout_stats(),
+        "rerank": rerank.stats(),
+        "vector_store": vector_store.stats(),
+        "deepseek_usage": usage_stats(),
+        "critic": critic_stats()
     })
 
 
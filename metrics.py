@@ -0,0 +1,265 @@
+"""
+Metrics - Lightweight per-stage latency histograms and counters.
+Exposed in Prometheus text format on /metrics, and per request as a
+Server-Timing header (or the "server_timing" field of the stream's done
+event) so browser devtools show where the time went.
+
+Recording is an in-memory update under a lock. Each worker writes a
+snapshot to METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds;
+/metrics merges the snapshots of all live workers, so any gunicorn worker
+can answer a scrape. Set METRICS_DIR="" to report this process only.
+"""
+
+import os
+import json
+import time
+import bisect
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "gus-metrics"))
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))  # seconds
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CHUNK_BUCKETS = (0, 1, 2, 4, 6, 8, 12)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "gus_stage_duration_seconds": ("histogram", "Time spent per request stage", LATENCY_BUCKETS),
+    "gus_chunks_retrieved": ("histogram", "RAG chunks used per answer", CHUNK_BUCKETS),
+    "gus_requests_total": ("counter", "Chat requests by endpoint and status", None),
+    "gus_aborted_requests_total": ("counter", "Chat requests cut short, by reason (deadline timeout, client disconnect)", None),
+    "gus_ragie_requests_total": ("counter", "Ragie searches by query leg and outcome", None),
+    "gus_fanout_chunks_total": ("counter", "Chunks kept after rank fusion that each retrieval leg found (used) or found alone (unique)", None),
+    "gus_dedup_chunks_total": ("counter", "Retrieved chunks dropped as near-duplicates or merged into an adjacent window", None),
+    "gus_ragie_hedges_total": ("counter", "Hedged duplicate Ragie requests, by whether the duplicate answered first", None),
+    "gus_ragie_breaker_transitions_total": ("counter", "Ragie circuit breaker state changes", None),
+    "gus_intent_total": ("counter", "Queries by intent; only religious ones are retrieved for", None),
+    "gus_local_fallbacks_total": ("counter", "Retrievals answered from the local index because Ragie was slow or empty", None),
+    "gus_responses_total": ("counter", "Generated answers, by whether they were redirects", None),
+    "gus_tokens_total": ("counter", "DeepSeek tokens in (prompt) and out (completion)", None),
+    "gus_critic_total": ("counter", "Critic outcomes (skipped by the local scorer, valid, rewritten, timeout)", None),
+    "gus_summaries_total": ("counter", "Background conversation summaries, stored or failed", None),
+}
+
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_lock = threading.Lock()
+_next_flush = 0.0
+
+# Stage timings of the request being served (ms), for Server-Timing
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _reset():
+    """Forked workers start with empty metrics and their own snapshot file."""
+    global _counters, _histograms, _lock, _next_flush
+    _counters = {}
+    _histograms = {}
+    _lock = threading.Lock()
+    _next_flush = 0.0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def observe(name: str, value: float, **labels):
+    """Record one histogram observation."""
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+    _maybe_flush()
+
+
+def record_stage(stage: str, seconds: float):
+    """Record a stage duration (histogram and the current request's Server-Timing)."""
+    observe("gus_stage_duration_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def timed(stage: str):
+    """Time the enclosed block as one stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+# ==================
+# PER-REQUEST TIMING
+# ==================
+
+def start_request() -> dict:
+    """Begin collecting stage timings for the request on this thread/task."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def request_timings() -> dict:
+    """Stage durations (ms) recorded so far for the current request."""
+    return {stage: round(ms, 1) for stage, ms in (_request_timings.get() or {}).items()}
+
+
+def server_timing_header() -> str:
+    """Server-Timing header value for the current request."""
+    return ", ".join(f"{stage};dur={ms}" for stage, ms in request_timings().items())
+
+
+# ==================
+# EXPORT
+# ==================
+
+def _snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, labels, list(counts)] for (name, labels), counts in _histograms.items()]
+        }
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"worker_{pid}.json")
+
+
+def flush():
+    """Write this worker's snapshot for the other workers' /metrics."""
+    if not METRICS_DIR:
+        return
+    tmp = None
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        pid = os.getpid()
+        # A temp file per write: concurrent flushes never share one
+        with tempfile.NamedTemporaryFile("w", dir=METRICS_DIR, prefix=f".worker_{pid}.",
+                                         suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            json.dump(_snapshot(), f)
+        os.replace(tmp, _snapshot_path(pid))
+    except OSError as e:
+        print(f"Metrics flush error: {e}")
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def _maybe_flush():
+    global _next_flush
+    now = time.monotonic()
+    with _lock:
+        if now < _next_flush:
+            return
+        _next_flush = now + METRICS_FLUSH_INTERVAL
+    flush()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect() -> list[dict]:
+    """Snapshots of every live worker (this one read from memory)."""
+    snapshots = [_snapshot()]
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return snapshots
+    own = os.getpid()
+    for name in os.listdir(METRICS_DIR):
+        if not (name.startswith("worker_") and name.endswith(".json")):
+            continue
+        pid = int(name[len("worker_"):-len(".json")])
+        path = os.path.join(METRICS_DIR, name)
+        if pid == own:
+            continue
+        if not _pid_alive(pid):
+            # Worker exited (restart/deploy); its counts go with it
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _format_labels(labels, extra: tuple = ()) -> str:
+    pairs = [*(tuple(pair) for pair in labels), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """All workers' metrics in Prometheus text exposition format."""
+    counters = {}
+    histograms = {}
+    for snapshot in _collect():
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts in snapshot["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(counts))
+            for i, count in enumerate(counts):
+                merged[i] += count
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+        for (metric, labels), counts in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+            total = cumulative + counts[len(buckets)]
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {total}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(counts[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {total}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+"""
+Postgres Pool - Shared connection pool for the optional Postgres tiers
+(retrieval cache, sessions, critic results).
+
+Each store gets a lazily created psycopg2 pool and runs its CREATE TABLE
+once. A connection that fails is closed instead of returned. Connection
+errors (the database is down or unreachable) make the store back off for
+DATABASE_RETRY_AFTER seconds, so a down database costs one timeout, not
+one per request. Every statement runs under DATABASE_STATEMENT_TIMEOUT_MS
+so a slow database can't stall a request.
+
+DATABASE_POOL_SIZE connections serve each worker; when every one is in
+use (more threads than connections, e.g. ASGI handlers in
+asyncio.to_thread) a caller waits for one to come back, up to the
+statement timeout, instead of failing.
+"""
+
+import os
+import time
+import threading
+import weakref
+
+DATABASE_STATEMENT_TIMEOUT_MS = int(os.environ.get("DATABASE_STATEMENT_TIMEOUT_MS", "2000"))
+DATABASE_RETRY_AFTER = float(os.environ.get("DATABASE_RETRY_AFTER", "60"))  # seconds
+# Default thread pool of asyncio.to_thread is min(32, cpus + 4)
+DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+
+_pools = weakref.WeakSet()
+
+
+class PgPool:
+    """Lazily created Postgres pool with close-on-error and backoff."""
+
+    def __init__(self, dsn: str, setup_sql: str = ""):
+        """
+        Args:
+            dsn: Postgres connection string (None/empty disables the pool)
+            setup_sql: Run once before first use (e.g. CREATE TABLE IF NOT EXISTS)
+        """
+        self.dsn = dsn
+        self.setup_sql = setup_sql
+        self.pool = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(DATABASE_POOL_SIZE)
+        self.ready = False
+        self.retry_at = 0.0
+        _pools.add(self)
+
+    def reset(self):
+        """Forked workers must open their own connections."""
+        self.pool = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(DATABASE_POOL_SIZE)
+
+    def available(self) -> bool:
+        return bool(self.dsn) and time.monotonic() >= self.retry_at
+
+    def _get_pool(self):
+        if self.pool is None:
+            with self.lock:
+                if self.pool is None:
+                    from psycopg2.pool import ThreadedConnectionPool
+                    self.pool = ThreadedConnectionPool(
+                        1, DATABASE_POOL_SIZE, self.dsn, connect_timeout=2,
+                        options=f"-c statement_timeout={DATABASE_STATEMENT_TIMEOUT_MS}"
+                    )
+        return self.pool
+
+    def _run(self, pool, sql: str, params: tuple, fetch: bool):
+        # One slot per pooled connection: wait for a free one rather than exhausting the pool
+        if not self.slots.acquire(timeout=DATABASE_STATEMENT_TIMEOUT_MS / 1000):
+            from psycopg2.pool import PoolError
+            raise PoolError("no free connection within the statement timeout")
+        try:
+            conn = pool.getconn()
+            try:
+                with conn, conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    row = cur.fetchone() if fetch else None
+            except Exception:
+                # Don't hand a broken connection to the next request
+                pool.putconn(conn, close=True)
+                raise
+            pool.putconn(conn)
+            return row
+        finally:
+            self.slots.release()
+
+    def execute(self, sql: str, params: tuple = (), fetch: bool = False):
+        """
+        Run one statement in its own transaction.
+
+        Returns:
+            The first row if fetch, else None; also None while backing off
+            or without a DSN. Errors are raised; connection errors start
+            the backoff first.
+        """
+        if not self.available():
+            return None
+        try:
+            pool = self._get_pool()
+            if not self.ready:
+                if self.setup_sql:
+                    self._run(pool, self.setup_sql, (), False)
+                self.ready = True
+            return self._run(pool, sql, params, fetch)
+        except Exception as e:
+            if _is_connection_error(e):
+                self.retry_at = time.monotonic() + DATABASE_RETRY_AFTER
+            raise
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Database down/unreachable (or psycopg2 missing): worth backing off. A busy pool is not."""
+    if isinstance(error, ImportError):
+        return True
+    import psycopg2
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+def _reset_pools():
+    for pool in list(_pools):
+        pool.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools)
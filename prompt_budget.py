@@ -0,0 +1,198 @@
+"""
+Prompt Budget - Token-budgeted prompt assembly.
+Counts tokens locally and fits history and RAG context into a fixed input
+budget, so prefill latency and cost stay bounded for long conversations.
+
+Priority (highest first):
+    1. System prompt, few-shots, current question and instruction (always sent)
+    2. RAG context, best chunks first, up to CONTEXT_TOKEN_BUDGET
+    3. Conversation history, newest first; over-long messages are cut and
+       the oldest turns dropped until it fits
+
+Token counting uses the DeepSeek tokenizer when the `tokenizers` package
+and DEEPSEEK_TOKENIZER_PATH (tokenizer.json) are available, and a fast
+word-piece estimate otherwise.
+"""
+
+import os
+import re
+import math
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "4000"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1200"))
+CHUNK_TOKEN_CAP = int(os.environ.get("CHUNK_TOKEN_CAP", "220"))
+HISTORY_MESSAGE_TOKEN_CAP = int(os.environ.get("HISTORY_MESSAGE_TOKEN_CAP", "300"))
+HISTORY_MAX_MESSAGES = 12  # last 6 exchanges
+
+DEEPSEEK_TOKENIZER_PATH = os.environ.get("DEEPSEEK_TOKENIZER_PATH", "")
+
+MESSAGE_OVERHEAD = 4  # role/separator tokens per chat message
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _load_tokenizer():
+    if not DEEPSEEK_TOKENIZER_PATH or not os.path.exists(DEEPSEEK_TOKENIZER_PATH):
+        return None
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        print("Warning: tokenizers not installed, using estimated token counts")
+        return None
+    return Tokenizer.from_file(DEEPSEEK_TOKENIZER_PATH)
+
+
+_tokenizer = _load_tokenizer()
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (exact with the DeepSeek tokenizer, else estimated)."""
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    # ~4 characters per BPE token for words, one token per punctuation mark
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _PIECE_RE.findall(text))
+
+
+def count_message_tokens(messages: list) -> int:
+    return sum(count_tokens(m.get("content", "")) + MESSAGE_OVERHEAD for m in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, on a word boundary."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Binary search on character length (token count is monotonic in prefix length)
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text.rfind(" ", 0, low)
+    return text[:cut if cut > 0 else low].rstrip() + "..."
+
+
+def context_label(chunk: dict) -> str:
+    """Prompt label for a chunk based on its source type."""
+    source = chunk.get("source", {})
+    source_type = source.get("type", "unknown")
+
+    if source_type == "book":
+        book_name = source.get("book", "Buku")
+        return f"BUKU: {book_name}"
+    elif source_type == "summary":
+        return "AJARAN INTI"
+    elif source_type == "video":
+        return "NGAJI GUS BAHA"
+    return "SUMBER"
+
+
+def format_context_for_prompt(chunks: list[dict], max_chars: int = 3000) -> str:
+    """Format retrieved chunks into a context string for the LLM."""
+    if not chunks:
+        return ""
+
+    context_parts = []
+    total_chars = 0
+
+    for i, chunk in enumerate(chunks, 1):
+        text = chunk.get("text", "").strip()
+
+        # Truncate if too long (merged windows get room for each window)
+        max_len = 800 * chunk.get("windows", 1)
+        if len(text) > max_len:
+            text = text[:max_len] + "..."
+
+        block = f"[{context_label(chunk)} {i}]\n{text}"
+
+        if total_chars + len(block) > max_chars:
+            break
+
+        context_parts.append(block)
+        total_chars += len(block)
+
+    return "\n\n".join(context_parts)
+
+
+def fit_context(chunks: list, max_tokens: int) -> tuple[str, int, int]:
+    """
+    Format chunks (best first) into a context string within max_tokens.
+
+    Returns:
+        Tuple of (context_str, tokens_used, chunks_used)
+    """
+    blocks = []
+    used = 0
+    for chunk in chunks:
+        # Merged adjacent windows (dedup.py) get a cap per window
+        text = truncate_to_tokens(chunk.get("text", "").strip(), CHUNK_TOKEN_CAP * chunk.get("windows", 1))
+        block = f"[{context_label(chunk)} {len(blocks) + 1}]\n{text}"
+        tokens = count_tokens(block) + 1
+        if used + tokens > max_tokens:
+            break
+        blocks.append(block)
+        used += tokens
+    return "\n\n".join(blocks), used, len(blocks)
+
+
+def fit_history(history: list, max_tokens: int) -> tuple[list, int, int]:
+    """
+    Keep the newest history that fits in max_tokens.
+    Over-long messages are cut first, then the oldest turns are dropped.
+
+    Returns:
+        Tuple of (messages, tokens_used, messages_dropped)
+    """
+    recent = history[-HISTORY_MAX_MESSAGES:]
+    dropped = len(history) - len(recent)
+
+    messages = [{
+        "role": msg.get("role", "user"),
+        "content": truncate_to_tokens(msg.get("content", ""), HISTORY_MESSAGE_TOKEN_CAP)
+    } for msg in recent]
+
+    costs = [count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages]
+    total = sum(costs)
+    start = 0
+    while total > max_tokens and start < len(messages):
+        total -= costs[start]
+        start += 1
+    # Don't start the kept history on an assistant reply
+    while start < len(messages) and messages[start]["role"] == "assistant":
+        total -= costs[start]
+        start += 1
+
+    return messages[start:], total, dropped + start
+
+
+class PromptBudget:
+    """Token breakdown for one assembled prompt."""
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self.parts = {}
+        self.chunks_used = 0
+        self.history_dropped = 0
+
+    def add(self, part: str, tokens: int):
+        self.parts[part] = self.parts.get(part, 0) + tokens
+
+    @property
+    def total(self) -> int:
+        return sum(self.parts.values())
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.budget - self.total)
+
+    def report(self) -> dict:
+        return {
+            **self.parts,
+            "total": self.total,
+            "budget": self.budget,
+            "chunks_used": self.chunks_used,
+            "history_dropped": self.history_dropped
+        }
@@ -0,0 +1,90 @@
+"""
+Query Variants - The search queries one retrieval fans out to.
+Each variant is a "leg" searched in parallel and fused by rank
+(ragie_client.fuse_chunks):
+
+    original  - the user's message as typed
+    english   - English keywords from the Indonesian/Javanese lexicon
+    history   - a follow-up ("terus gimana kalau sudah terlanjur?") joined
+                with the previous user turns, so it carries the topic
+    javanese  - Indonesian terms swapped for Javanese ones, closer to how
+                the lectures are transcribed (off by default)
+
+RETRIEVAL_LEGS picks the legs; duplicates of an earlier leg are dropped.
+"""
+
+import os
+
+from lexicon import LEXICON_PATH, Lexicon, get_lexicon, tokenize
+
+RETRIEVAL_LEGS = [leg.strip() for leg in os.environ.get("RETRIEVAL_LEGS", "original,english,history").split(",")
+                  if leg.strip()]
+
+JAVANESE_LEXICON_PATH = os.environ.get(
+    "JAVANESE_LEXICON_PATH",
+    os.path.join(os.path.dirname(LEXICON_PATH), "lexicon_id_jv.json")
+)
+
+# A message this short, or one that points back ("itu", "tadi"), is read as a follow-up
+FOLLOWUP_MAX_WORDS = 8
+FOLLOWUP_MARKERS = {
+    "itu", "tadi", "tersebut", "gitu", "begitu", "terus", "lalu", "trus", "barusan", "dia", "mereka",
+    "sebelumnya", "iku", "ngono",
+    "it", "that", "this", "those", "then", "also", "again", "earlier",
+}
+HISTORY_TURNS = 2  # previous user messages folded into the history leg
+HISTORY_MAX_WORDS = 40
+
+_javanese = None
+
+
+def get_javanese_lexicon() -> Lexicon:
+    global _javanese
+    if _javanese is None:
+        _javanese = Lexicon.load(JAVANESE_LEXICON_PATH)
+    return _javanese
+
+
+def is_followup(query: str) -> bool:
+    """Whether the message probably leans on earlier turns for its topic."""
+    words = tokenize(query)
+    return len(words) <= FOLLOWUP_MAX_WORDS or any(word in FOLLOWUP_MARKERS for word in words)
+
+
+def history_query(query: str, history: list) -> str | None:
+    """The previous user turns plus this message, newest words kept; None if not a follow-up."""
+    previous = [m["content"] for m in history or [] if m.get("role") == "user" and m.get("content")]
+    if not previous or not is_followup(query):
+        return None
+    words = tokenize(" ".join([*previous[-HISTORY_TURNS:], query]))
+    return " ".join(words[-HISTORY_MAX_WORDS:])
+
+
+def build_variants(query: str, history: list = None, legs: list = None) -> list[tuple[str, str]]:
+    """
+    Build the search queries for one retrieval.
+
+    Args:
+        query: Current user message
+        history: Previous messages [{"role", "content"}] (for the history leg)
+        legs: Leg names to try, in order (default RETRIEVAL_LEGS)
+
+    Returns:
+        List of (leg, search query); always starts with the original
+    """
+    builders = {
+        "english": lambda: get_lexicon().expand(query),
+        "history": lambda: history_query(query, history),
+        "javanese": lambda: get_javanese_lexicon().substitute(query),
+    }
+    variants = [("original", query)]
+    seen = {" ".join(tokenize(query))}
+    for leg in legs or RETRIEVAL_LEGS:
+        if leg not in builders:
+            continue
+        search_query = builders[leg]()
+        key = " ".join(tokenize(search_query or ""))
+        if key and key not in seen:
+            seen.add(key)
+            variants.append((leg, search_query))
+    return variants
@@ -5,304 +5,651 @@ Supports: YouTube videos, books, Hawa's Blog PDFs
 """
 
 import os
-import re
+import time
+import asyncio
+import threading
+import contextvars
+import httpx
 import requests
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+import dedup
+import local_index
+import metrics
+import retrieval_cache
+import vector_store
+from lexicon import get_lexicon
+from prompt_budget import context_label, format_context_for_prompt  # noqa: F401 (moved; importable from here)
+from query_variants import build_variants
+from resilience import Deadline, LatencyTracker, CircuitBreaker
+from source_index import get_source_metadata
 
 RAGIE_API_KEY = os.environ.get("RAGIE_API_KEY")
-RAGIE_BASE_URL = "https://api.ragie.ai"
-
-# Source metadata for citations
-SOURCES = {
-    # ==================
-    # YOUTUBE VIDEOS
-    # ==================
-    "gus_baha_full_transcript.txt": {
-        "title": "Ngaji Penuh Humor Ilmiah Gus Baha' bersama Prof Quraish Shihab",
-        "url": "https://www.youtube.com/watch?v=RHnuHSFOeNw",
-        "channel": "NU Online",
-        "date": "1 Oktober 2025",
-        "type": "video"
-    },
-    "gusbaha_10_refined.md": {
-        "title": "10 Ajaran Inti Gus Baha (Distilasi)",
-        "url": "https://www.youtube.com/watch?v=RHnuHSFOeNw",
-        "channel": "NU Online",
-        "date": "1 Oktober 2025",
-        "type": "summary"
-    },
-    
-    # ==================
-    # BOOKS - Islam Santuy
-    # ==================
-    "IslamSantuy_HTI_GusBaha.txt": {
-        "title": "Islam Santuy Ala Gus Baha - Pandangan tentang HTI",
-        "url": None,
-        "author": "Muhammad Khoirul Huda",
-        "book": "Islam Santuy Ala Gus Baha",
-        "pages": "151-154",
-        "date": None,
-        "type": "book"
-    },
-    "IslamSantuy_DikotomiIlmu_GusBaha.txt": {
-        "title": "Islam Santuy Ala Gus Baha - Dikotomi Ilmu Pengetahuan",
-        "url": None,
-        "author": "Habib Maulana Maslahul Adi",
-        "book": "Islam Santuy Ala Gus Baha",
-        "pages": "99-103",
-        "date": None,
-        "type": "book"
-    },
-}
-
-# Partial match patterns for flexible source detection
-SOURCE_PATTERNS = {
-    "IslamSantuy": {
-        "title": "Islam Santuy Ala Gus Baha",
-        "url": None,
-        "book": "Islam Santuy Ala Gus Baha",
-        "type": "book"
-    },
-    "HTI": {
-        "title": "Pandangan Gus Baha tentang HTI",
-        "url": None,
-        "book": "Islam Santuy Ala Gus Baha",
-        "type": "book"
-    },
-    "Dikotomi": {
-        "title": "Dikotomi Ilmu Pengetahuan",
-        "url": None,
-        "book": "Islam Santuy Ala Gus Baha",
-        "type": "book"
-    },
-    "transcript": {
-        "title": "Ngaji Gus Baha bersama Prof Quraish Shihab",
-        "url": "https://www.youtube.com/watch?v=RHnuHSFOeNw",
-        "channel": "NU Online",
-        "type": "video"
-    },
-    "refined": {
-        "title": "10 Ajaran Inti Gus Baha",
-        "url": "https://www.youtube.com/watch?v=RHnuHSFOeNw",
-        "channel": "NU Online",
-        "type": "summary"
-    },
-    # Hawa's Blog pattern
-    "Hawa's Blog": {
-        "title": "Hawa's Blog",
-        "url": None,
-        "book": "Syajaratul Ma'arif",
-        "author": "Syaikh al-'Izz bin Abdus Salam",
-        "type": "book"
-    },
-}
-
-
-def get_source_metadata(document_name: str) -> dict:
-    """Get source metadata for a document."""
-    if not document_name:
-        return _default_source()
-    
-    # Try exact match first
-    if document_name in SOURCES:
-        return SOURCES[document_name]
-    
-    # Try partial match on full path/name
-    for key, value in SOURCES.items():
-        if key in document_name or document_name in key:
-            return value
-    
-    # Special handling for Hawa's Blog PDFs
-    doc_lower = document_name.lower()
-    if "hawa" in doc_lower or "hawa's blog" in doc_lower:
-        # Extract article title from filename
-        # e.g., "don't be harsh _ Hawa's Blog.PDF" -> "Don't Be Harsh"
-        title = document_name
-        # Remove common suffixes
-        title = re.sub(r"[_\s]*Hawa'?s?\s*Blog\.PDF", "", title, flags=re.IGNORECASE)
-        title = re.sub(r"\.pdf$", "", title, flags=re.IGNORECASE)
-        title = title.replace("_", " ").strip()
-        # Capitalize nicely
-        title = title.title()
-        
-        return {
-            "title": title,
-            "url": None,
-            "book": "Syajaratul Ma'arif",
-            "author": "Syaikh al-'Izz bin Abdus Salam",
-            "type": "book"
-        }
-    
-    # Try pattern matching
-    for pattern, meta in SOURCE_PATTERNS.items():
-        if pattern.lower() in doc_lower:
-            return meta
-    
-    # Default fallback
-    return _default_source()
+RAGIE_BASE_URL = os.environ.get("RAGIE_BASE_URL", "https://api.ragie.ai")
+RAGIE_PARTITION = "gus-baha"
+
+# Retrieval source: ragie | local | fallback | parallel (see retrieve_context)
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "ragie")
+LOCAL_FALLBACK_DEADLINE = float(os.environ.get("LOCAL_FALLBACK_DEADLINE", "2.0"))  # seconds
+# What "local" means: bm25 (local_index.py) | vectors (vector_store.py) | hybrid (both, fused)
+LOCAL_RETRIEVER = os.environ.get("LOCAL_RETRIEVER", "bm25")
+
+# Retrieval transport settings
+RAGIE_POOL_SIZE = int(os.environ.get("RAGIE_POOL_SIZE", "16"))
+RAGIE_MAX_WORKERS = int(os.environ.get("RAGIE_MAX_WORKERS", "16"))
+RAGIE_MAX_RETRIES = int(os.environ.get("RAGIE_MAX_RETRIES", "2"))
+
+# Resilience: each request's Ragie searches share one time budget; a slow
+# search gets a hedged duplicate after the recent p95 latency, and a
+# circuit breaker skips Ragie while its error rate is high
+RETRIEVAL_BUDGET = float(os.environ.get("RETRIEVAL_BUDGET", "3.0"))  # seconds
+HEDGE_ENABLED = os.environ.get("RAGIE_HEDGE_ENABLED", "1") == "1"
+HEDGE_MIN_DELAY = float(os.environ.get("RAGIE_HEDGE_MIN_DELAY", "0.2"))  # seconds
+BREAKER_ERROR_RATE = float(os.environ.get("RAGIE_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_REQUESTS = int(os.environ.get("RAGIE_BREAKER_MIN_REQUESTS", "10"))
+BREAKER_COOLDOWN = float(os.environ.get("RAGIE_BREAKER_COOLDOWN", "30"))  # seconds
+
+# Fan-out: every query variant (query_variants.py) is a search leg; legs
+# other than the original are dropped once they miss FANOUT_LEG_BUDGET so
+# they never hold up an answer, and results are fused by rank (RRF)
+FANOUT_LEG_BUDGET = float(os.environ.get("FANOUT_LEG_BUDGET", "1.5"))  # seconds
+RRF_K = int(os.environ.get("RRF_K", "60"))
+
+ragie_latency = LatencyTracker(default=1.0)
+ragie_breaker = CircuitBreaker(
+    "ragie",
+    min_requests=BREAKER_MIN_REQUESTS,
+    error_rate=BREAKER_ERROR_RATE,
+    cooldown=BREAKER_COOLDOWN,
+    on_change=lambda state: metrics.inc("gus_ragie_breaker_transitions_total", state=state)
+)
+_hedge_stats = {"hedged": 0, "hedge_wins": 0, "hedge_losses": 0}
+_hedge_lock = threading.Lock()
+_leg_stats = {}  # leg -> searches, latency, chunks in the fused result
+_leg_lock = threading.Lock()
+
+# Process-wide keep-alive session and search pool (rebuilt lazily after fork)
+_session = None
+_executor = None
+_async_client = None
+_transport_lock = threading.Lock()
+
+
+def _reset_transport():
+    """Drop inherited session/pool so a forked worker builds its own."""
+    global _session, _executor, _async_client, _transport_lock
+    _session = None
+    _executor = None
+    _async_client = None
+    _transport_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_transport)
 
 
-def _default_source() -> dict:
-    """Default source when no match found."""
+def get_session() -> requests.Session:
+    """
+    Shared Ragie session with a sized keep-alive connection pool and
+    retry/backoff on transient errors.
+    """
+    global _session
+    if _session is None:
+        with _transport_lock:
+            if _session is None:
+                # Only quick 429/5xx answers are retried: a timed-out attempt would
+                # start over with the full timeout and hold its executor thread
+                # past the deadline (hedging already duplicates slow searches)
+                retry = Retry(
+                    total=RAGIE_MAX_RETRIES,
+                    connect=0,
+                    read=False,
+                    backoff_factor=0.2,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["POST"],
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=RAGIE_POOL_SIZE,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Long-lived bounded pool for parallel Ragie searches."""
+    global _executor
+    if _executor is None:
+        with _transport_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=RAGIE_MAX_WORKERS,
+                    thread_name_prefix="ragie"
+                )
+    return _executor
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared async Ragie client (one per worker process / event loop)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=RAGIE_POOL_SIZE * 10,
+                max_keepalive_connections=RAGIE_POOL_SIZE
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=RAGIE_MAX_RETRIES)
+        )
+    return _async_client
+
+
+def _leg_entry(leg: str) -> dict:
+    return _leg_stats.setdefault(leg, {"searches": 0, "latency_s": 0.0, "chunks_used": 0, "unique_chunks": 0})
+
+
+def _record_search(leg: str, outcome: str, start: float):
+    """Per-leg latency and outcome (ok, cache_hit, hedge_won, timeout, error, deadline, breaker_open)."""
+    elapsed = time.monotonic() - start
+    metrics.record_stage(f"ragie_{leg}", elapsed)
+    metrics.inc("gus_ragie_requests_total", leg=leg, outcome=outcome)
+    with _leg_lock:
+        entry = _leg_entry(leg)
+        entry["searches"] += 1
+        entry["latency_s"] += elapsed
+
+
+def hedge_delay() -> float:
+    """How long to wait on a Ragie request before firing a duplicate (recent p95)."""
+    return min(max(ragie_latency.percentile(95), HEDGE_MIN_DELAY), RETRIEVAL_BUDGET / 2)
+
+
+def _count_hedge(won: bool):
+    with _hedge_lock:
+        _hedge_stats["hedge_wins" if won else "hedge_losses"] += 1
+    metrics.inc("gus_ragie_hedges_total", result="won" if won else "lost")
+
+
+def _ragie_headers() -> dict:
     return {
-        "title": "Pengajian Gus Baha",
-        "url": None,
-        "type": "unknown"
+        "Authorization": f"Bearer {RAGIE_API_KEY}",
+        "Content-Type": "application/json"
     }
 
 
-def retrieve_context(query: str, top_k: int = 6) -> list[dict]:
+def _ragie_attempt(search_query: str, num_results: int, partition: str, timeout: float) -> list[dict]:
+    """One POST /retrievals (raises on failure); feeds the breaker and latency tracker."""
+    start = time.monotonic()
+    try:
+        response = get_session().post(
+            f"{RAGIE_BASE_URL}/retrievals",
+            headers=_ragie_headers(),
+            json={"query": search_query, "top_k": num_results, "partition": partition},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        chunks = response.json().get("scored_chunks", [])
+    except requests.exceptions.RequestException:
+        ragie_breaker.record(False)
+        raise
+    ragie_breaker.record(True)
+    ragie_latency.record(time.monotonic() - start)
+    return chunks
+
+
+def _is_timeout(error: Exception) -> bool:
+    """requests reports some read timeouts as ConnectionError(MaxRetryError(ReadTimeoutError))."""
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error is not None and error.args else None
+    return isinstance(reason, (ReadTimeoutError, ConnectTimeoutError))
+
+
+class RagieSearch:
+    """
+    One Ragie search leg in flight. Starts the request immediately; result()
+    fires a hedged duplicate if the first hasn't answered within
+    hedge_delay() and returns whichever succeeds first, or [] once the
+    deadline passes.
+    """
+
+    def __init__(self, search_query: str, num_results: int, partition: str = RAGIE_PARTITION,
+                 leg: str = "original", deadline: Deadline = None):
+        self.query = search_query
+        self.num_results = num_results
+        self.partition = partition
+        self.leg = leg
+        self.deadline = deadline or Deadline(RETRIEVAL_BUDGET)
+        self.start = time.monotonic()
+        self.outcome = None
+        self.attempts = []
+        self.cached = retrieval_cache.get(search_query, num_results, partition)
+        if self.cached is None and ragie_breaker.allow():
+            self._submit()
+
+    def _submit(self):
+        # Run in a copy of this request's context so timings reach Server-Timing
+        self.attempts.append(get_executor().submit(
+            contextvars.copy_context().run, _ragie_attempt,
+            self.query, self.num_results, self.partition, max(self.deadline.remaining(), 0.05)
+        ))
+
+    def _finish(self, outcome: str, chunks: list[dict]) -> list[dict]:
+        self.outcome = outcome
+        _record_search(self.leg, outcome, self.start)
+        return chunks
+
+    def result(self) -> list[dict]:
+        if self.cached is not None:
+            return self._finish("cache_hit", self.cached)
+        if not self.attempts:
+            return self._finish("breaker_open", [])
+
+        hedge_at = self.start + hedge_delay()
+        pending = set(self.attempts)
+        error = None
+        while pending:
+            can_hedge = HEDGE_ENABLED and len(self.attempts) == 1
+            wait_until = min(hedge_at, self.deadline.expires) if can_hedge else self.deadline.expires
+            done, pending = wait(pending, timeout=max(0.0, wait_until - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    chunks = future.result()
+                    retrieval_cache.put(self.query, self.num_results, self.partition, chunks)
+                    hedged = len(self.attempts) > 1
+                    if hedged:
+                        _count_hedge(won=future is not self.attempts[0])
+                    return self._finish("hedge_won" if hedged and future is not self.attempts[0] else "ok", chunks)
+                error = future.exception()
+            if self.deadline.expired:
+                if len(self.attempts) > 1:
+                    _count_hedge(won=False)
+                print(f"Ragie search ({self.leg}) missed its {RETRIEVAL_BUDGET:.1f}s budget")
+                return self._finish("deadline", [])
+            # Slow or failed first attempt: duplicate it while there's budget left
+            if can_hedge and (done or time.monotonic() >= hedge_at) and ragie_breaker.allow():
+                with _hedge_lock:
+                    _hedge_stats["hedged"] += 1
+                self._submit()
+                pending.add(self.attempts[-1])
+
+        print(f"Ragie retrieval error: {error}")
+        if len(self.attempts) > 1:
+            _count_hedge(won=False)
+        return self._finish("timeout" if _is_timeout(error) else "error", [])
+
+
+def search_ragie(search_query: str, num_results: int, partition: str = RAGIE_PARTITION,
+                 leg: str = "original", deadline: Deadline = None) -> list[dict]:
+    """Search Ragie (through the retrieval cache) and return scored chunks."""
+    return RagieSearch(search_query, num_results, partition, leg, deadline).result()
+
+
+def build_english_query(query: str) -> str | None:
+    """Build an English search query from Indonesian/Javanese terms in the query."""
+    return get_lexicon().expand(query)
+
+
+def _chunk_key(chunk: dict) -> str:
+    return chunk.get("text", "")[:200]  # First 200 chars as key
+
+
+def _with_source(chunk: dict) -> dict:
+    doc_name = chunk.get("document_name", "unknown")
+    result = {
+        "text": chunk.get("text", ""),
+        "score": chunk.get("score", 0),
+        "document_name": doc_name,
+        "source": get_source_metadata(doc_name)
+    }
+    if chunk.get("id"):
+        result["id"] = chunk["id"]  # Ragie / local chunk id (rerank.py caches vectors by it)
+    if "windows" in chunk:
+        result["windows"] = chunk["windows"]  # merged adjacent windows (dedup.py)
+    return result
+
+
+def merge_chunks(all_chunks: list[dict], top_k: int) -> list[dict]:
+    """Deduplicate scored chunks, keep top_k and attach source metadata."""
+    # Deduplicate by text content (keep higher score)
+    seen_texts = {}
+    for chunk in all_chunks:
+        text = _chunk_key(chunk)
+        score = chunk.get("score", 0)
+        if text not in seen_texts or score > seen_texts[text].get("score", 0):
+            seen_texts[text] = chunk
+    
+    # Sort by score, drop near-duplicates and take top_k
+    unique_chunks = sorted(seen_texts.values(), key=lambda x: x.get("score", 0), reverse=True)
+    return [_with_source(chunk) for chunk in _drop_near_duplicates(unique_chunks)[:top_k]]
+
+
+def _drop_near_duplicates(chunks: list[dict]) -> list[dict]:
+    """Near-duplicate clustering and window merging (dedup.py), best first in and out."""
+    if not dedup.DEDUP_ENABLED:
+        return chunks
+    with metrics.timed("dedup"):
+        kept, counts = dedup.dedup_chunks(chunks)
+    for action, count in counts.items():
+        if count:
+            metrics.inc("gus_dedup_chunks_total", count, action=action)
+    return kept
+
+
+def fuse_chunks(leg_results: list[tuple[str, list[dict]]], top_k: int) -> list[dict]:
     """
-    Retrieve relevant chunks from Ragie with bilingual support.
-    Searches in both original language and English keywords simultaneously.
+    Reciprocal rank fusion of several searches' results.
+    Scores from different queries (or Ragie vs. the local index) aren't
+    comparable, ranks are: a chunk scores sum(1 / (RRF_K + rank)) over the
+    legs that found it, so agreement between legs lifts it.
+
+    Args:
+        leg_results: (leg name, scored chunks) per search, original first
+        top_k: Chunks to keep
+
+    Returns:
+        Chunks with source metadata, "rrf_score" and the "legs" that found them
     """
+    fused = {}  # chunk key -> {"rrf", "chunk", "legs"}
+    for leg, chunks in leg_results:
+        ranked = sorted(chunks, key=lambda x: x.get("score", 0), reverse=True)
+        rank = 0
+        for chunk in ranked:
+            key = _chunk_key(chunk)
+            entry = fused.setdefault(key, {"rrf": 0.0, "chunk": chunk, "legs": []})
+            if leg in entry["legs"]:
+                continue
+            rank += 1
+            entry["rrf"] += 1.0 / (RRF_K + rank)
+            entry["legs"].append(leg)
+            if chunk.get("score", 0) > entry["chunk"].get("score", 0):
+                entry["chunk"] = chunk
+    
+    # Stable sort: ties keep the earlier (original) leg's order
+    ranked = sorted(fused.values(), key=lambda entry: entry["rrf"], reverse=True)
+    candidates = [
+        {**entry["chunk"], "rrf_score": round(entry["rrf"], 5), "legs": entry["legs"]}
+        for entry in ranked
+    ]
+    top = _drop_near_duplicates(candidates)[:top_k]
+    _record_contributions([leg for leg, _ in leg_results], top)
+    return [
+        {**_with_source(chunk), "rrf_score": chunk["rrf_score"], "legs": chunk["legs"]}
+        for chunk in top
+    ]
+
+
+def _record_contributions(legs: list[str], top: list[dict]):
+    """How many of the kept chunks each leg found, and found alone."""
+    with _leg_lock:
+        for leg in legs:
+            used = sum(1 for chunk in top if leg in chunk["legs"])
+            unique = sum(1 for chunk in top if chunk["legs"] == [leg])
+            entry = _leg_entry(leg)
+            entry["chunks_used"] += used
+            entry["unique_chunks"] += unique
+            metrics.inc("gus_fanout_chunks_total", used, leg=leg, kind="used")
+            metrics.inc("gus_fanout_chunks_total", unique, leg=leg, kind="unique")
+
+
+def _leg_deadline(leg: str, budget: Deadline) -> Deadline:
+    """The original leg may use the whole budget; the extra legs only FANOUT_LEG_BUDGET of it."""
+    return budget if leg == "original" else budget.child(FANOUT_LEG_BUDGET)
+
+
+def _start_ragie_searches(query: str, top_k: int, deadline: Deadline, history: list = None) -> list[RagieSearch]:
+    """Start one Ragie search per query variant on the shared pool."""
+    return [
+        RagieSearch(search_query, top_k, leg=leg, deadline=_leg_deadline(leg, deadline))
+        for leg, search_query in build_variants(query, history)
+    ]
+
+
+def _local_legs(query: str, top_k: int) -> list[tuple[str, list[dict]]]:
+    """Local search results per retriever selected by LOCAL_RETRIEVER."""
+    legs = []
+    if LOCAL_RETRIEVER in ("bm25", "hybrid"):
+        legs.append(("local", local_index.search(query, top_k)))
+    if LOCAL_RETRIEVER in ("vectors", "hybrid"):
+        legs.append(("vectors", vector_store.search(query, top_k)))
+    return legs
+
+
+def _local_available() -> bool:
+    if LOCAL_RETRIEVER == "vectors":
+        return vector_store.is_available()
+    if LOCAL_RETRIEVER == "hybrid":
+        return local_index.is_available() or vector_store.is_available()
+    return local_index.is_available()
+
+
+def _local_retrieve(query: str, top_k: int) -> list[dict]:
+    """Answer from the local retrievers only."""
+    legs = _local_legs(query, top_k)
+    if len(legs) == 1:
+        return merge_chunks(legs[0][1], top_k)
+    return fuse_chunks(legs, top_k)
+
+
+def _use_local_only() -> bool:
+    """Local backend selected, or no Ragie key but a local index exists (offline staging)."""
+    if RETRIEVAL_BACKEND == "local":
+        return True
+    return not RAGIE_API_KEY and _local_available()
+
+
+def _breaker_fallback(query: str, top_k: int) -> list[dict]:
+    """Ragie breaker is open: answer from the local index (if built) without waiting."""
+    return _local_retrieve(query, top_k)
+
+
+def retrieve_context(query: str, top_k: int = 6, deadline: Deadline = None, history: list = None) -> list[dict]:
+    """
+    Retrieve relevant chunks with bilingual support.
+    Searches every query variant (original, English keywords, history-aware
+    follow-up, ...) simultaneously and fuses the results by rank.
+    Ragie gets at most RETRIEVAL_BUDGET seconds (or what is left of `deadline`).
+    
+    RETRIEVAL_BACKEND selects the source:
+        ragie    - Ragie only (default)
+        local    - local index only
+        fallback - Ragie, but use the local index if Ragie misses LOCAL_FALLBACK_DEADLINE
+        parallel - Ragie and the local index together, merged
+    The local index is BM25, the dense vector store or both (LOCAL_RETRIEVER).
+    """
+    if _use_local_only():
+        return _local_retrieve(query, top_k)
+    
     if not RAGIE_API_KEY:
         print("Warning: RAGIE_API_KEY not set")
         return []
     
-    headers = {
-        "Authorization": f"Bearer {RAGIE_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    if ragie_breaker.is_open():
+        metrics.inc("gus_ragie_requests_total", leg="all", outcome="breaker_open")
+        return _breaker_fallback(query, top_k)
+    
+    budget = deadline.child(RETRIEVAL_BUDGET) if deadline else Deadline(RETRIEVAL_BUDGET)
+    if RETRIEVAL_BACKEND == "fallback":
+        budget = budget.child(LOCAL_FALLBACK_DEADLINE)
+    
+    # Run searches in PARALLEL (no extra delay!)
+    searches = _start_ragie_searches(query, top_k, budget, history)
+    
+    if RETRIEVAL_BACKEND == "parallel":
+        # Local lookup runs on this thread while Ragie is in flight
+        local_results = _local_legs(query, top_k)
+        leg_results = [(search.leg, search.result()) for search in searches]
+        return fuse_chunks(leg_results + local_results, top_k)
+    
+    leg_results = [(search.leg, search.result()) for search in searches]
+    found = any(chunks for _, chunks in leg_results)
+    
+    if RETRIEVAL_BACKEND == "fallback":
+        missed = searches[0].outcome in ("deadline", "breaker_open")
+        if missed or not found:
+            print("Ragie slow or empty, using local index")
+            metrics.inc("gus_local_fallbacks_total")
+            return fuse_chunks(leg_results + _local_legs(query, top_k), top_k)
+    elif not found and any(search.outcome == "breaker_open" for search in searches):
+        # Breaker is probing Ragie with another request
+        return _breaker_fallback(query, top_k)
+    
+    return fuse_chunks(leg_results, top_k)
+
+
+async def search_ragie_async(search_query: str, num_results: int, partition: str = RAGIE_PARTITION,
+                             leg: str = "original", deadline: Deadline = None) -> list[dict]:
+    """Async variant of search_ragie (for the ASGI entry point); losing attempts are cancelled."""
+    start = time.monotonic()
+    deadline = deadline or Deadline(RETRIEVAL_BUDGET)
+    cached = await asyncio.to_thread(retrieval_cache.get, search_query, num_results, partition)
+    if cached is not None:
+        _record_search(leg, "cache_hit", start)
+        return cached
+    if not ragie_breaker.allow():
+        _record_search(leg, "breaker_open", start)
+        return []
     
-    def search_ragie(search_query: str, num_results: int) -> list[dict]:
-        """Helper function to search Ragie."""
-        payload = {
-            "query": search_query,
-            "top_k": num_results,
-            "partition": "gus-baha"
-        }
+    async def attempt() -> list[dict]:
+        attempt_start = time.monotonic()
         try:
-            response = requests.post(
+            response = await get_async_client().post(
                 f"{RAGIE_BASE_URL}/retrievals",
-                headers=headers,
-                json=payload,
-                timeout=10
+                headers=_ragie_headers(),
+                json={"query": search_query, "top_k": num_results, "partition": partition},
+                timeout=max(deadline.remaining(), 0.05)
             )
             response.raise_for_status()
-            data = response.json()
-            return data.get("scored_chunks", [])
-        except requests.exceptions.RequestException as e:
-            print(f"Ragie retrieval error: {e}")
-            return []
+            chunks = response.json().get("scored_chunks", [])
+        except httpx.HTTPError:
+            ragie_breaker.record(False)
+            raise
+        except asyncio.CancelledError:
+            # A breaker probe that didn't answer within budget counts as a failure
+            if ragie_breaker.state == "half_open":
+                ragie_breaker.record(False)
+            raise
+        ragie_breaker.record(True)
+        ragie_latency.record(time.monotonic() - attempt_start)
+        return chunks
     
-    # Create English keywords from common Indonesian religious terms
-    indo_to_eng = {
-        'ikhlas': 'sincerity', 'dosa': 'sin forgiveness', 'taubat': 'repentance',
-        'sabar': 'patience', 'syukur': 'gratitude', 'takut': 'fear',
-        'mati': 'death', 'sholat': 'prayer', 'solat': 'prayer', 'puasa': 'fasting',
-        'sedekah': 'charity', 'rezeki': 'sustenance', 'doa': 'supplication',
-        'ampun': 'forgiveness mercy', 'surga': 'paradise', 'neraka': 'hell',
-        'akhirat': 'afterlife', 'hati': 'heart soul', 'iman': 'faith',
-        'ibadah': 'worship', 'dzikir': 'remembrance', 'gelisah': 'anxiety',
-        'tenang': 'peace calm', 'sedih': 'sadness grief', 'maaf': 'forgiveness',
-        'ujian': 'trial test', 'cobaan': 'hardship', 'hidayah': 'guidance',
-        'berkah': 'blessing', 'ridho': 'acceptance', 'tawakkal': 'trust God',
-        'allah': 'God Allah', 'tuhan': 'God Lord', 'nabi': 'prophet',
-        'munafik': 'hypocrite hypocrisy', 'riya': 'showing off',
-        'sombong': 'arrogance pride', 'rendah': 'humble', 'cinta': 'love',
-        'bersyukur': 'grateful', 'khusyuk': 'focus concentration',
-        'malu': 'shame shy', 'tobat': 'repent', 'zina': 'adultery',
-        'ghibah': 'backbiting gossip', 'hasad': 'envy jealousy',
-        'dendam': 'grudge revenge', 'marah': 'anger angry',
-        'bahagia': 'happiness happy', 'tentram': 'tranquil peaceful'
-    }
+    attempts = [asyncio.create_task(attempt())]
+    hedge_at = start + hedge_delay()
+    pending = set(attempts)
+    error = None
+    try:
+        while pending:
+            can_hedge = HEDGE_ENABLED and len(attempts) == 1
+            wait_until = min(hedge_at, deadline.expires) if can_hedge else deadline.expires
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, wait_until - time.monotonic()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    chunks = task.result()
+                    await asyncio.to_thread(retrieval_cache.put, search_query, num_results, partition, chunks)
+                    hedged = len(attempts) > 1
+                    if hedged:
+                        _count_hedge(won=task is not attempts[0])
+                    _record_search(leg, "hedge_won" if hedged and task is not attempts[0] else "ok", start)
+                    return chunks
+                error = task.exception()
+            if deadline.expired:
+                if len(attempts) > 1:
+                    _count_hedge(won=False)
+                print(f"Ragie search ({leg}) missed its {RETRIEVAL_BUDGET:.1f}s budget")
+                _record_search(leg, "deadline", start)
+                return []
+            if can_hedge and (done or time.monotonic() >= hedge_at) and ragie_breaker.allow():
+                with _hedge_lock:
+                    _hedge_stats["hedged"] += 1
+                attempts.append(asyncio.create_task(attempt()))
+                pending.add(attempts[-1])
+    finally:
+        for task in attempts:
+            task.cancel()
     
-    # Build English query from Indonesian terms found
-    query_lower = query.lower()
-    english_terms = []
-    for indo, eng in indo_to_eng.items():
-        if indo in query_lower:
-            english_terms.append(eng)
+    print(f"Ragie retrieval error: {type(error).__name__}: {error}")
+    if len(attempts) > 1:
+        _count_hedge(won=False)
+    _record_search(leg, "timeout" if isinstance(error, httpx.TimeoutException) else "error", start)
+    return []
+
+
+async def retrieve_context_async(query: str, top_k: int = 6, deadline: Deadline = None,
+                                 history: list = None) -> list[dict]:
+    """
+    Async variant of retrieve_context; searches run concurrently on the event
+    loop and the local retrievers (CPU-bound) on worker threads.
+    """
+    if _use_local_only():
+        return await asyncio.to_thread(_local_retrieve, query, top_k)
     
-    # If we found Indonesian terms, create English query
-    if english_terms:
-        english_query = " ".join(english_terms)
-    else:
-        english_query = None
+    if not RAGIE_API_KEY:
+        print("Warning: RAGIE_API_KEY not set")
+        return []
     
-    # Run searches in PARALLEL (no extra delay!)
-    all_chunks = []
+    if ragie_breaker.is_open():
+        metrics.inc("gus_ragie_requests_total", leg="all", outcome="breaker_open")
+        return await asyncio.to_thread(_breaker_fallback, query, top_k)
     
-    if english_query:
-        # Search both languages simultaneously
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            future_original = executor.submit(search_ragie, query, top_k // 2 + 1)
-            future_english = executor.submit(search_ragie, english_query, top_k // 2 + 1)
-            
-            chunks_original = future_original.result()
-            chunks_english = future_english.result()
-        
-        all_chunks = chunks_original + chunks_english
-    else:
-        # No Indonesian terms found, just search original
-        all_chunks = search_ragie(query, top_k)
+    budget = deadline.child(RETRIEVAL_BUDGET) if deadline else Deadline(RETRIEVAL_BUDGET)
+    if RETRIEVAL_BACKEND == "fallback":
+        budget = budget.child(LOCAL_FALLBACK_DEADLINE)
     
-    # Deduplicate by text content (keep higher score)
-    seen_texts = {}
-    for chunk in all_chunks:
-        text = chunk.get("text", "")[:200]  # First 200 chars as key
-        score = chunk.get("score", 0)
-        if text not in seen_texts or score > seen_texts[text].get("score", 0):
-            seen_texts[text] = chunk
+    variants = build_variants(query, history)
+    searches = [
+        search_ragie_async(search_query, top_k, leg=leg, deadline=_leg_deadline(leg, budget))
+        for leg, search_query in variants
+    ]
+    if RETRIEVAL_BACKEND == "parallel":
+        # Local lookup runs on a thread while Ragie is in flight
+        *results, local_results = await asyncio.gather(*searches, asyncio.to_thread(_local_legs, query, top_k))
+        leg_results = [(leg, chunks) for (leg, _), chunks in zip(variants, results)]
+        return fuse_chunks(leg_results + local_results, top_k)
     
-    # Sort by score and take top_k
-    unique_chunks = sorted(seen_texts.values(), key=lambda x: x.get("score", 0), reverse=True)[:top_k]
+    results = await asyncio.gather(*searches)
+    leg_results = [(leg, chunks) for (leg, _), chunks in zip(variants, results)]
     
-    # Add source metadata
-    results = []
-    for chunk in unique_chunks:
-        doc_name = chunk.get("document_name", "unknown")
-        source_meta = get_source_metadata(doc_name)
-        
-        results.append({
-            "text": chunk.get("text", ""),
-            "score": chunk.get("score", 0),
-            "document_name": doc_name,
-            "source": source_meta
-        })
+    if RETRIEVAL_BACKEND == "fallback":
+        if not any(results) or budget.expired:
+            print("Ragie slow or empty, using local index")
+            metrics.inc("gus_local_fallbacks_total")
+            local_results = await asyncio.to_thread(_local_legs, query, top_k)
+            return fuse_chunks(leg_results + local_results, top_k)
     
-    return results
+    return fuse_chunks(leg_results, top_k)
 
 
-def format_context_for_prompt(chunks: list[dict], max_chars: int = 3000) -> str:
-    """Format retrieved chunks into a context string for the LLM."""
-    if not chunks:
-        return ""
-    
-    context_parts = []
-    total_chars = 0
-    
-    for i, chunk in enumerate(chunks, 1):
-        text = chunk.get("text", "").strip()
-        doc_name = chunk.get("document_name", "unknown")
-        source = chunk.get("source", {})
-        source_type = source.get("type", "unknown")
-        
-        # Determine label based on source type
-        if source_type == "book":
-            book_name = source.get("book", "Buku")
-            label = f"BUKU: {book_name}"
-        elif source_type == "summary":
-            label = "AJARAN INTI"
-        elif source_type == "video":
-            label = "NGAJI GUS BAHA"
-        else:
-            label = "SUMBER"
-        
-        # Truncate if too long
-        if len(text) > 800:
-            text = text[:800] + "..."
-        
-        block = f"[{label} {i}]\n{text}"
-        
-        if total_chars + len(block) > max_chars:
-            break
-            
-        context_parts.append(block)
-        total_chars += len(block)
-    
-    return "\n\n".join(context_parts)
+def resilience_stats() -> dict:
+    """Ragie breaker state and hedging counts for this worker."""
+    with _hedge_lock:
+        hedge = dict(_hedge_stats)
+    decided = hedge["hedge_wins"] + hedge["hedge_losses"]
+    hedge["win_rate"] = round(hedge["hedge_wins"] / decided, 3) if decided else 0.0
+    return {
+        "breaker": ragie_breaker.stats(),
+        "hedging": hedge,
+        "hedge_delay_s": round(hedge_delay(), 3),
+        "retrieval_budget_s": RETRIEVAL_BUDGET
+    }
+
+
+def fanout_stats() -> dict:
+    """Per-leg searches, mean latency and contribution to the fused results (this worker)."""
+    with _leg_lock:
+        legs = {leg: dict(entry) for leg, entry in _leg_stats.items()}
+    for entry in legs.values():
+        latency = entry.pop("latency_s")
+        entry["latency_ms_mean"] = round(latency / entry["searches"] * 1000, 1) if entry["searches"] else 0.0
+    return {"legs": legs, "leg_budget_s": FANOUT_LEG_BUDGET, "rrf_k": RRF_K}
 
 
 def get_unique_sources(chunks: list[dict]) -> list[dict]:
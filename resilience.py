@@ -0,0 +1,171 @@
+"""
+Resilience - Deadlines, latency tracking, circuit breaking and rate
+limiting for calls to external services, so a slow or failing dependency
+costs a bounded slice of the request instead of its full timeout.
+"""
+
+import time
+import threading
+from collections import deque
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of its time budget."""
+
+
+class Deadline:
+    """An absolute point in time a piece of work must finish by."""
+
+    def __init__(self, seconds: float, parent: "Deadline" = None):
+        self.expires = time.monotonic() + seconds
+        if parent is not None:
+            self.expires = min(self.expires, parent.expires)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def child(self, seconds: float) -> "Deadline":
+        """A slice of this deadline: at most `seconds`, never past the parent."""
+        return Deadline(seconds, parent=self)
+
+
+class LatencyTracker:
+    """Recent latencies (seconds) of successful calls, for adaptive delays."""
+
+    def __init__(self, size: int = 200, default: float = 1.0, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.default = default
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        """Latency percentile, or the default until enough samples are in."""
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return self.default
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency while its recent error rate is high.
+
+    closed    - calls go through; outcomes are tracked over `window` seconds
+    open      - error rate reached `error_rate` (over at least `min_requests`
+                calls): calls are skipped for `cooldown` seconds
+    half_open - after the cool-down one probe call is let through; success
+                closes the breaker, failure opens it again
+    """
+
+    def __init__(self, name: str, window: float = 30.0, min_requests: int = 10,
+                 error_rate: float = 0.5, cooldown: float = 30.0, on_change=None):
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.on_change = on_change
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.outcomes = deque()  # (time, ok)
+        self.lock = threading.Lock()
+
+    def _set_state(self, state: str) -> str:
+        """Switch state (lock held); returns it for _notify once the lock is released."""
+        self.state = state
+        print(f"Circuit breaker {self.name}: {state}")
+        return state
+
+    def _notify(self, state: str | None):
+        # Outside the lock, so a callback may call stats() or allow()
+        if state and self.on_change:
+            self.on_change(state)
+
+    def allow(self) -> bool:
+        """Whether a call may be made now."""
+        changed = None
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                changed = self._set_state("half_open")
+        self._notify(changed)
+        return changed is not None  # the probe
+
+    def is_open(self) -> bool:
+        """True while calls are being skipped (open and still cooling down)."""
+        with self.lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.cooldown
+
+    def record(self, ok: bool):
+        """Report the outcome of a call that allow() let through."""
+        now = time.monotonic()
+        changed = None
+        with self.lock:
+            if self.state == "half_open":
+                if ok:
+                    self.outcomes.clear()
+                    changed = self._set_state("closed")
+                else:
+                    self.opened_at = now
+                    self.times_opened += 1
+                    changed = self._set_state("open")
+            elif self.state == "closed":
+                self.outcomes.append((now, ok))
+                while self.outcomes and self.outcomes[0][0] < now - self.window:
+                    self.outcomes.popleft()
+                errors = sum(1 for _, success in self.outcomes if not success)
+                if len(self.outcomes) >= self.min_requests and errors / len(self.outcomes) >= self.error_rate:
+                    self.opened_at = now
+                    self.times_opened += 1
+                    self.outcomes.clear()
+                    changed = self._set_state("open")
+            # open: stragglers from before the breaker opened are ignored
+        self._notify(changed)
+
+    def stats(self) -> dict:
+        with self.lock:
+            calls = len(self.outcomes)
+            errors = sum(1 for _, ok in self.outcomes if not ok)
+            return {
+                "state": self.state,
+                "times_opened": self.times_opened,
+                "window_calls": calls,
+                "window_error_rate": round(errors / calls, 3) if calls else 0.0,
+                "cooldown_remaining_s": round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 1)
+                if self.state == "open" else 0.0
+            }
+
+
+class RateLimiter:
+    """Shared request pacing: at most `rps` starts per second, plus a global
+    pause after a 429 so every worker backs off together."""
+
+    def __init__(self, rps: float):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot, self.paused_until)
+            self.next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
@@ -0,0 +1,84 @@
+"""
+Response Cache - Opt-in answer cache for first-turn questions.
+A first-turn answer depends only on the query, its language, the
+knowledge base and the static prompts, so it can be reused.
+
+Keys include the persona version (a hash of the prompts), so editing
+persona.py or the generator prompts invalidates every entry on deploy.
+"""
+
+import os
+import random
+import hashlib
+import threading
+
+from retrieval_cache import LRUCache, normalize_query, KB_VERSION
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "86400"))  # seconds
+# Fraction of hits that still call DeepSeek, so popular questions keep some variety
+RESPONSE_CACHE_REGENERATE_RATE = float(os.environ.get("RESPONSE_CACHE_REGENERATE_RATE", "0.1"))
+# Distinct answers kept per question; hits pick one at random
+RESPONSE_CACHE_VARIANTS = int(os.environ.get("RESPONSE_CACHE_VARIANTS", "3"))
+
+_cache = LRUCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+_stats = {"hits": 0, "misses": 0, "regenerated": 0, "stores": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def make_key(query: str, language: str, persona_version: str) -> str:
+    """Cache key from normalized query, language, persona and KB version."""
+    raw = f"{persona_version}|{KB_VERSION}|{language}|{normalize_query(query)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(history: list) -> bool:
+    """Only first-turn questions are cached."""
+    return RESPONSE_CACHE_ENABLED and not history
+
+
+def get(query: str, language: str, persona_version: str):
+    """
+    Return a cached result dict, or None on miss.
+    A sampled fraction of hits returns None so the answer is regenerated.
+    """
+    variants = _cache.get(make_key(query, language, persona_version))
+    if not variants:
+        _count("misses")
+        return None
+    if random.random() < RESPONSE_CACHE_REGENERATE_RATE:
+        _count("regenerated")
+        return None
+    _count("hits")
+    return dict(random.choice(variants), cached=True)
+
+
+def put(query: str, language: str, persona_version: str, result: dict):
+    """Store a successful result as one of the question's variants."""
+    key = make_key(query, language, persona_version)
+    variants = list(_cache.get(key) or [])
+    variants.append({
+        "response": result["response"],
+        "context_used": result.get("context_used", False),
+        "chunks_retrieved": result.get("chunks_retrieved", 0),
+        "sources": result.get("sources", []),
+        "language": language,
+        "error": None
+    })
+    _cache.set(key, variants[-RESPONSE_CACHE_VARIANTS:])
+    _count("stores")
+
+
+def stats() -> dict:
+    """Hit/miss counters for this worker."""
+    with _stats_lock:
+        result = dict(_stats)
+    result["enabled"] = RESPONSE_CACHE_ENABLED
+    result["size"] = len(_cache)
+    return result
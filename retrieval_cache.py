@@ -0,0 +1,194 @@
+"""
+Retrieval Cache - Two-tier cache in front of Ragie searches.
+Tier 1: in-process LRU with TTL (per gunicorn worker).
+Tier 2: shared Postgres table (DATABASE_URL), optional.
+
+Invalidate after re-ingesting the knowledge base:
+    python retrieval_cache.py invalidate
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from pg_pool import PgPool
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+RETRIEVAL_CACHE_ENABLED = os.environ.get("RETRIEVAL_CACHE_ENABLED", "1") == "1"
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = int(os.environ.get("RETRIEVAL_CACHE_TTL", "600"))  # seconds, local tier
+RETRIEVAL_CACHE_SQL_TTL = int(os.environ.get("RETRIEVAL_CACHE_SQL_TTL", "86400"))  # seconds, shared tier
+
+# Bump (or set per deploy) to invalidate every tier at once
+KB_VERSION = os.environ.get("RAGIE_KB_VERSION", "1")
+
+TABLE_NAME = "retrieval_cache"
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = LRUCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL)
+_stats = {"hits_local": 0, "hits_shared": 0, "misses": 0, "stores": 0, "shared_errors": 0}
+_stats_lock = threading.Lock()
+
+_shared = PgPool(DATABASE_URL, f"""
+    CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+        cache_key TEXT PRIMARY KEY,
+        payload JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+""")
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def make_key(query: str, top_k: int, partition: str) -> str:
+    """Cache key from normalized query, top_k, partition and KB version."""
+    raw = f"{KB_VERSION}|{partition}|{top_k}|{normalize_query(query)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ==================
+# SHARED (POSTGRES) TIER
+# ==================
+
+def _shared_get(key: str):
+    try:
+        row = _shared.execute(
+            f"SELECT payload FROM {TABLE_NAME} "
+            f"WHERE cache_key = %s AND created_at > now() - %s * interval '1 second'",
+            (key, RETRIEVAL_CACHE_SQL_TTL), fetch=True
+        )
+        return row[0] if row else None
+    except Exception as e:
+        print(f"Retrieval cache (shared) error: {e}")
+        _count("shared_errors")
+        return None
+
+
+def _shared_set(key: str, value):
+    try:
+        _shared.execute(
+            f"INSERT INTO {TABLE_NAME} (cache_key, payload, created_at) "
+            f"VALUES (%s, %s::jsonb, now()) "
+            f"ON CONFLICT (cache_key) DO UPDATE "
+            f"SET payload = EXCLUDED.payload, created_at = EXCLUDED.created_at",
+            (key, json.dumps(value))
+        )
+    except Exception as e:
+        print(f"Retrieval cache (shared) error: {e}")
+        _count("shared_errors")
+
+
+# ==================
+# PUBLIC API
+# ==================
+
+def get(query: str, top_k: int, partition: str):
+    """Return cached scored chunks, or None on miss."""
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None
+    key = make_key(query, top_k, partition)
+
+    value = _local.get(key)
+    if value is not None:
+        _count("hits_local")
+        return value
+
+    value = _shared_get(key)
+    if value is not None:
+        _local.set(key, value)
+        _count("hits_shared")
+        return value
+
+    _count("misses")
+    return None
+
+
+def put(query: str, top_k: int, partition: str, chunks: list):
+    """Store scored chunks for a successful search."""
+    if not RETRIEVAL_CACHE_ENABLED:
+        return
+    key = make_key(query, top_k, partition)
+    _local.set(key, chunks)
+    _shared_set(key, chunks)
+    _count("stores")
+
+
+def invalidate():
+    """
+    Drop all cached retrievals (call after re-ingesting the knowledge base).
+    Other workers' local tiers expire within RETRIEVAL_CACHE_TTL; set
+    RAGIE_KB_VERSION on deploy to invalidate them immediately.
+    """
+    _local.clear()
+    _shared.execute(f"TRUNCATE {TABLE_NAME}")
+
+
+def stats() -> dict:
+    """Hit/miss counters for this worker."""
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result["hits_local"] + result["hits_shared"] + result["misses"]
+    result["hit_rate"] = round((result["hits_local"] + result["hits_shared"]) / lookups, 3) if lookups else 0.0
+    result["local_size"] = len(_local)
+    result["shared_enabled"] = bool(DATABASE_URL)
+    return result
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "invalidate":
+        invalidate()
+        print("Retrieval cache invalidated")
+    else:
+        print(json.dumps(stats(), indent=2))
@@ -0,0 +1,312 @@
+"""
+Sessions - Server-side conversation history.
+The first chat turn is issued a session_id; later turns send only the new
+message (plus the session_id and the turn count they last saw) and the
+server appends both sides of each turn, keeping the last
+SESSION_MAX_MESSAGES messages.
+
+Tier 1: in-process LRU with TTL (per gunicorn worker).
+Tier 2: shared backend so any worker can continue a session - Postgres
+(DATABASE_URL) by default, or any SessionBackend passed to set_backend().
+
+A local copy is only trusted when its turn count matches the one the
+client sent back; otherwise another worker has moved the session on and
+it is re-read from the shared backend.
+
+Older turns are folded into session["summary"] off the request path
+(summarizer.py); "offset" counts the messages removed from the front so
+a summary computed in the background lands on the right messages.
+"""
+
+import os
+import re
+import sys
+import json
+import random
+import secrets
+import threading
+
+from pg_pool import PgPool
+from retrieval_cache import LRUCache
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "auto")  # auto | memory | postgres
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "4096"))
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "86400"))  # seconds since the last turn
+SESSION_MAX_MESSAGES = int(os.environ.get("SESSION_MAX_MESSAGES", "12"))
+SESSION_MAX_MESSAGE_CHARS = int(os.environ.get("SESSION_MAX_MESSAGE_CHARS", "4000"))
+
+TABLE_NAME = "chat_sessions"
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+_local = LRUCache(SESSION_CACHE_SIZE, SESSION_TTL)
+_stats = {"created": 0, "hits_local": 0, "hits_shared": 0, "expired": 0, "saves": 0, "shared_errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def new_session() -> dict:
+    return {"messages": [], "turns": 0, "summary": "", "offset": 0, "summarized_upto": 0}
+
+
+def _clip(message: dict) -> dict:
+    return {
+        "role": "assistant" if message.get("role") == "assistant" else "user",
+        "content": str(message.get("content") or "")[:SESSION_MAX_MESSAGE_CHARS]
+    }
+
+
+def bound_history(history) -> list:
+    """Valid messages only, each clipped, at most SESSION_MAX_MESSAGES (newest kept)."""
+    if not isinstance(history, list):
+        return []
+    messages = [_clip(m) for m in history if isinstance(m, dict) and m.get("content")]
+    return messages[-SESSION_MAX_MESSAGES:]
+
+
+# ==================
+# SHARED BACKENDS
+# ==================
+
+class SessionBackend:
+    """Shared session storage. Subclass and pass to set_backend() (e.g. Redis)."""
+
+    def load(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def save(self, session_id: str, session: dict):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+
+class PostgresBackend(SessionBackend):
+    """One JSONB row per session; rows idle past SESSION_TTL are ignored and pruned."""
+
+    def __init__(self, dsn: str):
+        self.db = PgPool(dsn, f"""
+            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+                session_id TEXT PRIMARY KEY,
+                payload JSONB NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+
+    def load(self, session_id: str) -> dict | None:
+        row = self.db.execute(
+            f"SELECT payload FROM {TABLE_NAME} "
+            f"WHERE session_id = %s AND updated_at > now() - %s * interval '1 second'",
+            (session_id, SESSION_TTL), fetch=True
+        )
+        return row[0] if row else None
+
+    def save(self, session_id: str, session: dict):
+        self.db.execute(
+            f"INSERT INTO {TABLE_NAME} (session_id, payload, updated_at) "
+            f"VALUES (%s, %s::jsonb, now()) "
+            f"ON CONFLICT (session_id) DO UPDATE "
+            f"SET payload = EXCLUDED.payload, updated_at = EXCLUDED.updated_at",
+            (session_id, json.dumps(session, ensure_ascii=False))
+        )
+        if random.random() < 0.01:
+            self.prune()
+
+    def delete(self, session_id: str):
+        self.db.execute(f"DELETE FROM {TABLE_NAME} WHERE session_id = %s", (session_id,))
+
+    def prune(self):
+        """Delete sessions idle past SESSION_TTL."""
+        self.db.execute(
+            f"DELETE FROM {TABLE_NAME} WHERE updated_at < now() - %s * interval '1 second'",
+            (SESSION_TTL,)
+        )
+
+
+def _default_backend() -> SessionBackend | None:
+    if SESSION_BACKEND == "memory":
+        return None
+    if SESSION_BACKEND == "postgres" or (SESSION_BACKEND == "auto" and DATABASE_URL):
+        return PostgresBackend(DATABASE_URL)
+    return None
+
+
+_backend = _default_backend()
+
+
+def set_backend(backend: SessionBackend | None):
+    """Use another shared store (None = this worker's memory only)."""
+    global _backend
+    _backend = backend
+    _local.clear()
+
+
+def _shared_load(session_id: str) -> dict | None:
+    if _backend is None:
+        return None
+    try:
+        return _backend.load(session_id)
+    except Exception as e:
+        print(f"Session store (shared) error: {e}")
+        _count("shared_errors")
+        return None
+
+
+def _shared_save(session_id: str, session: dict):
+    if _backend is None:
+        return
+    try:
+        _backend.save(session_id, session)
+    except Exception as e:
+        print(f"Session store (shared) error: {e}")
+        _count("shared_errors")
+
+
+# ==================
+# PUBLIC API
+# ==================
+
+def load(session_id: str, turn: int = None) -> dict | None:
+    """
+    Return the stored session, or None if unknown or expired.
+
+    Args:
+        session_id: Id issued on the first turn
+        turn: Turn count the client last saw; a local copy at another
+              turn is stale and the shared backend is asked instead
+    """
+    session = _local.get(session_id)
+    if session is not None and (_backend is None or session["turns"] == turn):
+        _count("hits_local")
+        return session
+
+    shared = _shared_load(session_id)
+    if shared is not None:
+        _local.set(session_id, shared)
+        _count("hits_shared")
+        return shared
+    if session is not None:
+        # Shared store unavailable: a possibly stale copy beats losing the conversation
+        _count("hits_local")
+        return session
+    return None
+
+
+def start_turn(data: dict) -> tuple[str, dict]:
+    """
+    Resolve the session for a chat request body.
+
+    Args:
+        data: Request JSON - "session_id" and "turn" for a continuing
+              conversation; a legacy "history" list seeds a new session
+
+    Returns:
+        Tuple of (session_id, session) - session["messages"] is the history
+    """
+    session_id = data.get("session_id")
+    if isinstance(session_id, str) and _SESSION_ID_RE.match(session_id):
+        turn = data.get("turn")
+        session = load(session_id, turn if isinstance(turn, int) else None)
+        if session is not None:
+            return session_id, session
+        _count("expired")
+
+    # New conversation (or an expired one, which restarts under a fresh id)
+    _count("created")
+    session = new_session()
+    session["messages"] = bound_history(data.get("history"))
+    return secrets.token_urlsafe(18), session
+
+
+def append_turn(session_id: str, session: dict, user_message: str, answer: str) -> dict:
+    """Add one exchange, trim to SESSION_MAX_MESSAGES and save it."""
+    # Empty messages are dropped first, so the offset counts only the front trim
+    messages = [
+        *session["messages"],
+        *(m for m in ({"role": "user", "content": user_message}, {"role": "assistant", "content": answer})
+          if m["content"])
+    ]
+    kept = bound_history(messages)
+    session = {
+        **session,
+        "messages": kept,
+        "offset": session.get("offset", 0) + len(messages) - len(kept),
+        "turns": session["turns"] + 1
+    }
+    save(session_id, session)
+    return session
+
+
+def apply_summary(session_id: str, summary: str, upto: int):
+    """
+    Store a rolling summary covering every message before absolute index
+    `upto` and drop those messages. Re-reads the session so turns added
+    while the summary was being written are kept.
+    """
+    session = load(session_id)
+    if session is None or session.get("summarized_upto", 0) >= upto:
+        return  # expired, or a newer summary is already stored
+    offset = session.get("offset", 0)
+    drop = max(0, upto - offset)
+    save(session_id, {
+        **session,
+        "summary": summary,
+        "messages": session["messages"][drop:],
+        "offset": offset + drop,
+        "summarized_upto": upto
+    })
+
+
+def replace_last_answer(session_id: str, answer: str, turn: int | None = None):
+    """
+    Swap in a rewritten answer (speculative critic) for the latest turn.
+    With turn, nothing is replaced once the conversation has moved past it.
+    """
+    session = load(session_id, turn)
+    if not session or not session["messages"] or session["messages"][-1]["role"] != "assistant":
+        return
+    if turn is not None and session["turns"] != turn:
+        return
+    messages = [*session["messages"][:-1], _clip({"role": "assistant", "content": answer})]
+    save(session_id, {**session, "messages": messages})
+
+
+def save(session_id: str, session: dict):
+    _local.set(session_id, session)
+    _shared_save(session_id, session)
+    _count("saves")
+
+
+def delete(session_id: str):
+    """Forget a conversation (e.g. "new chat")."""
+    _local.set(session_id, None)
+    if _backend is not None:
+        try:
+            _backend.delete(session_id)
+        except Exception as e:
+            print(f"Session store (shared) error: {e}")
+            _count("shared_errors")
+
+
+def stats() -> dict:
+    """Session counters for this worker."""
+    with _stats_lock:
+        result = dict(_stats)
+    result["local_size"] = len(_local)
+    result["backend"] = type(_backend).__name__ if _backend is not None else "memory"
+    return result
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "prune" and isinstance(_backend, PostgresBackend):
+        _backend.prune()
+        print("Expired sessions deleted")
+    else:
+        print(json.dumps(stats(), indent=2))
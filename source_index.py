@@ -0,0 +1,180 @@
+"""
+Source Index - Citation metadata for retrieved documents.
+Loaded from data/sources.json into a precomputed index (exact map,
+compiled title rules and patterns) and memoized per document name.
+The file is re-read automatically when it changes, so new sources
+don't need a deploy.
+
+List documents that fall through to the default citation:
+    python source_index.py validate [document names...]
+With no names, checks the local BM25 index and (if RAGIE_API_KEY is set)
+every document in the Ragie partition.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import threading
+
+SOURCES_PATH = os.environ.get(
+    "SOURCES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sources.json")
+)
+SOURCES_RELOAD_INTERVAL = float(os.environ.get("SOURCES_RELOAD_INTERVAL", "5"))  # seconds between mtime checks
+
+DEFAULT_SOURCE = {
+    "title": "Pengajian Gus Baha",
+    "url": None,
+    "type": "unknown"
+}
+
+
+class SourceIndex:
+    """Precomputed lookup from document name to citation metadata."""
+
+    def __init__(self, data: dict):
+        self.sources = data.get("sources", {})
+        self.default = data.get("default") or DEFAULT_SOURCE
+        self.title_rules = [
+            {
+                "contains": [c.lower() for c in rule.get("contains", [])],
+                "strip": [re.compile(p, re.IGNORECASE) for p in rule.get("strip", [])],
+                "meta": rule.get("meta", {})
+            }
+            for rule in data.get("title_rules", [])
+        ]
+        # (lowercased pattern, metadata) in file order - first match wins
+        self.patterns = [(p.lower(), meta) for p, meta in data.get("patterns", {}).items()]
+        self._memo = {}
+
+    @classmethod
+    def load(cls, path: str = SOURCES_PATH) -> "SourceIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def lookup(self, document_name: str) -> dict:
+        """Citation metadata for a document (memoized)."""
+        meta = self._memo.get(document_name)
+        if meta is None:
+            meta = self._resolve(document_name)
+            self._memo[document_name] = meta
+        return meta
+
+    def is_default(self, document_name: str) -> bool:
+        return self.lookup(document_name) is self.default
+
+    def _resolve(self, document_name: str) -> dict:
+        if not document_name:
+            return self.default
+
+        # Exact match first
+        if document_name in self.sources:
+            return self.sources[document_name]
+
+        # Partial match on full path/name
+        for key, value in self.sources.items():
+            if key in document_name or document_name in key:
+                return value
+
+        # Title derived from the filename (e.g. Hawa's Blog PDFs):
+        # "don't be harsh _ Hawa's Blog.PDF" -> "Don't Be Harsh"
+        doc_lower = document_name.lower()
+        for rule in self.title_rules:
+            if any(c in doc_lower for c in rule["contains"]):
+                title = document_name
+                for pattern in rule["strip"]:
+                    title = pattern.sub("", title)
+                title = title.replace("_", " ").strip().title()
+                return {"title": title, **rule["meta"]}
+
+        # Pattern matching
+        for pattern, meta in self.patterns:
+            if pattern in doc_lower:
+                return meta
+
+        return self.default
+
+
+_index = None
+_index_mtime = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def get_index() -> SourceIndex:
+    """Current index; reloads when the data file's mtime changes."""
+    global _index, _index_mtime, _next_check
+    now = time.monotonic()
+    if _index is not None and now < _next_check:
+        return _index
+    with _lock:
+        if _index is not None and now < _next_check:
+            return _index
+        _next_check = now + SOURCES_RELOAD_INTERVAL
+        try:
+            mtime = os.path.getmtime(SOURCES_PATH)
+            if _index is None or mtime != _index_mtime:
+                _index = SourceIndex.load(SOURCES_PATH)
+                _index_mtime = mtime
+        except (OSError, ValueError) as e:
+            print(f"Source metadata load error: {e}")
+            if _index is None:
+                _index = SourceIndex({})
+    return _index
+
+
+def get_source_metadata(document_name: str) -> dict:
+    """Get source metadata for a document."""
+    return get_index().lookup(document_name)
+
+
+def _ragie_document_names() -> list[str]:
+    """All document names in the Ragie partition."""
+    from ragie_client import RAGIE_API_KEY, RAGIE_BASE_URL, RAGIE_PARTITION, get_session
+
+    if not RAGIE_API_KEY:
+        return []
+    names = []
+    cursor = None
+    while True:
+        params = {"page_size": 100}
+        if cursor:
+            params["cursor"] = cursor
+        response = get_session().get(
+            f"{RAGIE_BASE_URL}/documents",
+            headers={"Authorization": f"Bearer {RAGIE_API_KEY}", "partition": RAGIE_PARTITION},
+            params=params,
+            timeout=30
+        )
+        response.raise_for_status()
+        data = response.json()
+        names += [doc.get("name", "") for doc in data.get("documents", [])]
+        cursor = (data.get("pagination") or {}).get("next_cursor")
+        if not cursor:
+            return names
+
+
+def validate(document_names: list[str]) -> list[str]:
+    """Return the document names that resolve to the default citation."""
+    index = get_index()
+    return sorted({name for name in document_names if index.is_default(name)})
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "validate":
+        names = sys.argv[2:]
+        if not names:
+            import local_index
+            index = local_index.get_index()
+            if index is not None:
+                names += [chunk["document_name"] for chunk in index.chunks]
+            names += _ragie_document_names()
+        missing = validate(names)
+        print(f"Checked {len(set(names))} documents, {len(missing)} without citation metadata")
+        for name in missing:
+            print(f"  {name}")
+        sys.exit(1 if missing else 0)
+    else:
+        print(__doc__)
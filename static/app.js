@@ -11,6 +11,13 @@ const newChatBtn = document.getElementById('newChatBtn');
 
 // State
 let isLoading = false;
+// Conversation history lives on the server; we only echo the session back
+let sessionId = null;
+let sessionTurn = 0;
+
+// Give up if the server sends nothing for this long (it stops itself at 30s)
+const STREAM_IDLE_TIMEOUT_MS = 45000;
+const TIMEOUT_MESSAGE = 'Maaf, Gus lagi kelamaan mikirnya. Coba tanya lagi sebentar ya.';
 
 /**
  * Create YouTube icon SVG
@@ -152,6 +159,13 @@ function autoResize() {
  * Start a new chat
  */
 function newChat() {
+    // Forget the server-side conversation
+    if (sessionId) {
+        fetch(`/chat/session/${sessionId}`, { method: 'DELETE', keepalive: true }).catch(() => {});
+    }
+    sessionId = null;
+    sessionTurn = 0;
+    
     // Clear all messages except welcome and disclaimer
     chatArea.innerHTML = `
         <div class="message bot-message">
@@ -192,39 +206,113 @@ async function sendMessage() {
     sendBtn.disabled = true;
     showLoading();
     
+    const controller = new AbortController();
+    let idleTimer = null;
+    let answerDone = false;  // after "done", only the optional critic rewrite is still to come
+    const resetIdleTimer = () => {
+        clearTimeout(idleTimer);
+        if (!answerDone) idleTimer = setTimeout(() => controller.abort(), STREAM_IDLE_TIMEOUT_MS);
+    };
+    resetIdleTimer();
+    
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ message }),
+            body: JSON.stringify({ message, session_id: sessionId, turn: sessionTurn }),
+            signal: controller.signal,
         });
         
-        const data = await response.json();
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            hideLoading();
+            addMessage(data.error || 'Maaf, ada gangguan. Coba lagi ya.', 'error');
+            return;
+        }
         
-        hideLoading();
+        let answer = '';
+        let sourcesHtml = '';
+        let messageDiv = null;
         
-        if (data.success && data.response) {
-            // Only show sources if context was actually used
-            const sourcesToShow = data.context_used ? (data.sources || []) : [];
-            addMessage(data.response, 'bot', sourcesToShow);
-        } else {
-            const errorMsg = data.error || 'Maaf, ada gangguan. Coba lagi ya.';
-            addMessage(errorMsg, 'error');
-        }
+        await readEventStream(response, (event, data) => {
+            if (event === 'token') {
+                // Render tokens as they arrive
+                if (!messageDiv) {
+                    hideLoading();
+                    messageDiv = addMessage('', 'bot');
+                }
+                answer += data.text;
+                messageDiv.querySelector('.message-content').innerHTML = answer.replace(/\n/g, '<br>');
+                scrollToBottom();
+            } else if (event === 'sources' && messageDiv) {
+                // Only show sources if context was actually used
+                const sourcesToShow = data.context_used ? (data.sources || []) : [];
+                sourcesHtml = renderSources(sourcesToShow);
+                messageDiv.querySelector('.message-content').innerHTML += sourcesHtml;
+            } else if (event === 'done') {
+                answerDone = true;
+                clearTimeout(idleTimer);
+                // The server stored this turn; continue the same conversation next time
+                sessionId = data.session_id || sessionId;
+                sessionTurn = data.turn || sessionTurn;
+            } else if (event === 'replace' && messageDiv) {
+                // Speculative critic rewrote the answer after delivery
+                answer = data.text;
+                messageDiv.querySelector('.message-content').innerHTML = answer.replace(/\n/g, '<br>') + sourcesHtml;
+            } else if (event === 'error') {
+                // Before any text, or cut off mid-answer (e.g. the server's deadline)
+                hideLoading();
+                addMessage(data.error || 'Maaf, ada gangguan. Coba lagi ya.', 'error');
+            }
+        }, resetIdleTimer);
+        
+        hideLoading();
         
     } catch (error) {
         console.error('Chat error:', error);
         hideLoading();
-        addMessage('Maaf, koneksi terputus. Coba lagi ya.', 'error');
+        addMessage(error.name === 'AbortError' ? TIMEOUT_MESSAGE : 'Maaf, koneksi terputus. Coba lagi ya.', 'error');
     } finally {
+        clearTimeout(idleTimer);
         isLoading = false;
         sendBtn.disabled = false;
         userInput.focus();
     }
 }
 
+/**
+ * Read a Server-Sent Events response body, calling onEvent(event, data) per message
+ * and onChunk() whenever bytes arrive
+ */
+async function readEventStream(response, onEvent, onChunk) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        if (onChunk) onChunk();
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 /**
  * Handle Enter key (send) and Shift+Enter (new line)
  */
@@ -0,0 +1,124 @@
+"""
+Summarizer - Rolling summary of long conversations, kept with the session.
+Once a session holds more than SUMMARY_TRIGGER_MESSAGES unsummarized
+messages, a background thread folds all but the last SUMMARY_KEEP_MESSAGES
+into session["summary"]. The prompt then carries the summary plus only the
+recent turns, so its size stays flat however long the conversation runs.
+
+Runs after the reply has been delivered and never blocks a request; if it
+fails, the turns simply stay in the history until the next attempt.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import sessions
+from generator import client
+
+SUMMARY_ENABLED = os.environ.get("SUMMARY_ENABLED", "1") == "1"
+SUMMARY_TRIGGER_MESSAGES = int(os.environ.get("SUMMARY_TRIGGER_MESSAGES", "8"))
+SUMMARY_KEEP_MESSAGES = int(os.environ.get("SUMMARY_KEEP_MESSAGES", "4"))  # last 2 exchanges stay verbatim
+SUMMARY_MAX_TOKENS = int(os.environ.get("SUMMARY_MAX_TOKENS", "250"))
+SUMMARY_MAX_WORKERS = int(os.environ.get("SUMMARY_MAX_WORKERS", "2"))
+
+SUMMARY_PROMPT = """Kamu merangkum percakapan antara seorang pengguna dan Gus (chatbot bergaya Gus Baha) supaya Gus tetap ingat konteksnya.
+
+RINGKASAN SEBELUMNYA:
+{previous}
+
+GILIRAN BARU YANG HARUS DIGABUNGKAN:
+{turns}
+
+Tulis ringkasan baru yang menggabungkan keduanya, maksimal 120 kata, dalam bahasa yang dipakai pengguna.
+Catat: siapa pengguna dan keadaannya (kalau disebut), masalah atau pertanyaan utamanya, perasaannya,
+dan poin atau kisah yang sudah Gus sampaikan (supaya tidak diulang). Jangan menambah nasihat baru.
+Tulis hanya ringkasannya."""
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()  # session ids with a summary in flight (this worker)
+_pending_lock = threading.Lock()
+
+
+def _reset_executor():
+    """Forked workers must start their own threads."""
+    global _executor, _executor_lock, _pending_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _pending_lock = threading.Lock()
+    _pending.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS, thread_name_prefix="summary")
+    return _executor
+
+
+def _format_turns(messages: list) -> str:
+    names = {"user": "Pengguna", "assistant": "Gus"}
+    return "\n".join(f"{names[m['role']]}: {m['content']}" for m in messages)
+
+
+def summarize(previous: str, messages: list) -> str:
+    """Fold `messages` into the previous summary (one DeepSeek call)."""
+    resp = client.chat.completions.create(
+        model="deepseek-chat",
+        messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+            previous=previous or "(belum ada)",
+            turns=_format_turns(messages)
+        )}],
+        temperature=0.2,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    return resp.choices[0].message.content.strip()
+
+
+def _run_summary(session_id: str, previous: str, messages: list, upto: int):
+    try:
+        with metrics.timed("summarize"):
+            summary = summarize(previous, messages)
+        if summary:
+            sessions.apply_summary(session_id, summary, upto)
+            metrics.inc("gus_summaries_total", outcome="stored")
+    except Exception as e:
+        print(f"Summary error: {e}")
+        metrics.inc("gus_summaries_total", outcome="error")
+    finally:
+        with _pending_lock:
+            _pending.discard(session_id)
+
+
+def maybe_summarize(session_id: str, session: dict) -> bool:
+    """
+    Queue a background summary if the session's history has grown past
+    SUMMARY_TRIGGER_MESSAGES. Call after the turn has been saved.
+
+    Returns:
+        True if a summary was queued
+    """
+    messages = session["messages"]
+    if not SUMMARY_ENABLED or len(messages) <= SUMMARY_TRIGGER_MESSAGES:
+        return False
+    fold = len(messages) - SUMMARY_KEEP_MESSAGES
+    # Keep the verbatim part starting on a user message
+    while fold > 0 and messages[fold]["role"] == "assistant":
+        fold -= 1
+    if fold <= 0:
+        return False
+    with _pending_lock:
+        if session_id in _pending:
+            return False
+        _pending.add(session_id)
+    upto = session.get("offset", 0) + fold
+    _get_executor().submit(_run_summary, session_id, session.get("summary", ""), messages[:fold], upto)
+    return True
@@ -0,0 +1,390 @@
+"""
+Vector Store - In-process dense retrieval over the Gus Baha corpus.
+A local alternative to Ragie's semantic search (see LOCAL_RETRIEVER in
+ragie_client.py): no network round trip, and nothing to download at
+serve time.
+
+On disk (VECTOR_STORE_PATH, a symlink to the current build directory):
+    meta.json          - dim, count, embedder, document names
+    vectors.npy        - int8 (count x dim), rows L2-normalized then
+                         quantized with one float32 scale per row
+    scales.npy         - float32 (count,)
+    doc_ids.npy        - int32 (count,) index into meta["document_names"]
+    text_offsets.npy   - int64 (count + 1,) byte offsets into texts.bin
+    texts.bin          - UTF-8 chunk texts, back to back
+    token_vectors.npy  - float16 (vocab x dim), "static" embedder only
+    vocab.json         - words for token_vectors.npy, "static" embedder only
+
+Every array is opened with np.load(mmap_mode="r"), so gunicorn workers
+share one page-cached copy and memory stays flat as workers are added;
+only the top-k texts are decoded per query. Search is a brute-force
+scan in blocks of VECTOR_BLOCK_ROWS rows (int8 upcast per block, so the
+working set stays in cache) followed by one argpartition top-k.
+
+Query embedders (recorded in meta.json at build time):
+    hashed  - signed feature hashing of words and character 4-grams into
+              `dim` buckets; needs no model (python vector_store.py build)
+    static  - mean of per-word vectors shipped with the store, for
+              embeddings precomputed by an external model
+              (python vector_store.py import)
+
+Build from the same documents ingested into Ragie:
+    python vector_store.py build corpus/ [data/vector_store]
+Import precomputed embeddings (JSONL rows {"text", "document_name", "embedding"}
+and word vectors in the same space, word2vec text format):
+    python vector_store.py import chunks.jsonl --token-vectors words.vec [--embeddings chunks.npy]
+Query it:
+    python vector_store.py search "takut mati karena dosa"
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import Counter
+
+import numpy as np
+
+from local_index import chunk_directory, tokenize
+
+VECTOR_STORE_PATH = os.environ.get(
+    "VECTOR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "vector_store")
+)
+VECTOR_DIM = int(os.environ.get("VECTOR_DIM", "384"))  # hashed embedder only
+VECTOR_BLOCK_ROWS = int(os.environ.get("VECTOR_BLOCK_ROWS", "1024"))
+VECTOR_MIN_SCORE = float(os.environ.get("VECTOR_MIN_SCORE", "0.0"))  # cosine
+
+SUBWORD_CHARS = 4
+SUBWORD_WEIGHT = 0.5  # relative to whole words
+
+
+# ==================
+# QUERY EMBEDDERS
+# ==================
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def hashed_embedding(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """Unit vector of signed, hashed word and character 4-gram counts (1 + log tf)."""
+    features = Counter()
+    for token in tokenize(text):
+        features[token] += 1
+        padded = f"<{token}>"
+        for i in range(max(1, len(padded) - SUBWORD_CHARS + 1)):
+            features["#" + padded[i:i + SUBWORD_CHARS]] += 1
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter(
+        ((1.0 + math.log(count)) * (SUBWORD_WEIGHT if f[0] == "#" else 1.0) for f, count in features.items()),
+        dtype=np.float32, count=len(features)
+    )
+    signs = np.where(hashes & np.uint32(1 << 31), -1.0, 1.0).astype(np.float32)
+    vector += np.bincount(hashes % dim, weights=signs * weights, minlength=dim).astype(np.float32)
+    return _normalize_rows(vector)
+
+
+def quantize(embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """L2-normalize rows and quantize them to int8 with a per-row scale."""
+    embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    vectors = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return vectors, scales.astype(np.float32)
+
+
+# ==================
+# STORE
+# ==================
+
+def _save(path: str, name: str, write):
+    with open(os.path.join(path, name), "wb") as f:
+        write(f)
+
+
+def _swap_in(path: str, build_dir: str):
+    """
+    Point `path` (a symlink) at a finished build in one rename; running
+    workers keep their mappings of the old files. The previous build is
+    deleted. A store directory from before builds were versioned is
+    moved aside first.
+    """
+    previous = None
+    if os.path.islink(path):
+        previous = os.path.join(os.path.dirname(path), os.readlink(path))
+    elif os.path.isdir(path):
+        previous = f"{build_dir}.old"
+        os.rename(path, previous)
+    link = f"{build_dir}.link"
+    os.symlink(os.path.basename(build_dir), link)
+    os.replace(link, path)
+    if previous and os.path.realpath(previous) != os.path.realpath(build_dir):
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+class VectorStore:
+    """Memory-mapped int8 vectors with brute-force top-k search."""
+
+    def __init__(self, path: str):
+        # Resolve once: every file comes from the same build even if a rebuild swaps `path`
+        path = os.path.realpath(path)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.dim = self.meta["dim"]
+        self.embedder = self.meta["embedder"]
+        self.document_names = self.meta["document_names"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self.texts = np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r") \
+            if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self.token_vectors = None
+        self.vocab = {}
+        if self.embedder == "static":
+            self.token_vectors = np.load(os.path.join(path, "token_vectors.npy"), mmap_mode="r")
+            with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+                self.vocab = {word: row for row, word in enumerate(json.load(f))}
+
+    def __len__(self) -> int:
+        return len(self.scales)
+
+    @staticmethod
+    def write(path: str, chunks: list[dict], embeddings: np.ndarray, embedder: str = "hashed",
+              token_vectors: np.ndarray = None, vocab: list[str] = None):
+        """
+        Save a store. Files are written to a fresh "<path>.<timestamp>"
+        directory and `path` becomes a symlink to it only once it is
+        complete, so a half-written or mixed store never loads.
+
+        Args:
+            path: Store path (a symlink to the current build)
+            chunks: [{"text", "document_name"}], one per embedding row
+            embeddings: Float matrix (len(chunks) x dim)
+            embedder: "hashed" or "static" (query embedding at search time)
+            token_vectors / vocab: Word vectors for the "static" embedder
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or len(embeddings) != len(chunks):
+            raise ValueError(f"Expected {len(chunks)} embedding rows, got shape {embeddings.shape}")
+        path = path.rstrip(os.sep)
+        if os.path.isdir(path) and not os.path.islink(path) and os.listdir(path) \
+                and not os.path.exists(os.path.join(path, "meta.json")):
+            raise ValueError(f"{path} exists and is not a vector store")
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.{time.strftime('%Y%m%d%H%M%S')}-", dir=parent)
+        os.chmod(build_dir, 0o755)
+        try:
+            VectorStore._write_files(build_dir, chunks, embeddings, embedder, token_vectors, vocab)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        _swap_in(path, build_dir)
+
+    @staticmethod
+    def _write_files(build_dir: str, chunks: list[dict], embeddings: np.ndarray, embedder: str,
+                     token_vectors: np.ndarray, vocab: list[str]):
+        vectors, scales = quantize(embeddings)
+        names = sorted({chunk["document_name"] for chunk in chunks})
+        name_ids = {name: i for i, name in enumerate(names)}
+        encoded = [chunk["text"].encode("utf-8") for chunk in chunks]
+
+        _save(build_dir, "vectors.npy", lambda f: np.save(f, vectors))
+        _save(build_dir, "scales.npy", lambda f: np.save(f, scales))
+        _save(build_dir, "doc_ids.npy", lambda f: np.save(f, np.array(
+            [name_ids[chunk["document_name"]] for chunk in chunks], dtype=np.int32)))
+        _save(build_dir, "text_offsets.npy", lambda f: np.save(f, np.cumsum(
+            [0] + [len(text) for text in encoded], dtype=np.int64)))
+        _save(build_dir, "texts.bin", lambda f: f.write(b"".join(encoded)))
+        if embedder == "static":
+            _save(build_dir, "token_vectors.npy", lambda f: np.save(f, np.asarray(token_vectors, dtype=np.float16)))
+            _save(build_dir, "vocab.json", lambda f: f.write(json.dumps(vocab, ensure_ascii=False).encode("utf-8")))
+        meta = {
+            "dim": int(embeddings.shape[1]),
+            "count": len(chunks),
+            "embedder": embedder,
+            "document_names": names,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        _save(build_dir, "meta.json", lambda f: f.write(json.dumps(meta, ensure_ascii=False, indent=2).encode("utf-8")))
+
+    def embed_query(self, query: str) -> np.ndarray:
+        if self.embedder == "hashed":
+            return hashed_embedding(query, self.dim)
+        rows = [self.vocab[token] for token in tokenize(query) if token in self.vocab]
+        if not rows:
+            return np.zeros(self.dim, dtype=np.float32)
+        return _normalize_rows(self.token_vectors[rows].astype(np.float32).mean(axis=0))
+
+    def top_k(self, query_vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Row ids and approximate cosine scores of the k best rows, best first."""
+        k = min(k, len(self))
+        if k <= 0 or not query_vector.any():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query_vector = query_vector.astype(np.float32)
+        # Small blocks keep each int8 -> float32 upcast in cache (4 bytes of scores per row)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), VECTOR_BLOCK_ROWS):
+            stop = min(start + VECTOR_BLOCK_ROWS, len(self))
+            np.matmul(self.vectors[start:stop], query_vector, out=scores[start:stop])
+        scores *= self.scales
+        ids = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+        ids = ids[np.argsort(-scores[ids], kind="stable")]
+        return ids, scores[ids]
+
+    def chunk_text(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.texts[start:end].tobytes().decode("utf-8")
+
+    def search(self, query: str, top_k: int = 6) -> list[dict]:
+        """Return scored chunks shaped like Ragie's scored_chunks."""
+        ids, scores = self.top_k(self.embed_query(query), top_k)
+        return [{
+            "text": self.chunk_text(int(row)),
+            "score": round(float(score), 4),
+            "document_name": self.document_names[int(self.doc_ids[row])],
+            "id": f"vec:{int(row)}"
+        } for row, score in zip(ids, scores) if score > VECTOR_MIN_SCORE]
+
+    def stats(self) -> dict:
+        mapped = self.vectors.nbytes + self.scales.nbytes + self.doc_ids.nbytes + self.offsets.nbytes \
+            + self.texts.nbytes + (self.token_vectors.nbytes if self.token_vectors is not None else 0)
+        return {
+            "chunks": len(self),
+            "dim": self.dim,
+            "embedder": self.embedder,
+            "mapped_mb": round(mapped / 2 ** 20, 2)
+        }
+
+
+def build_from_directory(corpus_dir: str, path: str):
+    """Chunk a corpus like local_index and store its hashed embeddings."""
+    chunks = chunk_directory(corpus_dir)
+    embeddings = np.stack([hashed_embedding(chunk["text"]) for chunk in chunks]) if chunks \
+        else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+    VectorStore.write(path, chunks, embeddings)
+    return len(chunks)
+
+
+def read_word_vectors(path: str) -> tuple[list[str], np.ndarray]:
+    """word2vec/fastText text format ("word v1 v2 ...", optional "count dim" header)."""
+    words, rows = [], []
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            parts = line.rstrip().split(" ")
+            if len(parts) <= 2:
+                continue  # header
+            words.append(parts[0].lower())
+            rows.append(np.array(parts[1:], dtype=np.float32))
+    return words, np.stack(rows)
+
+
+def import_embeddings(chunks_path: str, path: str, token_vectors_path: str, embeddings_path: str = None) -> int:
+    """Store precomputed chunk embeddings (JSONL "embedding" field or an aligned .npy)."""
+    with open(chunks_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    if embeddings_path:
+        embeddings = np.load(embeddings_path)
+    else:
+        embeddings = np.array([row["embedding"] for row in rows], dtype=np.float32)
+    vocab, token_vectors = read_word_vectors(token_vectors_path)
+    if token_vectors.shape[1] != embeddings.shape[1]:
+        raise ValueError(f"Word vectors have dim {token_vectors.shape[1]}, embeddings {embeddings.shape[1]}")
+    chunks = [{"text": row["text"], "document_name": row.get("document_name", "unknown")} for row in rows]
+    VectorStore.write(path, chunks, embeddings, "static", token_vectors, vocab)
+    return len(chunks)
+
+
+# ==================
+# PROCESS-WIDE STORE
+# ==================
+
+_store = None
+_store_lock = threading.Lock()
+_store_missing = False
+_stats = {"searches": 0}
+_stats_lock = threading.Lock()
+
+
+def get_store() -> VectorStore | None:
+    """Map the on-disk store once per process (None if not built)."""
+    global _store, _store_missing
+    if _store is None and not _store_missing:
+        with _store_lock:
+            if _store is None and not _store_missing:
+                if os.path.exists(os.path.join(VECTOR_STORE_PATH, "meta.json")):
+                    _store = VectorStore(VECTOR_STORE_PATH)
+                else:
+                    print(f"Warning: vector store not found at {VECTOR_STORE_PATH}")
+                    _store_missing = True
+    return _store
+
+
+def is_available() -> bool:
+    return get_store() is not None
+
+
+def search(query: str, top_k: int = 6) -> list[dict]:
+    """Search the vector store (empty list if not built)."""
+    store = get_store()
+    if store is None:
+        return []
+    with _stats_lock:
+        _stats["searches"] += 1
+    return store.search(query, top_k)
+
+
+def stats() -> dict:
+    """Store shape and search count for this worker (the store is mapped on first search)."""
+    store = _store
+    if store is None:
+        return {"loaded": False, "path": VECTOR_STORE_PATH}
+    with _stats_lock:
+        searches = _stats["searches"]
+    return {"loaded": True, **store.stats(), "searches": searches}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="hashed embeddings of a corpus directory")
+    build.add_argument("corpus_dir")
+    build.add_argument("out", nargs="?", default=VECTOR_STORE_PATH)
+    imported = commands.add_parser("import", help="precomputed embeddings")
+    imported.add_argument("chunks", help='JSONL rows {"text", "document_name", "embedding"}')
+    imported.add_argument("--token-vectors", required=True, help="word vectors in the same space (text format)")
+    imported.add_argument("--embeddings", help=".npy chunk embeddings aligned with the JSONL rows")
+    imported.add_argument("--out", default=VECTOR_STORE_PATH)
+    query = commands.add_parser("search")
+    query.add_argument("query")
+    query.add_argument("--top-k", type=int, default=6)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_from_directory(args.corpus_dir, args.out)
+        print(f"Stored {count} chunks ({VECTOR_DIM}-dim hashed, int8) -> {args.out}")
+    elif args.command == "import":
+        count = import_embeddings(args.chunks, args.out, args.token_vectors, args.embeddings)
+        print(f"Stored {count} chunks (int8) -> {args.out}")
+    else:
+        if get_store() is None:
+            sys.exit(1)
+        start = time.perf_counter()
+        results = search(args.query, args.top_k)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for r in results:
+            print(f"{r['score']:.3f}  {r['document_name']}  {r['text'][:100]!r}")
+        print(f"({elapsed_ms:.2f} ms)")